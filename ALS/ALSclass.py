@@ -2,10 +2,21 @@ from ALS.ALS1D import *
 from ALS.ALS2D import *
 from ALS.twoDsub import *
 from ALS.MonteC import *
+from ALS.cutstore import *
+from ALS.hybrid import *
+from ALS.completion import *
 from ALS.tracker import *
+from ALS.checkpoint import *
+from ALS.logsink import *
+from ALS.profiler import *
+from ALS.shared import *
+from ALS.interp import *
 import matplotlib.pyplot as plt
+import multiprocessing as mp
 import copy as cp
 import numpy as np
+import time
+import os
 
 # define the class object
 
@@ -21,7 +32,15 @@ class ALSCPD:
     [ALSCPD] = __init__(self.filename, self.v_ex, self.rank)
     
     OR if MonteCarlo will be used initialize with:
-    [ALSCPD] = __init__(self.filename, self.v_ex, self.rank, self.func1D, self.grids, self.nsmpl, self.presmpl)
+    [ALSCPD] = __init__(self.filename, self.v_ex, self.rank, self.func1D, self.grids, self.nsmpl, self.presmpl,
+                        self.cache, self.sampler, self.surrogate, self.kT, self.nval, self.cutstore,
+                        self.cut_dtype, self.cut_budget, self.seed, self.keep_smpl, self.log, self.prof, self.memory,
+                        self.mem_budget, self.mem_policy)
+    
+    For MonteCarlo v_ex can be None (tensor-free mode), the shape is then taken from the grids and all
+    errors are estimated on a held-out set of sampled cuts.
+    v_ex can also be the SharedTensor of another object (self.shared), the tensor is then not wrapped again
+    and its cached norm and initial error are reused.
     ******************************************************************************************************
    
     ******************************************************************************************************
@@ -32,7 +51,10 @@ class ALSCPD:
             self.rank[int]: Current rank of the CPD expansion.
             self.iter[int]: Current amount of iterations passed.
             
-            self.v_ex[array]: The exact tensor to be decomposed.
+            self.v_ex[array]: The exact tensor to be decomposed (read-only), None in tensor-free mode.
+            self.shared[SharedTensor]: Holder of the exact tensor shared with all copies of the object,
+                        caches the norm and the initial error. Pass it instead of v_ex to build further
+                        objects on the same tensor.
             self.weights[array]: Array containing the CPD weights.
             
             self.Nlist[list]: List containing the shape of the exact tensor.
@@ -44,10 +66,48 @@ class ALSCPD:
        !For MonteCarlo:
             
             self.presmpl[str]: In case the sampling points are supposed to be read from an existing file
-                        the filename can be specified here.
+                        the filename can be specified here, a sample set (.npz) or a text file.
+            
+            self.nsmpl[int]: Amount of sampling points. Changing of amount of sampling points currently
+                        not implemented.
             
-            self.nsmpl[int]: Amount of sampling points. Currently only uniform sampling. Changing of 
-                        amount of sampling points currently not implemented.
+            self.sampler[str]: Strategy used to draw the sampling points, one of 'uniform' (default), 'lhs'
+                        (latin hypercube on the index grid), 'sobol' (scrambled Sobol sequence) and
+                        'stratified' (stratified by mode) or a callable, see MonteC.get_points. 'importance'
+                        draws the points with Boltzmann-like weights from a cheap surrogate of the
+                        potential, see MonteC.get_points_importance.
+            self.surrogate[str]: Surrogate for the importance sampler, 'cp' (default) uses the current CP
+                        expansion ('coarse' while all weights are zero), 'coarse' the potential on a
+                        coarse subgrid from func1D or func2D, a callable taking an index array of shape
+                        (n,f) is used directly.
+            self.kT[float]: Boltzmann temperature of the importance sampler in cm-1.
+            self.seed[int]: Seed for the sampling points, every draw n uses the seed (seed, n). Default
+                        None uses the global numpy random state.
+            self.keep_smpl[bool]: If True the command line driver writes the final sample set of every job
+                        to <filename>_smpl.npz next to the output file together with the grid shape, the
+                        seeds and the sampler (see self.save_samples), it can be passed as presmpl to reuse
+                        the points. Default True.
+            self.ndraw[int]: Number of sample draws so far.
+            self.tc_points[dict]: Sampling points and potential values of the tensor completion (keys idx,
+                        values, w and val_idx, val_values, val_w for the held-out points), see runTC.
+                        
+            self.checkpoint[str]: File the periodic checkpoints are written to, default None (off). See
+                        self.set_checkpoint and ALSCPD.resume.
+            self.ckpt_every[int]: Write a checkpoint every ckpt_every iterations.
+            self.ckpt_seconds[float]: Write a checkpoint if the last one is older than ckpt_seconds.
+            self.job[str]: Label of the currently running job (set by __main__), stored in the checkpoint.
+            self.job_start[int]: Iteration the current job started at.
+            self.phase[int]: Half-sweep the 2D routines continue with, stored in the checkpoint.
+            self.log[sink]: Sink the convergence history is written to, 'text' (default, the legacy .als
+                        file) or 'binary' (buffered records in <filename>.alsb, self.log.export() writes
+                        the text file), see ALS.logsink.
+            self.prof[Profiler]: Timers and flop/byte estimates per phase and iteration of the run
+                        routines, off by default (profile=True or self.set_profiling()). See
+                        self.get_profile, self.save_profile and ALS.profiler. With memory='tracemalloc'
+                        or 'rss' every phase also records its memory peak.
+            self.mem_budget[float]: Memory budget in bytes, every run routine checks the peak predicted
+                        by ALS.profiler.estimate_peak against it. Default None (no check).
+            self.mem_policy[str]: 'warn' (default) or 'refuse' (RuntimeError) above the budget.
                        
             self.func1D1D[function]: Callable to generate the 1D cuts through the potential. Should operate
                         on the individual grids to avoid errors.
@@ -55,14 +115,43 @@ class ALSCPD:
                         on the individual grids to avoid errors.
                         
             self.smpl_idx[array]: Array containing the sampling points in index representation.
+            self.smpl_w[array]: Array containing the weights of the sampling points, None for
+                        unweighted sampling.
+            self.proposals[list]: (proposal, amount of points) of every draw of the current sample set,
+                        see MonteC.get_mixture_weights. None if unknown (loaded weighted sample set or
+                        resumed run).
+            self.smpl_draws[list]: (seed, amount of points) of every draw of the current sample set, the
+                        seed is [self.seed, n] or None if drawn from the global random state or unknown.
             self.nu_smpl[array]: Array containing the sampled SPP.
             
             self.grids[list]: List containing the individual grids for the cuts.
             
+            self.cache[str]: Root directory of the on-disk cut cache. If set, the cuts are stored there as
+                        memory-mapped blocks keyed by the constructor, the grids and the sampling points
+                        and reused by every later object (or rerun) with the same setup. Default None.
+            
+            self.nval[int]: Amount of held-out sampling points used to estimate the error in tensor-free
+                        mode, default is a tenth of the sampling points.
+            self.cutstore[bool]: If True the 2D cuts are kept in a CutStore2D, every mode combination is
+                        only computed when run2DMC reaches it. Default False.
+            self.cut_dtype[type]: Data type of the cuts in the CutStore2D, e.g. np.float32. Default float.
+            self.cut_budget[float]: Amount of bytes the CutStore2D may hold in memory, least recently used
+                        combinations are dropped and recomputed on demand. Default None (no limit).
+            
+            self.val_kind[str]: Type of the held-out cuts, '1D' if func1D is given, '2D' otherwise.
+            self.val_idx[array]: Held-out sampling points, never used for fitting.
+            self.val_w[array]: Weights of the held-out sampling points, None for unweighted sampling.
+            self.val_cuts1D/2D[list]: Distinct held-out cuts, see self.cuts1D/2D.
+            self.val_cutmap1D/2D[list]: Index maps of the held-out cuts, see self.cutmap1D/2D.
+            
        !Get initialized when running 1D or 2D MCALSCPD for the first time on the object:
        
-            self.cuts1D[list]: List containing the 1D cuts for all DOF.
-            self.cuts2D[list]: List containing the 2D cuts for all combinations.
+            self.cuts1D[list]: List containing the distinct 1D cuts for all DOF in shape (Ni,u).
+            self.cuts2D[list]: List containing the distinct 2D cuts for all combinations in shape (u,Ni,Nk).
+            self.cutmap1D[list]: List containing the index maps of shape (s,) from the sampling points to
+                        the distinct 1D cuts.
+            self.cutmap2D[list]: List containing the index maps of shape (s,) from the sampling points to
+                        the distinct 2D cuts.
        
    *******************************************************************************************************
    
@@ -95,6 +184,27 @@ class ALSCPD:
                    All attributes (except filename) are changed to those of the other object.
            ----------------------------------------------------------------------------------------------           
            
+           ----------------------------------------------------------------------------------------------
+           self.evaluate(idx, chunk=65536), self.evaluate_slice(point, modes)
+           
+               Functions to evaluate the current expansion at single grid points (n,f) or along 1D/2D slices
+               through a grid point in O(n*f*r) without building the full tensor.
+           ----------------------------------------------------------------------------------------------
+           
+           ----------------------------------------------------------------------------------------------
+           self.run_ensemble(method, K, max_iter, thresh, prec=None, seeds=None, workers=None, margin=0.1,
+                             every=1, min_iter=5)
+           
+               Function to run K seeded initial guesses of one method in parallel worker processes (exact
+               tensor shared copy-on-write), members trailing the best by more than margin are cancelled and
+               the winner is taken over.
+               
+               [Returns]:
+                       [array]: Weights of the winner.
+                       [list]: SPP of the winner.
+                       [dict]: Final errors, iterations and status of all members.
+           ----------------------------------------------------------------------------------------------
+           
            ----------------------------------------------------------------------------------------------             
            self.run(max_iter, thresh, prec=None, dyn=False, tracker=True)
                
@@ -202,6 +312,18 @@ class ALSCPD:
                     self.nu_smpl
            ----------------------------------------------------------------------------------------------         
                     
+           ----------------------------------------------------------------------------------------------
+            self.draw_samples()
+            
+                Function to draw the sampling points with the chosen sampler.
+                
+                [Changes]:
+                    
+                    self.smpl_idx
+                    self.smpl_w
+                    self.nu_smpl
+           ----------------------------------------------------------------------------------------------
+           
            ----------------------------------------------------------------------------------------------                    
             self.plot_error(marker='')
             
@@ -252,19 +374,29 @@ class ALSCPD:
     
     
     
-    def __init__(self, filename, v_ex, rank, func1D=None, func2D=None, grids=None, nsmpl=None, presmpl=None):
+    def __init__(self, filename, v_ex, rank, func1D=None, func2D=None, grids=None, nsmpl=None, presmpl=None,\
+                 cache=None, sampler='uniform', surrogate='cp', kT=None, nval=None, cutstore=False, cut_dtype=float,\
+                 cut_budget=None, seed=None, keep_smpl=True, log=None, profile=False, memory=None, mem_budget=None,\
+                 mem_policy='warn'):
         # the init looks like a mess atm maybe clean this up later
         
         # set filename for current job
         self.filename = filename+".als"
-        # store the exact tensor of the object
-        self.v_ex = v_ex
+        # store the exact tensor of the object, read-only and shared with all copies
+        self.shared = get_shared(v_ex)
+        self.v_ex = self.shared.array if self.shared != None else None
         # store the rank of the expansion, maybe update later?
         self.rank = rank
         # get the number of grid points for all dimensions
         self.Nlist = []
-        for dim in range(np.ndim(v_ex)):
-            self.Nlist.append(v_ex.shape[dim])
+        if type(self.v_ex) == np.ndarray:
+            for dim in range(np.ndim(self.v_ex)):
+                self.Nlist.append(self.v_ex.shape[dim])
+        # tensor-free, the shape is given by the grids
+        elif grids != None and (func1D != None or func2D != None):
+            self.Nlist = [len(grid) for grid in grids]
+        else:
+            raise RuntimeError('Without the exact tensor a constructor and the grids are needed.')
         
         # initialized the ALS with the given rank and the list of point numbers
         self.weights, self.nu_list_init, self.sigmas = initALS(self.rank, self.Nlist)
@@ -275,18 +407,6 @@ class ALSCPD:
         
         # store the number of iterations
         self.iter = 0
-        # store the error in a list
-        error1 = geterrorleft(self.v_ex, self.weights, self.dyn_nu)
-        error2 = geterrorright(self.v_ex, self.weights, prec=None)
-        totalerror = get_rmse(error1,error2)
-        
-        with open('{}'.format(self.filename), 'w') as file:
-            file.write('! Iteration RMSEleft RMSEright RMSEtot \n')
-            file.write('{} {} {} {} \n'\
-                       .format(self.iter, np.sqrt(error1)*au2ic, np.sqrt(error2)*au2ic, totalerror))
-        
-        self.errorl = [totalerror]
-        #create the save file
         
         # initialize the Object for Monte-Carlo, dont decide on 1D or 2D here, just initialize the
         # cuts and everything once when the 'run'-Routines are called
@@ -296,6 +416,27 @@ class ALSCPD:
             if func2D != None:
                 self.func2D = func2D
             self.grids = grids
+            self.cache = cache
+            self.cutstore = cutstore
+            self.cut_dtype = cut_dtype
+            self.cut_budget = cut_budget
+            self.val_kind = '1D' if func1D != None else '2D'
+            self.sampler = sampler
+            self.surrogate = surrogate
+            self.kT = kT
+            self.seed = seed
+            self.keep_smpl = keep_smpl
+            self.ndraw = 0
+            self.tc_points = None
+            self.smpl_w = None
+            self.proposals = []
+            self.smpl_draws = []
+            self.val_idx = None
+            self.val_w = None
+            self.val_cuts1D = None
+            self.val_cuts2D = None
+            self.val_cutmap1D = None
+            self.val_cutmap2D = None
             
             
             if presmpl == None:
@@ -304,26 +445,92 @@ class ALSCPD:
                 self.smpl_idx = None
                 self.cuts1D = None
                 self.cuts2D = None
+                self.cutmap1D = None
+                self.cutmap2D = None
                 self.nu_smpl = None
                 self.combl = None
                 
             elif presmpl != None:
-                self.smpl_idx = grab_smpl(presmpl)
+                if str(presmpl).endswith('.npz'):
+                    smpl_idx, info = load_smpl(presmpl)
+                    if info['grid_shape'] != None and list(info['grid_shape']) != list(self.Nlist):
+                        raise RuntimeError('Sample set {} was drawn on a grid of shape {}, not {}.'\
+                                           .format(presmpl, info['grid_shape'], tuple(self.Nlist)))
+                    self.smpl_w = info['smpl_w']
+                    self.smpl_draws = info['draws']
+                else:
+                    smpl_idx = grab_smpl(presmpl)
+                self.smpl_idx = np.asfortranarray(smpl_idx)
                 self.nsmpl = self.smpl_idx.shape[0]
+                # the proposal of a weighted set is not stored
+                self.proposals = [(None, self.nsmpl)] if self.smpl_w is None else None
+                if self.smpl_draws in ([], None):
+                    self.smpl_draws = [(None, self.nsmpl)]
                 #truesmpl = get_true_points(self.grids, self.smpl_idx)
                 #self.cuts1D = get_all_cuts(self.func1D, self.grids, truesmpl)
                 self.cuts1D = None
                 self.cuts2D = None
+                self.cutmap1D = None
+                self.cutmap2D = None
                 self.nu_smpl = get_all_nu_smpl(self.dyn_nu, self.smpl_idx)
+            
+            self.nval = nval if nval != None else max(1, self.nsmpl//10)
                 
         elif func1D == None and func2D == None and grids == None and nsmpl == None:
             self.func1D = None
             self.func2D = None
             self.grids = None
             self.nsmpl = None
+            self.cache = None
+            self.cutstore = cutstore
+            self.cut_dtype = cut_dtype
+            self.cut_budget = cut_budget
+            self.nval = None
+            self.val_kind = None
+            self.sampler = sampler
+            self.surrogate = surrogate
+            self.kT = kT
+            self.seed = seed
+            self.keep_smpl = keep_smpl
+            self.ndraw = 0
+            self.tc_points = None
+            self.smpl_w = None
+            self.proposals = []
+            self.smpl_draws = []
+            self.val_idx = None
+            self.val_w = None
+            self.val_cuts1D = None
+            self.val_cuts2D = None
+            self.val_cutmap1D = None
+            self.val_cutmap2D = None
                  
         else:
             raise RuntimeError('Object could not be initialized properly.')
+        
+        # periodic checkpoints, see self.set_checkpoint
+        self.checkpoint = None
+        self.ckpt_every = None
+        self.ckpt_seconds = None
+        self.ckpt_last = time.time()
+        self.job = None
+        self.job_start = 0
+        self.phase = 0
+        # convergence log, the legacy text file by default
+        self.log = get_log_sink(log, self.filename)
+        # opt-in per phase timers, memory tracking switches them on
+        self.prof = Profiler(profile or memory != None, memory)
+        self.mem_budget = mem_budget
+        self.mem_policy = mem_policy
+        
+        # store the error in a list, in tensor-free mode this draws the held-out cuts
+        error1, error2 = self.get_errors()
+        totalerror = get_rmse(error1,error2)
+        
+        self.log.start(self.filename)
+        with self.log as log:
+            log.record(self.iter, np.sqrt(error1)*au2ic, np.sqrt(error2)*au2ic, totalerror, self.rank, 'init')
+        
+        self.errorl = [totalerror]
             
         
     def __str__(self):
@@ -335,7 +542,7 @@ class ALSCPD:
         Current amount of iterations: {}.
         Current error: {:.2f}cm-1.
         Current expansion uses {:.2f}% of storage compared to full.
-        """.format(self.filename, self.v_ex.shape, self.rank, self.iter, self.errorl[self.iter], self.get_perc())
+        """.format(self.filename, tuple(self.Nlist), self.rank, self.iter, self.errorl[self.iter], self.get_perc())
     
     
     def copy_reset(self, other):
@@ -351,6 +558,7 @@ class ALSCPD:
                    All attributes (except filename) are changed to mimick the initial other ALSCPD object.'''
         
         #self.filename = other.filename
+        self.shared = other.shared
         self.v_ex = other.v_ex
         self.Nlist = other.Nlist
         self.rank = other.nu_list_init[0].shape[0]
@@ -365,20 +573,42 @@ class ALSCPD:
             self.func2D = other.func2D
             self.grids = other.grids
             self.nsmpl = other.nsmpl
+            self.cache = other.cache
+            self.cutstore = other.cutstore
+            self.cut_dtype = other.cut_dtype
+            self.cut_budget = other.cut_budget
+            self.sampler = other.sampler
+            self.surrogate = other.surrogate
+            self.kT = other.kT
+            self.seed = other.seed
+            self.keep_smpl = other.keep_smpl
+            self.ndraw = other.ndraw
+            self.tc_points = other.tc_points
+            self.smpl_w = other.smpl_w
+            self.proposals = None if other.proposals is None else list(other.proposals)
+            self.smpl_draws = list(other.smpl_draws)
             self.smpl_idx = other.smpl_idx
             self.cuts1D = other.cuts1D
             self.cuts2D = other.cuts2D
+            self.cutmap1D = other.cutmap1D
+            self.cutmap2D = other.cutmap2D
+            self.nval = other.nval
+            self.val_kind = other.val_kind
+            self.val_idx = other.val_idx
+            self.val_w = other.val_w
+            self.val_cuts1D = other.val_cuts1D
+            self.val_cuts2D = other.val_cuts2D
+            self.val_cutmap1D = other.val_cutmap1D
+            self.val_cutmap2D = other.val_cutmap2D
             self.nu_smpl = get_all_nu_smpl(self.nu_list_init, self.smpl_idx)
         
         
-        error1 = geterrorleft(self.v_ex, self.weights, self.dyn_nu)
-        error2 = geterrorright(self.v_ex, self.weights, prec=None)
+        error1, error2 = self.get_errors()
         totalerror = get_rmse(error1,error2)
         
-        with open('{}'.format(self.filename), 'w') as file:
-            file.write('! Iteration RMSEleft RMSEright RMSEtot \n')
-            file.write('{} {} {} {} \n'\
-                       .format(self.iter, np.sqrt(error1)*au2ic, np.sqrt(error2)*au2ic, totalerror))
+        self.log.start(self.filename)
+        with self.log as log:
+            log.record(self.iter, np.sqrt(error1)*au2ic, np.sqrt(error2)*au2ic, totalerror, self.rank, 'init')
         
         self.errorl = [totalerror]
         
@@ -396,7 +626,9 @@ class ALSCPD:
                    All attributes are changed to those of the other object.'''
         
         #self.filename = other.filename+'CP'
-        self.v_ex = cp.deepcopy(other.v_ex)
+        # the exact tensor is shared, only the expansion is copied
+        self.shared = other.shared
+        self.v_ex = other.v_ex
         self.rank = cp.deepcopy(other.rank)
         self.Nlist = cp.deepcopy(other.Nlist)
         self.weights = cp.deepcopy(other.weights)
@@ -411,20 +643,240 @@ class ALSCPD:
             self.func2D = other.func2D
             self.grids = other.grids
             self.nsmpl = other.nsmpl
+            self.cache = other.cache
+            self.cutstore = other.cutstore
+            self.cut_dtype = other.cut_dtype
+            self.cut_budget = other.cut_budget
+            self.sampler = other.sampler
+            self.surrogate = other.surrogate
+            self.kT = other.kT
+            self.seed = other.seed
+            self.keep_smpl = other.keep_smpl
+            self.ndraw = other.ndraw
+            self.tc_points = other.tc_points
+            self.smpl_w = other.smpl_w
+            self.proposals = None if other.proposals is None else list(other.proposals)
+            self.smpl_draws = list(other.smpl_draws)
             self.smpl_idx = other.smpl_idx
             self.cuts1D = other.cuts1D
             self.cuts2D = other.cuts2D
+            self.cutmap1D = other.cutmap1D
+            self.cutmap2D = other.cutmap2D
+            self.nval = other.nval
+            self.val_kind = other.val_kind
+            self.val_idx = other.val_idx
+            self.val_w = other.val_w
+            self.val_cuts1D = other.val_cuts1D
+            self.val_cuts2D = other.val_cuts2D
+            self.val_cutmap1D = other.val_cutmap1D
+            self.val_cutmap2D = other.val_cutmap2D
             self.nu_smpl = get_all_nu_smpl(self.nu_list_init, self.smpl_idx)
         
+        # the expansion is the same, so are its errors
+        error1, error2 = other.mse if other.mse != None else self.get_errors()
+        self.mse = (error1, error2)
+        totalerror = get_rmse(error1,error2)
+        
+        self.log.start(self.filename)
+        with self.log as log:
+            log.record(self.iter, np.sqrt(error1)*au2ic, np.sqrt(error2)*au2ic, totalerror, self.rank, 'init')
+        
+        
+    def restart(self, seed=None):
+        '''self.restart(seed=None)
+        
+               Function to start over from a new random initial guess of the current rank. The exact tensor,
+               the sampling points and the cuts are kept.
+               
+               [Args]:
+                       seed[int]: Seed of the initial guess, default None continues the global numpy RNG.
+                       
+               [Changes]:
+                   
+                   self.weights, self.nu_list_init, self.dyn_nu, self.sigmas, self.nu_smpl, self.iter and
+                   self.errorl are reset.'''
+        
+        if seed != None:
+            np.random.seed(seed)
+        self.weights, self.nu_list_init, self.sigmas = initALS(self.rank, self.Nlist)
+        self.dyn_nu = cp.deepcopy(self.nu_list_init)
+        self.iter = 0
+        if type(getattr(self, 'smpl_idx', None)) == np.ndarray:
+            self.nu_smpl = get_all_nu_smpl(self.dyn_nu, self.smpl_idx)
         
-        error1 = geterrorleft(self.v_ex, self.weights, self.dyn_nu)
-        error2 = geterrorright(self.v_ex, self.weights, prec=None)
+        error1, error2 = self.get_errors()
         totalerror = get_rmse(error1,error2)
         
-        with open('{}'.format(self.filename), 'w') as file:
-            file.write('! Iteration RMSEleft RMSEright RMSEtot \n')
-            file.write('{} {} {} {} \n'\
-                       .format(self.iter, np.sqrt(error1)*au2ic, np.sqrt(error2)*au2ic, totalerror))
+        self.log.start(self.filename)
+        with self.log as log:
+            log.record(self.iter, np.sqrt(error1)*au2ic, np.sqrt(error2)*au2ic, totalerror, self.rank, 'init')
+        
+        self.errorl = [totalerror]
+    
+    
+    def run_method(self, method, max_iter, thresh, prec=None, tracker=True, **kwargs):
+        '''self.run_method(method, max_iter, thresh, prec=None, tracker=True, **kwargs)
+        
+               Function to run one of the algorithms by the name used in the input files and the logs.
+               
+               [Args]:
+                       method[str]: '1DALSCPD', '2DALSCPD', '2DALSCPD/SVD', '1DMCALSCPD', '2DMCALSCPD',
+                                      'HybridALSCPD' or 'TCALSCPD'.
+                       max_iter[int]: Maximum amount of iterations to run.
+                       thresh[float]: Threshold to reach for convergence.
+                       prec[float]: Value for the regularization, default is ~1E-8.
+                       tracker[bool]: Set if the progress tracker should be displayed, default is True.
+                       kwargs: Further arguments of the run routine.'''
+        
+        if method == '1DALSCPD':
+            self.run(max_iter, thresh, prec=prec, tracker=tracker, **kwargs)
+        elif method == '2DALSCPD':
+            self.run2D(max_iter, thresh, prec=prec, tracker=tracker, **kwargs)
+        elif method == '2DALSCPD/SVD':
+            self.run2D(max_iter, thresh, prec=prec, YSVD=True, tracker=tracker, **kwargs)
+        elif method == '1DMCALSCPD':
+            self.runMC(max_iter, thresh, prec=prec, tracker=tracker, **kwargs)
+        elif method == '2DMCALSCPD':
+            self.run2DMC(max_iter, thresh, prec=prec, tracker=tracker, **kwargs)
+        elif method == 'HybridALSCPD':
+            self.runHybrid(max_iter, thresh, prec=prec, tracker=tracker, **kwargs)
+        elif method == 'TCALSCPD':
+            self.runTC(max_iter, thresh, prec=prec, tracker=tracker, **kwargs)
+        else:
+            raise RuntimeError('Unknown method {}.'.format(method))
+    
+    
+    def run_ensemble(self, method, K, max_iter, thresh, prec=None, seeds=None, workers=None, margin=0.1,\
+                     every=1, min_iter=5, **kwargs):
+        '''self.run_ensemble(method, K, max_iter, thresh)
+        
+               Function to run K independent initial guesses in parallel worker processes and keep the best.
+               The workers are forked and read the exact tensor of this process copy-on-write, it is never
+               written so its pages are never copied and the tensor is held once. The sampling points and
+               cuts of the MC methods are set up once before the workers start so all members see the same
+               samples. Every
+               member draws its initial guess from its own seed and writes its own output file
+               (filename_k.als). Every member compares its error to the best error any member had after the
+               same amount of iterations and stops if it trails it by more than the relative margin. A member
+               reaching thresh stops the others.
+               
+               [Args]:
+                       method[str]: Name of the algorithm, see self.run_method.
+                       K[int]: Amount of initial guesses.
+                       max_iter[int]: Maximum amount of iterations per member.
+                       thresh[float]: Threshold to reach for convergence.
+                       prec[float]: Value for the regularization, default is ~1E-8.
+                       seeds[list]: Seeds of the initial guesses, default None derives K seeds from self.seed
+                                      (or a random one).
+                       workers[int]: Amount of worker processes, default min(K, available cpus).
+                       margin[float]: Relative margin to the best error for a member to be cancelled,
+                                      default 0.1.
+                       every[int]: Iterations between two comparisons, default 1. The hybrid ALSCPD draws new
+                                      sampling points on every call and is compared only at the end.
+                       min_iter[int]: Iterations before a member can be cancelled, default 5.
+                       kwargs: Further arguments of the run routine.
+                       
+               [Returns]:
+                       [array]: (r) shaped array containing the weights of the winner.
+                       [list]: List of the SPP of the winner in shape (r,N).
+                       [dict]: 'seeds', 'errors' (final RMSE), 'iterations', 'status' ('converged', 'finished',
+                               'cancelled', 'stopped' or 'failed') for every member and the index 'winner'.
+                               
+               [Changes]:
+                   
+                   The state of the winner is taken over: self.weights, self.nu_list_init, self.dyn_nu,
+                   self.sigmas, self.nu_smpl, self.iter and self.errorl.'''
+        
+        if seeds == None:
+            base = getattr(self, 'seed', None)
+            base = np.random.randint(2**31) if base == None else base
+            seeds = [int(seed) for seed in np.random.SeedSequence(base).generate_state(K)]
+        if len(seeds) != K:
+            raise RuntimeError('{} seeds given for {} members.'.format(len(seeds), K))
+        workers = min(K, len(os.sched_getaffinity(0))) if workers == None else workers
+        if method == 'HybridALSCPD':
+            every = max_iter
+        else:
+            # set up samples and cuts (or the completion points) once, no iterations
+            self.run_method(method, 0, thresh, prec=prec, tracker=False, **kwargs)
+        every = max(1, every)
+        nchecks = max(1, -(-max_iter//every))
+        
+        # the workers are forked, they inherit this object (the tensor copy-on-write), the table of errors
+        # and the stop flag
+        table = mp.RawArray('d', K*nchecks)
+        np.frombuffer(table)[:] = np.nan
+        stop = mp.RawValue('b', 0)
+        if self.shared != None:
+            # cache the mean square before forking, otherwise every member computes it
+            self.shared.msq
+        kind = 'binary' if isinstance(self.log, BinaryLog) else 'text'
+        
+        global jobensemble
+        def jobensemble(k):
+            errs = np.frombuffer(table).reshape(K, nchecks)
+            status = 'finished'
+            try:
+                member = cp.copy(self)
+                member.filename = '{}_{}.als'.format(self.filename[:-4], k)
+                member.log = get_log_sink(kind, member.filename)
+                member.prof = Profiler()
+                member.checkpoint = None
+                member.mem_budget = None
+                member.restart(seeds[k])
+                
+                done, c = 0, 0
+                while done < max_iter:
+                    n = min(every, max_iter-done)
+                    member.run_method(method, n, thresh, prec=prec, tracker=False, **kwargs)
+                    done += n
+                    error = member.errorl[-1]
+                    errs[k, c] = error
+                    if error <= thresh:
+                        stop.value = 1
+                        status = 'converged'
+                        break
+                    if done == max_iter:
+                        break
+                    if stop.value == 1:
+                        status = 'stopped'
+                        break
+                    if done >= min_iter and error > np.nanmin(errs[:, c])*(1+margin):
+                        status = 'cancelled'
+                        break
+                    c += 1
+                out = (k, status, float(member.errorl[-1]), member.iter, member.weights, member.nu_list_init,\
+                       member.dyn_nu, member.errorl)
+            except Exception as err:
+                print('Ensemble member {} failed: {}'.format(k, err))
+                out = (k, 'failed', np.inf, 0, None, None, None, None)
+            return out
+        
+        with mp.get_context('fork').Pool(workers) as p:
+            results = p.map(jobensemble, range(K))
+        
+        results.sort(key=lambda res: res[0])
+        errors = [res[2] for res in results]
+        winner = int(np.argmin(errors))
+        if errors[winner] == np.inf:
+            raise RuntimeError('All {} members of the ensemble failed.'.format(K))
+        k, status, error, iters, weights, nu_init, SPP, errorl = results[winner]
+        
+        self.weights, self.nu_list_init, self.dyn_nu = weights, nu_init, SPP
+        self.sigmas = get_sigmas(self.dyn_nu)
+        if type(getattr(self, 'smpl_idx', None)) == np.ndarray:
+            self.nu_smpl = get_all_nu_smpl(self.dyn_nu, self.smpl_idx)
+        self.iter, self.errorl = iters, errorl
+        error1, error2 = self.get_errors(prec)
+        with self.log as log:
+            log.note('Ensemble of {} {} runs, member {} (seed {}) won.'.format(K, method, k, seeds[k]))
+            log.record(self.iter, np.sqrt(error1)*au2ic, np.sqrt(error2)*au2ic, self.errorl[-1], self.rank, method)
+        
+        for res in results:
+            print('Member {:>3}: {:>9} after {:>5} iterations, Err: {:.2f}cm-1'.format(res[0], res[1], res[3], res[2]))
+        info = {'seeds': seeds, 'errors': errors, 'iterations': [res[3] for res in results],\
+                'status': [res[1] for res in results], 'winner': winner}
+        return self.weights, self.dyn_nu, info
         
         
     def run(self, max_iter, thresh, prec=None, dyn=False, tracker=True):
@@ -449,6 +901,10 @@ class ALSCPD:
                    self.sigmas
                    self.errorl'''
         
+        if type(self.v_ex) != np.ndarray:
+            raise RuntimeError('The exact ALSCPD needs the exact tensor, use runMC in tensor-free mode.')
+        self.check_memory('1DALSCPD')
+        
         # keep track of the progress, this is implemented in all the 'run'-Routines
         # beware of this: IF YOU PLAN TO RUN A LOT OF SINGLE ITERATIONS, TURN THE TRACKER OFF!
         if tracker == True:
@@ -459,29 +915,38 @@ class ALSCPD:
         
         
         totalerror = self.errorl[self.iter]
-        with open('{}'.format(self.filename), 'a') as file:
+        f = np.ndim(self.v_ex)
+        prof = self.prof
+        with self.log as log:
             
-            file.write('! Running 1DALSCPD. \n')
+            log.note('Running 1DALSCPD.')
             
             while totalerror > thresh and it < max_iter:
                 
                 if it < max_iter:
 
-                    for k in range(np.ndim(self.v_ex)):
-                        self.weights, self.dyn_nu[k] = get_update(self.v_ex, self.dyn_nu, self.sigmas, k, prec=prec)
+                    for k in range(f):
+                        # get_update split into its phases
+                        with prof.phase('assemble_S', lambda: cost_assemble_S(f-1, self.rank)):
+                            S_k = assemble_S(self.sigmas, hole_index=k)
+                        with prof.phase('get_b_ein', lambda: cost_b_ein(self.Nlist, self.rank, [k])):
+                            b_k = get_b_ein(self.v_ex, self.dyn_nu, k)
+                        with prof.phase('solve_linear', lambda: cost_solve(self.rank, self.Nlist[k])):
+                            self.weights, self.dyn_nu[k] = get_norm(solve_linear(S_k, b_k, prec=prec))
                         self.sigmas = update_sigma(self.dyn_nu, self.sigmas, k)
                     
-                    error1 = geterrorleft(self.v_ex, self.weights, self.dyn_nu)
-                    error2 = geterrorright(self.v_ex, self.weights, prec)
+                    error1, error2 = self.get_errors(prec)
                     totalerror = get_rmse(error1, error2)
                                 
 
-                    file.write('{} {} {} {} \n'\
-                               .format(self.iter, np.sqrt(error1)*au2ic, np.sqrt(error2)*au2ic, totalerror))
+                    log.record(self.iter, np.sqrt(error1)*au2ic, np.sqrt(error2)*au2ic, totalerror, self.rank,\
+                               '1DALSCPD')
+                    prof.next_iter(self.iter, '1DALSCPD')
                 
                     self.errorl.append(totalerror)
                     
                     self.iter += 1
+                    self.tick_checkpoint()
                     
                     if self.errorl[self.iter-1] - totalerror < -1:
                         raise RuntimeError('Error increased in iteration {}.'.format(self.iter))
@@ -538,6 +1003,10 @@ class ALSCPD:
                    self.sigmas
                    self.errorl'''
         
+        if type(self.v_ex) != np.ndarray:
+            raise RuntimeError('The exact ALSCPD needs the exact tensor, use run2DMC in tensor-free mode.')
+        self.check_memory('2DALSCPD' if YSVD == False else '2DALSCPD/SVD')
+        
         # start tracker if requested
         if tracker == True:
             perc_iter, perc_cur, track, cur_perc = init_tracker(max_iter)     
@@ -550,53 +1019,42 @@ class ALSCPD:
         # if there is another method to get the mode combinations one can pass them to this routine
         # in shape [[i,j],[i,k],...] instead of generating the comblist here
         comblist = create_comblist(np.ndim(self.v_ex))
-        counter = 0
+        # alternating half-sweeps, a resumed run continues with the half it was at
+        counter = self.phase
         
-        with open('{}'.format(self.filename), 'a') as file:
+        with self.log as log:
             
             if YSVD == False:
-                file.write('! Running 2DALSCPD. \n')
+                log.note('Running 2DALSCPD.')
             elif YSVD == True:
-                file.write('! Running 2DALSCPD/SVD. \n')
+                log.note('Running 2DALSCPD/SVD.')
                 
             while totalerror > thresh and it < max_iter:
                 
                 if counter == 0:
                     # skip every second subiteration, alternating every other outer iteration
-                    for n in np.arange(len(comblist))[::2]:                    
-                        S_kl = assemble_S2D(self.sigmas, comblist[n][0], comblist[n][1])
-                        b_kl = get_b_ein2D(self.v_ex, self.dyn_nu, comblist[n][0], comblist[n][1])
-                        x_kl = solve_linear2D(S_kl, b_kl)
-                            
-                        self.weights, self.dyn_nu, self.sigmas = \
-                        runsub(x_kl, S_kl, self.weights, self.dyn_nu, self.sigmas,\
-                                   comblist[n][0], comblist[n][1], 20, YSVD=YSVD, BSVD=BSVD)
-                                
+                    for n in np.arange(len(comblist))[::2]:
+                        self.update_pair2D(n, comblist, YSVD=YSVD, BSVD=BSVD)
                         counter = 1
                 
                 elif counter == 1:
                     for n in np.arange(1,len(comblist))[::2]:
-                        S_kl = assemble_S2D(self.sigmas, comblist[n][0], comblist[n][1])
-                        b_kl = get_b_ein2D(self.v_ex, self.dyn_nu, comblist[n][0], comblist[n][1])
-                        x_kl = solve_linear2D(S_kl, b_kl)
-                            
-                        self.weights, self.dyn_nu, self.sigmas = \
-                        runsub(x_kl, S_kl, self.weights, self.dyn_nu, self.sigmas,\
-                                   comblist[n][0], comblist[n][1], 20, YSVD=YSVD, BSVD=BSVD)
-                                
+                        self.update_pair2D(n, comblist, YSVD=YSVD, BSVD=BSVD)
                         counter = 0
                 
-                error1 = geterrorleft(self.v_ex, self.weights, self.dyn_nu)
-                error2 = geterrorright(self.v_ex, self.weights, prec)
+                error1, error2 = self.get_errors(prec)
                 totalerror = get_rmse(error1, error2)
                 
 
-                file.write('{} {} {} {} \n'\
-                    .format(self.iter, np.sqrt(error1)*au2ic, np.sqrt(error2)*au2ic, totalerror))
+                log.record(self.iter, np.sqrt(error1)*au2ic, np.sqrt(error2)*au2ic, totalerror, self.rank,\
+                           '2DALSCPD' if YSVD == False else '2DALSCPD/SVD')
+                self.prof.next_iter(self.iter, '2DALSCPD' if YSVD == False else '2DALSCPD/SVD')
                 
                 self.errorl.append(totalerror)
                 
-                self.iter += 1       
+                self.iter += 1
+                self.phase = counter
+                self.tick_checkpoint()
                 
                 if self.errorl[self.iter-1] - totalerror < -1:
                     if YSVD==False and BSVD==False:    
@@ -622,9 +1080,41 @@ class ALSCPD:
                         print('')
                 except:
                     pass            
+        self.phase = 0
+    
+    
+    def update_pair2D(self, n, comblist, YSVD=False, BSVD=False):
+        '''self.update_pair2D(n, comblist, YSVD=False, BSVD=False)
+        
+                Function to update the SPP of one mode combination in the 2D-ALSCPD.
+                
+                [Args]:
+                        n[int]: Position of the combination in comblist.
+                        comblist[list]: List of the mode combinations [[i,j],[i,k],...].
+                        YSVD[bool]: Build the Y for the subALS LES from the SVD of x_ij. Default False.
+                        BSVD[bool]: Build the B for the subALS LES from the SVD of x_ij. Default False.
+                        
+                [Changes]:
+                    
+                    self.weights
+                    self.dyn_nu
+                    self.sigmas'''
+        
+        i, j = comblist[n]
+        prof = self.prof
+        with prof.phase('assemble_S2D', lambda: cost_assemble_S(len(self.Nlist)-2, self.rank)):
+            S_kl = assemble_S2D(self.sigmas, i, j)
+        with prof.phase('get_b_ein2D', lambda: cost_b_ein(self.Nlist, self.rank, [i, j])):
+            b_kl = get_b_ein2D(self.v_ex, self.dyn_nu, i, j)
+        with prof.phase('solve_linear2D', lambda: cost_solve(self.rank, self.Nlist[i]*self.Nlist[j])):
+            x_kl = solve_linear2D(S_kl, b_kl)
+        with prof.phase('runsub', lambda: cost_sub(self.Nlist[i], self.Nlist[j], self.rank)):
+            self.weights, self.dyn_nu, self.sigmas = runsub(x_kl, S_kl, self.weights, self.dyn_nu, self.sigmas,\
+                                                            i, j, 20, YSVD=YSVD, BSVD=BSVD)
         
                     
-    def runMC(self, max_iter, thresh, prec=None, tracker=True):
+    def runMC(self, max_iter, thresh, prec=None, tracker=True, adaptive=False, batch=None, nval=None,\
+              grow_tol=0.05, grow_every=10, chunk=None, workers=None, minibatch=None, mb_growth=2, mb_every=5):
         '''self.runMC(max_iter, thresh):
     
                 Function to run the 1D ALSCPD-MC Algorithm.
@@ -635,6 +1125,22 @@ class ALSCPD:
                     prec[float]: Gives the epsilon for the regularization, standard is root of machine 
                                    precision for float (~1E-8).     
                     tracker[bool]: Set if the progress tracker should be displayed, default is True. 
+                    adaptive[bool]: If True start with batch sampling points and append batch new ones every
+                                   grow_every iterations until the held-out error stabilizes, self.nsmpl
+                                   is the upper limit. Default = False.
+                    batch[int]: Amount of sampling points per batch, default is self.nsmpl//10.
+                    nval[int]: Amount of held-out sampling points, the held-out set is redrawn if it has
+                                   another size. Default None keeps an existing set or draws batch points.
+                    grow_tol[float]: Relative change of the held-out error to stop growing, default 0.05.
+                    grow_every[int]: Iterations between two checks of the held-out error, default 10.
+                    chunk[int]: If given, d and Z are accumulated over chunks of this many sampling points,
+                                   which bounds the temporaries to O(r*chunk). Default None.
+                    workers[int]: Amount of threads for the chunked accumulation, default None.
+                    minibatch[int]: If given, every sweep only uses a rotating mini-batch of this many of the
+                                   sampling points (with their precomputed cuts). Default None uses all.
+                    mb_growth[float]: Factor the mini-batch grows by every mb_every iterations, once it
+                                   covers all sampling points the remaining sweeps are full-batch. Default 2.
+                    mb_every[int]: Iterations between two growths of the mini-batch, default 5.
                     
             [Changes]:
                        
@@ -650,24 +1156,34 @@ class ALSCPD:
                     self.smpl_idx
                     self.nu_smpl'''
         
+        if adaptive == True:
+            batch = max(1, self.nsmpl//10) if batch == None else batch
+            if nval == None and type(self.val_idx) != np.ndarray:
+                nval = batch
+        
+        self.check_memory('1DMCALSCPD')
         # if the 1Dcuts dont exist initialize them 
-        if type(self.cuts1D) != list and type(self.smpl_idx) != np.ndarray:
+        if type(self.cuts1D) != list:
+            if type(self.smpl_idx) != np.ndarray:
+                self.draw_samples(batch if adaptive == True else None)
             try:
-                #print('hey')
-                self.smpl_idx, self.cuts1D, self.nu_smpl = setup_MC(self.grids, self.nsmpl, self.dyn_nu, self.func1D)
-                #print(self.smpl_idx)
+                if type(self.cuts2D) == list and all(cut is not None for cut in self.cuts2D):
+                    # the 1D cuts are contained in the 2D cuts, no potential evaluations needed
+                    with self.prof.phase('cuts1D_from_2D'):
+                        self.cuts1D, self.cutmap1D = get_cuts1D_from_2D(create_comblist(len(self.grids)),\
+                                                                        self.cuts2D, self.cutmap2D, self.smpl_idx)
+                else:
+                    with self.prof.phase('cuts1D', lambda: cost_cuts(sum(cut.size for cut in self.cuts1D))):
+                        self.cuts1D, self.cutmap1D = get_cuts1D(self.func1D, self.grids, self.smpl_idx,\
+                                                                cachedir=self.cache)
             except:
-                #print('ho')
                 raise RuntimeError('''Something went wrong while initializing 1D MC ALSCPD, 
                 perhaps your function isn't compatible?''')
         
-        elif type(self.cuts1D) != list and type(self.smpl_idx) == np.ndarray:
-            try:
-                truesmpl = get_true_points(self.grids, self.smpl_idx)
-                self.cuts1D = get_all_cuts_par(self.func1D, self.grids, truesmpl)
-            except:
-                raise RuntimeError('''Something went wrong while initializing 1D MC ALSCPD, 
-                perhaps your function isn't compatible?''')
+        if adaptive == True:
+            self.setup_validation(nval, '1D')
+            self.val_err = None
+        growing = adaptive
         
         # start tracker if requested
         if tracker == True:
@@ -685,28 +1201,53 @@ class ALSCPD:
         best_sigmas = cp.deepcopy(self.sigmas)
         best_error = self.errorl[-1]
         
-        with open('{}'.format(self.filename), 'a') as file:
+        buf = None
+        # mini-batch state, the sampled SPP of the batch are gathered fresh for every sweep
+        nb = None if minibatch == None else min(int(minibatch), len(self.smpl_idx))
+        order, pos, mbuf, stale = None, 0, None, False
+        prof = self.prof
+        sweep_cost = lambda nsmpl: cost_sweep_MC(self.Nlist, self.rank, nsmpl, [cut.shape[1] for cut in self.cuts1D])
+        with self.log as log:
         #print('''{}: weights: {}'''.format(it, weights))
         
-            file.write('! Running 1DMCALSCPD. \n')
+            log.note('Running 1DMCALSCPD.')
+            if nb != None and nb < len(self.smpl_idx):
+                log.note('Mini-batch of {} sampling points.'.format(nb))
             
             while it < max_iter and error > thresh:
         
-                for i in range(np.ndim(self.v_ex)):
-                    omega_i = get_omega_hole_smpl(self.nu_smpl, i)
-                    self.weights, self.dyn_nu[i] = update_MC(self.nu_smpl, omega_i, self.cuts1D[i], prec=prec)
-
-                    self.nu_smpl[i] = get_nu_smpl(self.dyn_nu[i], self.smpl_idx[:,i])
+                if nb != None and nb < len(self.smpl_idx):
+                    if order is None or len(order) != len(self.smpl_idx):
+                        order, pos = np.random.permutation(len(self.smpl_idx)), 0
+                    mb, pos = next_minibatch(order, pos, nb)
+                    idx_mb = np.asfortranarray(self.smpl_idx[mb])
+                    # only the cuts of the batch, the sweep then costs O(nb) and not O(u)
+                    cuts_mb, maps_mb = get_batch_cuts(self.cuts1D, self.cutmap1D, mb)
+                    with prof.phase('sweep_MC', lambda: cost_sweep_MC(self.Nlist, self.rank, len(mb),\
+                                                                      [cut.shape[1] for cut in cuts_mb])):
+                        self.weights, mbuf = sweep_MC(get_all_nu_smpl(self.dyn_nu, idx_mb), self.dyn_nu,\
+                                                      cuts_mb, idx_mb, buf=mbuf, prec=prec, cutmaps=maps_mb,\
+                                                      smpl_w=None if self.smpl_w is None else self.smpl_w[mb],\
+                                                      chunk=chunk, workers=workers)
+                    stale = True
+                else:
+                    if stale == True:
+                        self.nu_smpl = get_all_nu_smpl(self.dyn_nu, self.smpl_idx)
+                        stale = False
+                    # one update of all DOF, the sampled omegas are kept in buf
+                    with prof.phase('sweep_MC', lambda: sweep_cost(len(self.smpl_idx))):
+                        self.weights, buf = sweep_MC(self.nu_smpl, self.dyn_nu, self.cuts1D, self.smpl_idx,\
+                                                     buf=buf, prec=prec, cutmaps=self.cutmap1D, smpl_w=self.smpl_w,\
+                                                     chunk=chunk, workers=workers)
             
-                err1 = geterrorleft(self.v_ex, self.weights, self.dyn_nu)
-                err2 = geterrorright(self.v_ex, self.weights, prec)
+                err1, err2 = self.get_errors(prec)
                 error = get_rmse(err1, err2)
             #print('''weights: {}'''.format(weights))
             #print('{},{},{}'.format(np.sqrt(err1)*au2ic,np.sqrt(err2)*au2ic,error))
                 self.errorl.append(error)
           
-                file.write('{} {} {} {} \n'\
-                            .format(self.iter, np.sqrt(err1)*au2ic, np.sqrt(err2)*au2ic, error))
+                log.record(self.iter, np.sqrt(err1)*au2ic, np.sqrt(err2)*au2ic, error, self.rank, '1DMCALSCPD')
+                prof.next_iter(self.iter, '1DMCALSCPD')
                 
                 if error < best_error:
                     best_weights = cp.deepcopy(self.weights)
@@ -714,10 +1255,17 @@ class ALSCPD:
                     best_sigmas = get_sigmas(best_SPP)
                     best_error = error
 
-                self.iter += 1                      
+                self.iter += 1
+                self.tick_checkpoint()
             #print('Finishing iteration {}'.format(it))
             #print('*'*50)
                 it += 1
+                
+                if growing and it % grow_every == 0:
+                    growing = self.adapt_samples('1D', batch, grow_tol, log)
+                if nb != None and nb < len(self.smpl_idx) and it % mb_every == 0:
+                    nb = min(int(nb*mb_growth), len(self.smpl_idx))
+                    log.note('Mini-batch grown to {} sampling points.'.format(nb))
                 try:
                     if it == cur_perc:
                         perc_iter, perc_cur, track, cur_perc =\
@@ -738,7 +1286,245 @@ class ALSCPD:
             print('')
        
     
-    def run2DMC(self, max_iter, thresh, prec=None, tracker=True):
+    def runHybrid(self, max_iter, thresh, prec=None, tracker=True, plan=None, oversample=2, nmax=None,\
+                  pot_cost=1E3):
+        '''self.runHybrid(max_iter, thresh)
+        
+                Function to run the hybrid ALSCPD, every mode is updated either exactly or from its own set of
+                sampled 1D cuts (see ALS.hybrid). The sampled cuts are computed with func1D if given,
+                otherwise they are gathered from the exact tensor. The sampling points are drawn with
+                self.sampler, importance sampled points enter the updates with their weights.
+                
+            [Args]:
+                    max_iter[int]: Maximum amount of iterations to run.
+                    thresh[float]: Maximum error to signal convergence.
+                    prec[float]: Gives the epsilon for the regularization, standard is ~1E-8.
+                    tracker[bool]: Set if the progress tracker should be displayed, default is True.
+                    plan[list]: 'exact' or 'sampled' for every mode, default None uses the cost model of
+                                   hybrid.choose_modes.
+                    oversample[float]: Sampling points per entry of the SPP of a sampled mode, default 2.
+                    nmax[int]: Upper limit for the sampling points of a mode, default None.
+                    pot_cost[float]: Cost of one potential evaluation in floating point operations for the
+                                   cost model, default 1E3 (0 if the cuts are gathered from the tensor).
+                    
+            [Changes]:
+                       
+                    self.iter
+                    self.dyn_nu
+                    self.weights
+                    self.sigmas
+                    self.errorl'''
+        
+        tensor = type(self.v_ex) == np.ndarray
+        constructor = getattr(self, 'func1D', None)
+        if constructor == None and tensor == False:
+            raise RuntimeError('The hybrid ALSCPD needs the exact tensor or a 1D constructor.')
+        
+        f = len(self.Nlist)
+        nsmpl = [get_mode_samples(self.Nlist, self.rank, k, oversample=oversample, nmax=nmax) for k in range(f)]
+        if plan == None:
+            plan = choose_modes(self.Nlist, self.rank, nsmpl, tensor=tensor,\
+                                pot_cost=pot_cost if constructor != None else 0, max_iter=max_iter)
+        elif tensor == False and 'exact' in plan:
+            raise RuntimeError('Exact mode updates need the exact tensor.')
+        if self.sampler == 'importance' and 'sampled' in plan:
+            if self.grids == None:
+                raise RuntimeError('Importance sampling of the sampled modes needs the grids.')
+            if self.kT == None:
+                raise RuntimeError('Importance sampling needs the Boltzmann temperature kT.')
+        
+        # every sampled mode gets its own sampling points and cuts
+        grids = self.grids if self.grids != None else [np.arange(N) for N in self.Nlist]
+        smpl_idx, smpl_w, cuts, cutmaps = [None]*f, [None]*f, [None]*f, [None]*f
+        for k in range(f):
+            if plan[k] == 'sampled':
+                if self.grids != None:
+                    smpl_idx[k], smpl_w[k] = self.get_samples(nsmpl[k])
+                else:
+                    smpl_idx[k] = get_points(grids, nsmpl[k], sampler=self.sampler, seed=self.next_seed())
+                smpl_idx[k] = np.asfortranarray(smpl_idx[k])
+                cuts[k], cutmaps[k] = get_mode_cuts(k, smpl_idx[k], constructor=constructor, Grid_List=grids,\
+                                                    v_ex=self.v_ex)
+        self.sigmas = get_sigmas(self.dyn_nu)
+        
+        if tracker == True:
+            perc_iter, perc_cur, track, cur_perc = init_tracker(max_iter)
+            track_progress('Iterating Hyb...', perc_cur)
+        
+        it = 0
+        error = self.errorl[self.iter]
+        best_weights = cp.deepcopy(self.weights)
+        best_SPP = cp.deepcopy(self.dyn_nu)
+        best_error = self.errorl[-1]
+        
+        with self.log as log:
+            
+            log.note('Running HybridALSCPD.')
+            log.note('Modes: {}'.format(' '.join('{}:{}'.format(p, n if p == 'sampled' else '-')\
+                                                         for p, n in zip(plan, nsmpl))))
+            
+            while it < max_iter and error > thresh:
+                
+                self.weights = sweep_hybrid(self.v_ex, self.dyn_nu, self.sigmas, plan, cuts, cutmaps, smpl_idx,\
+                                            prec=prec, smpl_w=smpl_w)
+                
+                err1, err2 = self.get_errors(prec)
+                error = get_rmse(err1, err2)
+                self.errorl.append(error)
+                
+                log.record(self.iter, np.sqrt(err1)*au2ic, np.sqrt(err2)*au2ic, error, self.rank, 'HybridALSCPD')
+                self.prof.next_iter(self.iter, 'HybridALSCPD')
+                
+                if error < best_error:
+                    best_weights = cp.deepcopy(self.weights)
+                    best_SPP = cp.deepcopy(self.dyn_nu)
+                    best_error = error
+                
+                self.iter += 1
+                self.tick_checkpoint()
+                it += 1
+                try:
+                    if it == cur_perc:
+                        perc_iter, perc_cur, track, cur_perc =\
+                        keep_track('Iterating Hyb...', 'Err: {:.2f}cm-1 '.format(error),\
+                                   perc_iter, perc_cur, track, cur_perc)
+                except:
+                    pass
+        
+        # set everything to the best result
+        self.weights = best_weights
+        self.dyn_nu = best_SPP
+        self.sigmas = get_sigmas(best_SPP)
+        if type(getattr(self, 'smpl_idx', None)) == np.ndarray:
+            self.nu_smpl = get_all_nu_smpl(self.dyn_nu, self.smpl_idx)
+        self.errorl[-1] = best_error
+        
+        if tracker == True:
+            track_progress('Iterating Hyb...', 1, 'Err: {:.2f}cm-1 '.format(error))
+            print('')
+    
+    
+    def runTC(self, max_iter, thresh, npoints=None, prec=None, tracker=True, nval=None):
+        '''self.runTC(max_iter, thresh, npoints)
+        
+                Function to run the CP tensor completion, the SPP are fitted to the potential at single
+                sampling points only (see ALS.completion), every point costs one potential evaluation.
+                The points are evaluated with func1D (elementwise) or taken from the exact tensor and
+                kept in self.tc_points, later calls reuse them.
+                
+            [Args]:
+                    max_iter[int]: Maximum amount of iterations to run.
+                    thresh[float]: Maximum error to signal convergence.
+                    npoints[int]: Budget of potential evaluations, default is self.nsmpl times the mean
+                                   amount of grid points (the budget of the 1D cuts). Without the exact
+                                   tensor nval of them are held out to estimate the error.
+                    prec[float]: Gives the epsilon for the regularization, standard is ~1E-8.
+                    tracker[bool]: Set if the progress tracker should be displayed, default is True.
+                    nval[int]: Amount of held-out points in tensor-free mode, default is npoints//10.
+                    
+            [Changes]:
+                       
+                    self.iter
+                    self.dyn_nu
+                    self.weights
+                    self.sigmas
+                    self.errorl
+                    
+            If not existent already, initializes:
+                    
+                    self.tc_points'''
+        
+        tensor = type(self.v_ex) == np.ndarray
+        constructor = getattr(self, 'func1D', None)
+        if constructor == None and tensor == False:
+            raise RuntimeError('The tensor completion needs the exact tensor or a 1D constructor.')
+        
+        if self.tc_points == None:
+            if npoints == None:
+                if self.nsmpl == None:
+                    raise RuntimeError('No budget of potential evaluations given.')
+                npoints = int(self.nsmpl*np.mean(self.Nlist))
+            nval = 0 if tensor == True else (nval if nval != None else max(1, npoints//10))
+            if npoints - nval < 1:
+                raise RuntimeError('The budget of {} points leaves nothing to fit.'.format(npoints))
+            if self.grids != None:
+                idx, w = self.get_samples(npoints)
+            else:
+                idx, w = get_points([np.arange(N) for N in self.Nlist], npoints, sampler=self.sampler,\
+                                    seed=self.next_seed()), None
+            idx = np.asfortranarray(idx)
+            values = get_point_values(constructor, self.grids, idx, v_ex=self.v_ex)
+            nfit = npoints - nval
+            self.tc_points = {'idx': idx[:nfit], 'values': values[:nfit], 'w': None if w is None else w[:nfit],\
+                              'val_idx': idx[nfit:], 'val_values': values[nfit:],\
+                              'val_w': None if w is None else w[nfit:]}
+        points = self.tc_points
+        nu_smpl = get_all_nu_smpl(self.dyn_nu, points['idx'])
+        if prec == None:
+            prec = np.sqrt(np.finfo(float).eps)
+        
+        if tracker == True:
+            perc_iter, perc_cur, track, cur_perc = init_tracker(max_iter)
+            track_progress('Iterating TC....', perc_cur)
+        
+        it = 0
+        error = self.errorl[self.iter]
+        best_weights = cp.deepcopy(self.weights)
+        best_SPP = cp.deepcopy(self.dyn_nu)
+        best_error = self.errorl[-1]
+        
+        with self.log as log:
+            
+            log.note('Running TCALSCPD with {} points.'.format(len(points['idx'])+len(points['val_idx'])))
+            
+            while it < max_iter and error > thresh:
+                
+                self.weights = sweep_points(nu_smpl, self.dyn_nu, points['values'], points['idx'], prec=prec,\
+                                            smpl_w=points['w'])
+                
+                if tensor == True:
+                    err1, err2 = self.get_errors(prec)
+                else:
+                    err1 = get_point_error(self.weights, self.dyn_nu, points['val_idx'], points['val_values'],\
+                                           smpl_w=points['val_w'])
+                    err2 = (prec*(self.weights**2)).sum()/np.prod(self.Nlist)
+                error = get_rmse(err1, err2)
+                self.errorl.append(error)
+                
+                log.record(self.iter, np.sqrt(err1)*au2ic, np.sqrt(err2)*au2ic, error, self.rank, 'TCALSCPD')
+                self.prof.next_iter(self.iter, 'TCALSCPD')
+                
+                if error < best_error:
+                    best_weights = cp.deepcopy(self.weights)
+                    best_SPP = cp.deepcopy(self.dyn_nu)
+                    best_error = error
+                
+                self.iter += 1
+                self.tick_checkpoint()
+                it += 1
+                try:
+                    if it == cur_perc:
+                        perc_iter, perc_cur, track, cur_perc =\
+                        keep_track('Iterating TC....', 'Err: {:.2f}cm-1 '.format(error),\
+                                   perc_iter, perc_cur, track, cur_perc)
+                except:
+                    pass
+        
+        # set everything to the best result
+        self.weights = best_weights
+        self.dyn_nu = best_SPP
+        self.sigmas = get_sigmas(best_SPP)
+        if type(getattr(self, 'smpl_idx', None)) == np.ndarray:
+            self.nu_smpl = get_all_nu_smpl(self.dyn_nu, self.smpl_idx)
+        self.errorl[-1] = best_error
+        
+        if tracker == True:
+            track_progress('Iterating TC....', 1, 'Err: {:.2f}cm-1 '.format(error))
+            print('')
+    
+    
+    def run2DMC(self, max_iter, thresh, prec=None, tracker=True, adaptive=False, batch=None, nval=None,\
+                grow_tol=0.05, grow_every=10, chunk=None, workers=None, overlap=False):
         '''Run the 2DMC-ALSCPD Algorithm.
     
             [Args]:
@@ -746,6 +1532,18 @@ class ALSCPD:
                     thresh[float]: Threshhold to signal convergence.
                     prec[float]: Value for the regularization, default is ~1E-8.
                     tracker[bool]: Set if the progress tracker should be displayed, default is True.
+                    adaptive[bool]: If True grow the sample set in batches, see self.runMC. Default = False.
+                    batch[int]: Amount of sampling points per batch, default is self.nsmpl//10.
+                    nval[int]: Amount of held-out sampling points, the held-out set is redrawn if it has
+                                   another size. Default None keeps an existing set or draws batch points.
+                    grow_tol[float]: Relative change of the held-out error to stop growing, default 0.05.
+                    grow_every[int]: Iterations between two checks of the held-out error, default 10.
+                    chunk[int]: If given, d and Z are accumulated over chunks of this many sampling points,
+                                   which bounds the temporaries to O(r*chunk). Default None.
+                    workers[int]: Amount of threads for the chunked accumulation, default None.
+                    overlap[bool]: If the 2D cuts still have to be built, build them in the background and
+                                   start the first half-sweep right away, its combinations are updated in
+                                   the order their cuts are finished. Default False.
                     
             [Changes]:
                        
@@ -762,25 +1560,34 @@ class ALSCPD:
                     self.nu_smpl'''
     
         
-        # if the 2D cuts dont exist we initialize them here
+        if adaptive == True:
+            batch = max(1, self.nsmpl//10) if batch == None else batch
+            if nval == None and type(self.val_idx) != np.ndarray:
+                nval = batch
         
-        if type(self.cuts2D) != list and type(self.smpl_idx) != np.ndarray:
-            try:
-                #print('hey')
-                #print(type(self.smpl_idx))
-                self.smpl_idx, comblist, self.cuts2D, self.nu_smpl =\
-                     setup_MC2D(self.grids, self.nsmpl, self.dyn_nu, self.func2D)
-            except:
-                raise RuntimeError('''Something went wrong while initializing 2D MC ALSCPD, 
-                perhaps your function isn't compatible?''')
-        
-        elif type(self.cuts2D) != list and type(self.smpl_idx) == np.ndarray:
+        self.check_memory('2DMCALSCPD')
+        # if the 2D cuts dont exist we initialize them here
+        produced = None
+        if type(self.cuts2D) != list and type(self.cuts2D) != CutStore2D:
+            if type(self.smpl_idx) != np.ndarray:
+                self.draw_samples(batch if adaptive == True else None)
             try:
                 #print('ho')
-                truesmpl = get_true_points(self.grids, self.smpl_idx)
                 comblist = create_comblist(len(self.grids))
                 #print(self.smpl_idx)
-                self.cuts2D = get_cuts_comb_par(comblist, self.func2D, self.grids, truesmpl)
+                if self.cutstore == True:
+                    # nothing is computed here, the combinations are built when they are reached
+                    self.cuts2D = CutStore2D(comblist, self.func2D, self.grids, self.smpl_idx, dtype=self.cut_dtype,\
+                                             budget=self.cut_budget, cachedir=self.cache)
+                    self.cutmap2D = self.cuts2D.cutmaps
+                elif overlap == True:
+                    # the cuts are built in the background and consumed by the first sweep, they are
+                    # only kept once all of them are finished
+                    self.cutmap2D, produced = get_cuts2D_iter(comblist, self.func2D, self.grids, self.smpl_idx,\
+                                                              cachedir=self.cache)
+                    cuts = [None]*len(comblist)
+                else:
+                    self.init_cuts2D()
             except:
                 raise RuntimeError('''Something went wrong while initializing 2D MC ALSCPD, 
                 perhaps your function isn't compatible?''')
@@ -789,6 +1596,11 @@ class ALSCPD:
         else:
             comblist = create_comblist(len(self.grids))
         
+        if adaptive == True:
+            self.setup_validation(nval, '2D')
+            self.val_err = None
+        growing = adaptive
+        
         #start tracker if requested
         if tracker == True:
             perc_iter, perc_cur, track, cur_perc = init_tracker(max_iter)
@@ -799,64 +1611,67 @@ class ALSCPD:
     
         error = self.errorl[self.iter]
     
-        counter = 0
+        # alternating half-sweeps, a resumed run continues with the half it was at
+        counter = self.phase
+        buf = None
         
-        with open('{}'.format(self.filename), 'a') as file:
-            file.write('! Running 2DMCALSCPD. \n')
+        with self.log as log:
+            log.note('Running 2DMCALSCPD.')
             while it < max_iter and error > thresh:
                 
+                # work buffers for the two-hole omega and its weighted version, these only change
+                # if the sample set grows
+                if chunk == None and (buf is None or buf.shape[1:] != self.nu_smpl.shape[1:]):
+                    buf = np.empty((2,) + self.nu_smpl.shape[1:])
+                
                 # if there is an updated version where we determine the correlated DOF in advance we can put them
                 # to a list and just iterate through them here
 
-                if counter == 0:
+                if produced is not None:
+                    # first sweep while the cuts are still being built, the combinations of the current
+                    # half are updated in the order their cuts are finished, the others are only collected
+                    self.cuts2D = cuts
+                    try:
+                        for n, cut in produced:
+                            cuts[n] = cut
+                            if n % 2 == counter:
+                                self.update_pair2DMC(n, comblist, prec=prec, chunk=chunk, workers=workers, buf=buf)
+                    except:
+                        if any(cut is None for cut in cuts):
+                            # incomplete, the next run builds the cuts again
+                            self.cuts2D, self.cutmap2D = None, None
+                        raise
+                    produced = None
+                    counter = 1 - counter
+                    
+                elif counter == 0:
                     #print(0)
                     for n in np.arange(len(comblist))[::2]:
                         #print(comblist[n][0], comblist[n][1])
-                        S_ij = assemble_S2D(self.sigmas, comblist[n][0], comblist[n][1])
-                        omega_ij = get_omega_2hole_smpl(self.nu_smpl, comblist[n][0], comblist[n][1])
-                        d_ij = build_d2d(self.cuts2D[n], omega_ij)
-                        Z_ij = build_Z(omega_ij)
-                        x_ij = solve_linear2DMC(Z_ij, d_ij, prec=prec)
-
-                        self.weights, self.dyn_nu, self.sigmas = runsubMC(x_ij, S_ij,\
-                                                         self.weights, self.dyn_nu, self.sigmas,\
-                                                         comblist[n][0], comblist[n][1], prec=prec)
-
-                        self.nu_smpl[comblist[n][0]] = get_nu_smpl(self.dyn_nu[comblist[n][0]],\
-                                                                   self.smpl_idx[:,comblist[n][0]])
-                        self.nu_smpl[comblist[n][1]] = get_nu_smpl(self.dyn_nu[comblist[n][1]],\
-                                                                   self.smpl_idx[:,comblist[n][1]])                
+                        self.update_pair2DMC(n, comblist, prec=prec, chunk=chunk, workers=workers, buf=buf)
                         counter = 1
 
                 elif counter == 1:
                     #print(1)
                     for n in np.arange(1,len(comblist))[::2]:
-                        S_ij = assemble_S2D(self.sigmas, comblist[n][0], comblist[n][1])                
-                        omega_ij = get_omega_2hole_smpl(self.nu_smpl, comblist[n][0], comblist[n][1])
-                        d_ij = build_d2d(self.cuts2D[n], omega_ij)
-                        Z_ij = build_Z(omega_ij)
-                        x_ij = solve_linear2DMC(Z_ij, d_ij, prec=prec)
-
-                        self.weights, self.dyn_nu, self.sigmas = runsubMC(x_ij, S_ij,\
-                                                         self.weights, self.dyn_nu, self.sigmas,\
-                                                         comblist[n][0], comblist[n][1], prec=prec)
-
-                        self.nu_smpl[comblist[n][0]] = get_nu_smpl(self.dyn_nu[comblist[n][0]],\
-                                                                   self.smpl_idx[:,comblist[n][0]])
-                        self.nu_smpl[comblist[n][1]] = get_nu_smpl(self.dyn_nu[comblist[n][1]],\
-                                                                   self.smpl_idx[:,comblist[n][1]])                  
+                        self.update_pair2DMC(n, comblist, prec=prec, chunk=chunk, workers=workers, buf=buf)
                         counter = 0
 
-                err1 = geterrorleft(self.v_ex, self.weights, self.dyn_nu)
-                err2 = geterrorright(self.v_ex, self.weights, prec)
+                err1, err2 = self.get_errors(prec)
                 error = get_rmse(err1, err2)
                 self.errorl.append(error)
                 
-                self.iter += 1                
+                self.iter += 1
+                self.phase = counter
                 
-                file.write('{} {} {} {} \n'\
-                            .format(self.iter, np.sqrt(err1)*au2ic, np.sqrt(err2)*au2ic, error))
+                log.record(self.iter, np.sqrt(err1)*au2ic, np.sqrt(err2)*au2ic, error, self.rank, '2DMCALSCPD')
+                self.tick_checkpoint()
+                self.prof.next_iter(self.iter, '2DMCALSCPD')
                 it += 1
+                
+                if growing and it % grow_every == 0:
+                    growing = self.adapt_samples('2D', batch, grow_tol, log)
+                    
                 try:
                     if it == cur_perc:
                         perc_iter, perc_cur, track, cur_perc =\
@@ -867,8 +1682,646 @@ class ALSCPD:
                         print('')                        
                 except:
                     pass
+        
+        # no sweep was run, still collect the cuts
+        if produced is not None:
+            try:
+                for n, cut in produced:
+                    cuts[n] = cut
+            except:
+                self.cutmap2D = None
+                raise
+            self.cuts2D = cuts
+        self.phase = 0
                                    
 
+    def init_cuts2D(self):
+        '''self.init_cuts2D()
+        
+                Function to build all 2D cuts up front. Combinations fully covered by existing 1D cuts
+                on the same sampling points are assembled from them. A following self.runMC extracts
+                its 1D cuts from these, so the potential is evaluated only once for both.
+                
+                [Initializes]:
+                        self.cuts2D, self.cutmap2D
+                        self.smpl_idx, self.nu_smpl (if not existent already)'''
+        
+        if type(self.smpl_idx) != np.ndarray:
+            self.draw_samples()
+        comblist = create_comblist(len(self.grids))
+        known = None
+        if type(self.cuts1D) == list:
+            known = get_cuts2D_from_1D(comblist, self.cuts1D, self.smpl_idx)
+        # only the blocks not assembled from the 1D cuts cost potential evaluations
+        new = lambda: [n for n in range(len(comblist)) if known is None or known[n] is None]
+        with self.prof.phase('cuts2D', lambda: cost_cuts(sum(self.cuts2D[n].size for n in new()))):
+            self.cuts2D, self.cutmap2D = get_cuts2D(comblist, self.func2D, self.grids, self.smpl_idx,\
+                                                    cachedir=self.cache, known=known)
+        
+        
+    def update_pair2DMC(self, n, comblist, prec=None, chunk=None, workers=None, buf=None):
+        '''self.update_pair2DMC(n, comblist, prec=None, chunk=None, workers=None, buf=None)
+        
+                Function to update the SPP of one mode combination in the 2DMC-ALSCPD.
+                
+                [Args]:
+                        n[int]: Position of the combination in comblist.
+                        comblist[list]: List of the mode combinations [[i,j],[i,k],...].
+                        prec[float]: Value for the regularization, default is ~1E-8.
+                        chunk[int]: Chunk size for the streamed accumulation of d and Z, default None.
+                        workers[int]: Amount of threads for the streamed accumulation, default None.
+                        buf[array]: Buffer of shape (2,r,s) for the two-hole omega and its weighted
+                                    version, needed if chunk is None.
+                        
+                [Changes]:
+                    
+                    self.weights
+                    self.dyn_nu
+                    self.sigmas
+                    self.nu_smpl'''
+        
+        i, j = comblist[n]
+        prof = self.prof
+        Ni, Nj, s = self.Nlist[i], self.Nlist[j], len(self.smpl_idx)
+        with prof.phase('assemble_S2D', lambda: cost_assemble_S(len(self.Nlist)-2, self.rank)):
+            S_ij = assemble_S2D(self.sigmas, i, j)
+        with prof.phase('build_dZ', lambda: cost_dZ2D(Ni, Nj, self.rank, s, len(self.cuts2D[n]))):
+            if chunk != None:
+                d_ij, Z_ij = build_dZ_chunked(self.cuts2D[n], self.nu_smpl, comblist[n], cutmap=self.cutmap2D[n],\
+                                              smpl_w=self.smpl_w, chunk=chunk, workers=workers)
+            else:
+                omega_ij = get_omega_2hole_smpl(self.nu_smpl, i, j, out=buf[0])
+                d_ij, Z_ij = build_dZ(self.cuts2D[n], omega_ij, cutmap=self.cutmap2D[n], smpl_w=self.smpl_w,\
+                                      buf=buf[1])
+        with prof.phase('solve_linear2DMC', lambda: cost_solve(self.rank, Ni*Nj)):
+            x_ij = solve_linear2DMC(Z_ij, d_ij, prec=prec)
+        
+        with prof.phase('runsubMC', lambda: cost_sub(Ni, Nj, self.rank)):
+            self.weights, self.dyn_nu, self.sigmas = runsubMC(x_ij, S_ij, self.weights, self.dyn_nu, self.sigmas,\
+                                                              i, j, prec=prec)
+        
+        with prof.phase('get_nu_smpl', (2.*self.rank*s, 8*4.*self.rank*s)):
+            get_nu_smpl(self.dyn_nu[i], self.smpl_idx[:,i], out=self.nu_smpl[i])
+            get_nu_smpl(self.dyn_nu[j], self.smpl_idx[:,j], out=self.nu_smpl[j])
+    
+    
+    def get_samples(self, nsmpl, density=False):
+        '''self.get_samples(nsmpl, density=False)
+        
+                Function to draw sampling points with the chosen sampler without storing them.
+                
+                [Args]:
+                        nsmpl[int]: Amount of sampling points.
+                        density[bool]: If True also return the proposal, default False.
+                        
+                [Returns]:
+                        [array]: Sampling points in index representation of shape (s,np.ndim(V)).
+                        [array]: Weights of the sampling points of shape (s,), None if unweighted.
+                        [function]: Only if density is True, the proposal of the importance sampler (see
+                                    MonteC.get_points_importance), None for the other samplers.'''
+        
+        if self.sampler == 'importance':
+            if self.kT == None:
+                raise RuntimeError('Importance sampling needs the Boltzmann temperature kT.')
+            
+            surrogate = self.surrogate
+            if surrogate == 'cp' and not np.any(self.weights):
+                # before the first fit the expansion is zero everywhere and the weights would be uniform
+                print('No fitted expansion yet, using the coarse surrogate for importance sampling.')
+                surrogate = 'coarse'
+            if surrogate == 'cp':
+                # the proposal is kept while the SPP are updated in place
+                weights, SPP = self.weights.copy(), [nu.copy() for nu in self.dyn_nu]
+                surrogate = lambda idx: get_cp_values(weights, SPP, idx)
+            elif surrogate == 'coarse':
+                if getattr(self, 'func1D', None) != None:
+                    surrogate = get_coarse_surrogate(self.func1D, self.grids)
+                elif getattr(self, 'func2D', None) != None:
+                    surrogate = get_coarse_surrogate(self.func2D, self.grids, dim=2)
+                else:
+                    raise RuntimeError('The coarse surrogate needs func1D or func2D.')
+            return get_points_importance(self.grids, nsmpl, surrogate, self.kT, seed=self.next_seed(),\
+                                         density=density)
+        
+        idx = get_points(self.grids, nsmpl, sampler=self.sampler, seed=self.next_seed())
+        return (idx, None, None) if density == True else (idx, None)
+    
+    
+    def next_seed(self):
+        '''Seed for the next sample draw, None if no seed is set.'''
+        
+        self.ndraw += 1
+        return self.last_seed()
+    
+    
+    def last_seed(self):
+        '''Seed of the last sample draw, None if no seed is set.'''
+        
+        return None if self.seed == None or self.ndraw == 0 else [self.seed, self.ndraw-1]
+    
+    
+    def save_samples(self, filename=None):
+        '''self.save_samples(filename=None)
+        
+                Function to write the current sampling points in the binary sample-set format, with the
+                seed of every draw they consist of so they can be redrawn exactly.
+                
+                [Args]:
+                        filename[str]: Name of the file, default None uses <filename>_smpl.npz.
+                        
+                [Returns]:
+                        [str]: Name of the written file.'''
+        
+        if filename == None:
+            base = self.filename[:-4] if self.filename.endswith('.als') else self.filename
+            filename = '{}_smpl.npz'.format(base)
+        return save_smpl(filename, self.smpl_idx, self.Nlist, seed=self.seed, sampler=self.sampler,\
+                         smpl_w=self.smpl_w, draws=self.smpl_draws)
+    
+    
+    def draw_samples(self, nsmpl=None):
+        '''self.draw_samples(nsmpl=None)
+        
+                Function to draw the sampling points with the chosen sampler.
+                
+                [Args]:
+                        nsmpl[int]: Amount of sampling points, default None uses self.nsmpl.
+                
+                [Changes]:
+                    
+                    self.smpl_idx
+                    self.smpl_w
+                    self.proposals
+                    self.nu_smpl'''
+        
+        if nsmpl == None:
+            nsmpl = self.nsmpl
+        with self.prof.phase('samples'):
+            self.smpl_idx, self.smpl_w, proposal = self.get_samples(nsmpl, density=True)
+        self.proposals = [(proposal, len(self.smpl_idx))]
+        self.smpl_draws = [(self.last_seed(), len(self.smpl_idx))]
+        # column-major, the per mode gathers then read contiguous indices
+        self.smpl_idx = np.asfortranarray(self.smpl_idx)
+        self.nu_smpl = get_all_nu_smpl(self.dyn_nu, self.smpl_idx)
+    
+    
+    def grow_samples(self, nsmpl, kind=None):
+        '''self.grow_samples(nsmpl, kind=None)
+        
+                Function to append new sampling points. Only the cuts which are not known yet are
+                computed, the existing cuts of the given kind are extended, the ones of the other kind no
+                longer match the sampling points and are dropped (they are rebuilt when needed). With
+                importance sampling the new points come from another proposal than the old ones, the
+                weights of the complete set are taken against the mixture of all proposals (see
+                MonteC.get_mixture_weights).
+                
+                [Args]:
+                        nsmpl[int]: Amount of sampling points to append.
+                        kind[str]: '1D' or '2D', type of the cuts to extend. Default None extends both.
+                        
+                [Changes]:
+                    
+                    self.smpl_idx
+                    self.smpl_w
+                    self.proposals
+                    self.nu_smpl
+                    self.cuts1D, self.cutmap1D (if existent)
+                    self.cuts2D, self.cutmap2D (if existent)'''
+        
+        new_idx, new_w, proposal = self.get_samples(nsmpl, density=True)
+        old_idx = self.smpl_idx
+        
+        if kind == '2D':
+            self.cuts1D, self.cutmap1D = None, None
+        elif type(self.cuts1D) == list:
+            holes = [[k] for k in range(len(self.grids))]
+            _, self.cuts1D, self.cutmap1D = extend_cuts(holes, self.func1D, self.grids, old_idx, self.cuts1D,\
+                                                       new_idx, cachedir=self.cache)
+        if kind == '1D':
+            self.cuts2D, self.cutmap2D = None, None
+        elif type(self.cuts2D) == CutStore2D:
+            self.cuts2D.extend(new_idx)
+            self.cutmap2D = self.cuts2D.cutmaps
+        elif type(self.cuts2D) == list:
+            _, self.cuts2D, self.cutmap2D = extend_cuts(create_comblist(len(self.grids)), self.func2D, self.grids,\
+                                                       old_idx, self.cuts2D, new_idx, cachedir=self.cache)
+        
+        self.smpl_idx = np.asfortranarray(np.concatenate([old_idx, new_idx]))
+        if self.proposals is not None:
+            self.proposals.append((proposal, len(new_idx)))
+        self.smpl_draws.append((self.last_seed(), len(new_idx)))
+        if self.smpl_w is not None or new_w is not None:
+            if self.proposals is not None:
+                self.smpl_w = get_mixture_weights(self.smpl_idx, self.proposals)
+            else:
+                print('The proposal of the old sampling points is unknown, their weights are kept.')
+                old_w = np.ones(len(old_idx)) if self.smpl_w is None else self.smpl_w
+                new_w = np.ones(len(new_idx)) if new_w is None else new_w
+                self.smpl_w = np.concatenate([old_w, new_w])
+        self.nu_smpl = np.concatenate([self.nu_smpl, get_all_nu_smpl(self.dyn_nu, new_idx)], axis=2)
+    
+    
+    def setup_validation(self, nval, kind):
+        '''self.setup_validation(nval, kind)
+        
+                Function to draw a held-out set of sampling points and compute its cuts. These are never
+                used for fitting, only to estimate the error. An existing set of another size is redrawn.
+                
+                [Args]:
+                        nval[int]: Amount of held-out sampling points, None keeps an existing set (or draws
+                                   self.nval points).
+                        kind[str]: '1D' or '2D', type of the held-out cuts.
+                        
+                [Changes]:
+                    
+                    self.nval
+                    self.val_idx
+                    self.val_w
+                    self.val_cuts1D, self.val_cutmap1D or self.val_cuts2D, self.val_cutmap2D'''
+        
+        if type(self.val_idx) == np.ndarray and nval != None and nval != len(self.val_idx):
+            # the cuts of the old set do not fit the new one
+            self.val_idx, self.val_w = None, None
+            self.val_cuts1D, self.val_cutmap1D, self.val_cuts2D, self.val_cutmap2D = None, None, None, None
+        if type(self.val_idx) != np.ndarray:
+            self.nval = self.nval if nval == None else nval
+            self.val_idx, self.val_w = self.get_samples(self.nval)
+        
+        if kind == '1D' and type(self.val_cuts1D) != list and type(self.val_cuts2D) == list:
+            self.val_cuts1D, self.val_cutmap1D = get_cuts1D_from_2D(create_comblist(len(self.grids)), self.val_cuts2D,\
+                                                                    self.val_cutmap2D, self.val_idx)
+        elif kind == '1D' and type(self.val_cuts1D) != list:
+            self.val_cuts1D, self.val_cutmap1D = get_cuts1D(self.func1D, self.grids, self.val_idx, cachedir=self.cache)
+        elif kind == '2D' and type(self.val_cuts2D) != list:
+            self.val_cuts2D, self.val_cutmap2D = get_cuts2D(create_comblist(len(self.grids)), self.func2D,\
+                                                            self.grids, self.val_idx, cachedir=self.cache)
+    
+    
+    def get_errors(self, prec=None):
+        '''self.get_errors(prec=None)
+        
+                Function to get both parts of the ALS functional for the current expansion. With the exact
+                tensor the error is computed on the full grid, in tensor-free mode the left hand side is
+                estimated on the held-out cuts (which are drawn on the first call).
+                
+                [Args]:
+                        prec[float]: Value for the regularization, default is ~1E-8.
+                        
+                [Returns]:
+                        [float]: MSE of the left hand side of the ALS functional.
+                        [float]: MSE of the right hand side of the ALS functional.'''
+        
+        if type(self.v_ex) == np.ndarray:
+            # the empty expansion (initial guess, reset) has the cached mean square of the tensor as error
+            if not np.any(self.weights):
+                self.mse = self.shared.msq, 0.0
+                return self.mse
+            with self.prof.phase('error', lambda: cost_error(self.Nlist, self.rank)):
+                self.mse = geterrorleft(self.v_ex, self.weights, self.dyn_nu), geterrorright(self.v_ex, self.weights, prec)
+            return self.mse
+        
+        self.setup_validation(self.nval, self.val_kind)
+        if prec == None:
+            prec = np.sqrt(np.finfo(float).eps)
+        holes = lambda: [[k] for k in range(len(self.grids))] if self.val_kind == '1D' else create_comblist(len(self.grids))
+        with self.prof.phase('val_error', lambda: cost_cut_error(self.Nlist, self.rank, len(self.val_idx), holes())):
+            self.mse = self.get_val_error(self.val_kind), (prec*(self.weights**2)).sum()/np.prod(self.Nlist)
+        return self.mse
+    
+    
+    def get_val_error(self, kind):
+        '''self.get_val_error(kind)
+        
+                Function to estimate the error of the current expansion on the held-out cuts.
+                
+                [Args]:
+                        kind[str]: '1D' or '2D', type of the held-out cuts to be used.
+                        
+                [Returns]:
+                        [float]: Mean squared error on the held-out cuts in au².'''
+        
+        if kind == '1D':
+            return get_cut_error(self.weights, self.dyn_nu, self.val_idx, self.val_cuts1D, self.val_cutmap1D,\
+                                 [[k] for k in range(len(self.grids))], smpl_w=self.val_w)
+        return get_cut_error(self.weights, self.dyn_nu, self.val_idx, self.val_cuts2D, self.val_cutmap2D,\
+                             create_comblist(len(self.grids)), smpl_w=self.val_w)
+    
+    
+    def adapt_samples(self, kind, batch, grow_tol, log):
+        '''self.adapt_samples(kind, batch, grow_tol, log)
+        
+                Function to decide if the sample set should grow. The held-out error is compared to the one
+                of the last call, if it changed less than grow_tol (relative) or self.nsmpl points are reached
+                the set is kept, otherwise batch new points are appended.
+                
+                [Args]:
+                        kind[str]: '1D' or '2D', type of the cuts.
+                        batch[int]: Amount of sampling points to append.
+                        grow_tol[float]: Relative change of the held-out error to signal a stable estimate.
+                        log[sink]: Opened log sink to note the growth in, see ALS.logsink.
+                        
+                [Returns]:
+                        [bool]: True if the set was grown and should keep growing, False otherwise.'''
+        
+        val_err = np.sqrt(self.get_val_error(kind))*au2ic
+        prev_err, self.val_err = self.val_err, val_err
+        
+        size = self.smpl_idx.shape[0]
+        if size >= self.nsmpl or (prev_err != None and abs(prev_err - val_err) <= grow_tol*val_err):
+            log.note('Sample set fixed at {} points (held-out RMSE {:.2f} cm-1).'.format(size, val_err))
+            return False
+        
+        self.grow_samples(min(batch, self.nsmpl - size), kind=kind)
+        log.note('Sample set grown to {} points (held-out RMSE {:.2f} cm-1).'\
+                 .format(self.smpl_idx.shape[0], val_err))
+        return True
+    
+    
+    def set_profiling(self, enabled=True, memory=None):
+        '''self.set_profiling(enabled=True, memory=None)
+        
+                Function to switch the per phase timers of the run routines on or off, what was recorded
+                so far is kept.
+                
+                [Args]:
+                        enabled[bool]: Switch the profiler on (True) or off (False).
+                        memory[str]: Memory tracking of the phases, None (off), 'tracemalloc' (exact but
+                                    slower) or 'rss' (sampled resident set size). Default None.'''
+        
+        self.prof.enabled = enabled
+        self.prof.set_memory(memory if enabled == True else None)
+    
+    
+    def estimate_peak(self, method):
+        '''self.estimate_peak(method)
+        
+                Function to predict the peak memory of a run routine with the current rank and sample
+                set, see ALS.profiler.estimate_peak.
+                
+                [Args]:
+                        method[str]: '1DALSCPD', '2DALSCPD', '2DALSCPD/SVD', '1DMCALSCPD' or '2DMCALSCPD'.
+                        
+                [Returns]:
+                        [float]: Predicted peak in bytes.
+                        [dict]: Bytes of the resident arrays and of the transients of every phase.'''
+        
+        nsmpl = self.smpl_idx.shape[0] if type(self.smpl_idx) == np.ndarray else self.nsmpl
+        return estimate_peak(self.Nlist, self.rank, nsmpl=nsmpl, method=method,\
+                             tensor=type(self.v_ex) == np.ndarray, cut_itemsize=np.dtype(self.cut_dtype).itemsize,\
+                             nval=self.nval)
+    
+    
+    def check_memory(self, method):
+        '''self.check_memory(method)
+        
+                Function to compare the predicted peak of a run routine with self.mem_budget, above it
+                the run is refused (self.mem_policy 'refuse') or a warning is printed and logged.
+                
+                [Args]:
+                        method[str]: Method about to run, see self.estimate_peak.
+                        
+                [Returns]:
+                        [float]: Predicted peak in bytes, None without budget.'''
+        
+        if self.mem_budget == None:
+            return None
+        peak, phases = self.estimate_peak(method)
+        if peak > self.mem_budget:
+            phase = max((key for key in phases if key != 'resident'), key=lambda key: phases[key], default='resident')
+            text = '{} needs about {:.1f} MB (resident {:.1f} MB, largest phase {}), the budget is {:.1f} MB.'\
+                   .format(method, peak/1E6, phases['resident']/1E6, phase, self.mem_budget/1E6)
+            if self.mem_policy == 'refuse':
+                raise RuntimeError(text)
+            print('Warning: '+text)
+            with self.log as log:
+                log.note('Warning: '+text)
+        return peak
+    
+    
+    def get_profile(self, method=None, per_iter=False):
+        '''self.get_profile(method=None, per_iter=False)
+        
+                Function to query the profile of the run routines, see ALS.profiler.Profiler.
+                
+                [Args]:
+                        method[str]: Only count the iterations of this method (e.g. '2DMCALSCPD'), default
+                                    None counts all.
+                        per_iter[bool]: If True return the table with one row per iteration and phase
+                                    instead of the totals. Default False.
+                        
+                [Returns]:
+                        [dict]: Totals per phase (time [s], flops, bytes, calls, time_per_call, GFLOPs, GBs).
+                        OR
+                        [array]: Structured array with the fields iter, method, phase, time, flops, bytes
+                                 and calls.'''
+        
+        if per_iter == True:
+            table = self.prof.get_table()
+            return table if method == None else table[table['method'] == method]
+        return self.prof.get_summary(method)
+    
+    
+    def save_profile(self):
+        '''self.save_profile()
+        
+                Function to write the profile next to the output file (name.alsp).
+                
+                [Returns]:
+                        [str]: Name of the written file.'''
+        
+        return self.prof.save(self.filename)
+    
+    
+    def set_checkpoint(self, path, every=None, seconds=None):
+        '''self.set_checkpoint(path, every=None, seconds=None)
+        
+                Function to switch on periodic checkpoints, every run routine writes one when it is due.
+                
+                [Args]:
+                        path[str]: Name of the checkpoint file, .npz is appended if missing. None switches
+                                   the checkpoints off.
+                        every[int]: Write a checkpoint every this many iterations. Default None, which is
+                                   10 iterations if seconds is not given either.
+                        seconds[float]: Write a checkpoint if the last one is older than this, default None.'''
+        
+        if path != None and not str(path).endswith('.npz'):
+            path = str(path) + '.npz'
+        self.checkpoint = path
+        self.ckpt_every = 10 if every == None and seconds == None else every
+        self.ckpt_seconds = seconds
+        self.ckpt_last = time.time()
+    
+    
+    def tick_checkpoint(self):
+        '''Write a checkpoint if one is due, called by the run routines after every iteration.'''
+        
+        if self.checkpoint == None:
+            return
+        if (self.ckpt_every != None and self.iter % self.ckpt_every == 0) or\
+           (self.ckpt_seconds != None and time.time()-self.ckpt_last >= self.ckpt_seconds):
+            self.save_checkpoint()
+    
+    
+    def save_checkpoint(self, path=None):
+        '''self.save_checkpoint(path=None)
+        
+                Function to write the current state to a single (atomically written) .npz file: SPP,
+                weights, sigmas, iteration, errors, rank, the position of the log (truncated to it on
+                resume), the state of the global random generator and for Monte-Carlo the sampling points,
+                the sampled SPP and the held-out points. The cuts are only stored if no cut cache is set,
+                otherwise they are reloaded from the cache.
+                
+                [Args]:
+                        path[str]: Name of the checkpoint file, default None uses self.checkpoint.
+                        
+                [Returns]:
+                        [str]: Name of the written file.'''
+        
+        path = self.checkpoint if path == None else path
+        if path == None:
+            raise RuntimeError('No checkpoint file set, see set_checkpoint.')
+        
+        rng = np.random.get_state()
+        data = {'filename': self.filename, 'rank': self.rank, 'iter': self.iter, 'errorl': np.array(self.errorl),\
+                'Nlist': np.array(self.Nlist), 'weights': self.weights, 'dyn_nu': list(self.dyn_nu),\
+                'sigmas': list(self.sigmas), 'nu_list_init': list(self.nu_list_init),\
+                'tensor': type(self.v_ex) == np.ndarray, 'job': self.job, 'job_start': self.job_start,\
+                'phase': self.phase, 'log': 'binary' if isinstance(self.log, BinaryLog) else 'text',\
+                'ckpt_every': self.ckpt_every, 'ckpt_seconds': self.ckpt_seconds,\
+                'rng_keys': rng[1], 'rng_pos': rng[2], 'rng_gauss': np.array([rng[3], rng[4]]),\
+                'sampler': self.sampler if type(self.sampler) == str else None,\
+                'surrogate': self.surrogate if type(self.surrogate) == str else None,\
+                'kT': self.kT, 'seed': self.seed, 'keep_smpl': self.keep_smpl, 'ndraw': self.ndraw,\
+                'nval': self.nval, 'val_kind': self.val_kind,\
+                'nsmpl': self.nsmpl, 'cache': self.cache, 'cutstore': self.cutstore,\
+                'cut_dtype': np.dtype(self.cut_dtype).name, 'cut_budget': self.cut_budget,\
+                'log_pos': self.log.position() if hasattr(self.log, 'position') else None}
+        if self.grids != None:
+            data.update({'grids': [np.asarray(grid) for grid in self.grids], 'smpl_idx': self.smpl_idx,\
+                         'smpl_w': self.smpl_w, 'nu_smpl': self.nu_smpl, 'val_idx': self.val_idx, 'val_w': self.val_w})
+            data['draw_seeds'], data['draw_sizes'] = pack_draws(self.smpl_draws)
+            if self.cache == None:
+                for name in ['cuts1D', 'cutmap1D', 'cuts2D', 'cutmap2D', 'val_cuts1D', 'val_cutmap1D',\
+                             'val_cuts2D', 'val_cutmap2D']:
+                    value = getattr(self, name)
+                    if type(value) == list and all(cut is not None for cut in value):
+                        data[name] = [np.asarray(cut) for cut in value]
+        if self.tc_points != None:
+            data.update({'tc_'+key: value for key, value in self.tc_points.items()})
+        
+        path = write_checkpoint(path, data)
+        self.ckpt_last = time.time()
+        return path
+    
+    
+    @classmethod
+    def resume(cls, path, v_ex=None, func1D=None, func2D=None, sampler=None, surrogate=None):
+        '''ALSCPD.resume(path, v_ex=None, func1D=None, func2D=None)
+        
+                Function to rebuild an object from a checkpoint (see self.save_checkpoint) without running
+                the initialization, neither the initial error nor stored cuts are recomputed. The output file
+                is continued from the iteration of the checkpoint (later records are dropped) and further
+                checkpoints go to the same file.
+                
+                [Args]:
+                        path[str]: Name of the checkpoint file.
+                        v_ex[array]: The exact tensor (or its SharedTensor), needed if the checkpoint was
+                                   written with it.
+                        func1D[function]: Constructor of the 1D cuts, needed to compute missing cuts.
+                        func2D[function]: Constructor of the 2D cuts, needed to compute missing cuts.
+                        sampler[function]: Callable sampler, needed if the object used one (only strings are
+                                   stored in the checkpoint).
+                        surrogate[function]: Callable surrogate for importance sampling, see sampler.
+                        
+                [Returns]:
+                        [ALSCPD]: The object in the state of the checkpoint.'''
+        
+        data = read_checkpoint(path)
+        if data['tensor'] == True:
+            if type(v_ex) != np.ndarray and not isinstance(v_ex, SharedTensor):
+                raise RuntimeError('Checkpoint {} was written with the exact tensor, pass it as v_ex.'.format(path))
+            if list(v_ex.shape) != data['Nlist'].tolist():
+                raise RuntimeError('The tensor has shape {}, the checkpoint {}.'.format(v_ex.shape, data['Nlist']))
+        
+        self = cls.__new__(cls)
+        self.filename = data['filename']
+        self.shared = get_shared(v_ex) if data['tensor'] == True else None
+        self.v_ex = self.shared.array if self.shared != None else None
+        self.mse = None
+        self.rank = data['rank']
+        self.Nlist = data['Nlist'].tolist()
+        self.weights = data['weights']
+        self.nu_list_init = data['nu_list_init']
+        self.dyn_nu = data['dyn_nu']
+        self.sigmas = data['sigmas']
+        self.iter = data['iter']
+        self.errorl = data['errorl'].tolist()
+        
+        self.func1D = func1D
+        self.func2D = func2D
+        self.grids = data.get('grids')
+        self.nsmpl = data.get('nsmpl')
+        self.cache = data.get('cache')
+        self.cutstore = data['cutstore']
+        self.cut_dtype = np.dtype(data['cut_dtype'])
+        self.cut_budget = data.get('cut_budget')
+        self.nval = data.get('nval')
+        self.val_kind = data.get('val_kind')
+        self.sampler = data.get('sampler') if sampler == None else sampler
+        self.surrogate = data.get('surrogate') if surrogate == None else surrogate
+        self.kT = data.get('kT')
+        self.seed = data.get('seed')
+        self.keep_smpl = data.get('keep_smpl', True)
+        self.ndraw = data['ndraw']
+        self.combl = None
+        
+        self.smpl_idx = data.get('smpl_idx')
+        if type(self.smpl_idx) == np.ndarray:
+            self.smpl_idx = np.asfortranarray(self.smpl_idx)
+        self.smpl_w = data.get('smpl_w')
+        # the proposals are not stored, without weights the set is uniform
+        self.proposals = None
+        if self.smpl_w is None:
+            self.proposals = [] if self.smpl_idx is None else [(None, len(self.smpl_idx))]
+        if 'draw_seeds' in data:
+            self.smpl_draws = unpack_draws(data['draw_seeds'], data['draw_sizes'])
+        else:
+            self.smpl_draws = [] if self.smpl_idx is None else [(None, len(self.smpl_idx))]
+        self.nu_smpl = data.get('nu_smpl')
+        self.val_idx = data.get('val_idx')
+        self.val_w = data.get('val_w')
+        for name in ['cuts1D', 'cutmap1D', 'cuts2D', 'cutmap2D', 'val_cuts1D', 'val_cutmap1D',\
+                     'val_cuts2D', 'val_cutmap2D']:
+            setattr(self, name, data.get(name))
+        tc = {key[3:]: value for key, value in data.items() if key.startswith('tc_')}
+        self.tc_points = tc if tc else None
+        if self.tc_points != None:
+            for key in ['idx', 'values', 'w', 'val_idx', 'val_values', 'val_w']:
+                self.tc_points.setdefault(key, None)
+        
+        self.checkpoint = str(path)
+        self.ckpt_every = data.get('ckpt_every')
+        self.ckpt_seconds = data.get('ckpt_seconds')
+        self.ckpt_last = time.time()
+        self.job = data.get('job')
+        self.job_start = data['job_start']
+        self.phase = data['phase']
+        self.log = get_log_sink(data.get('log'), self.filename)
+        self.prof = Profiler()
+        self.mem_budget = None
+        self.mem_policy = 'warn'
+        
+        np.random.set_state(('MT19937', data['rng_keys'], data['rng_pos'], int(data['rng_gauss'][0]),\
+                             float(data['rng_gauss'][1])))
+        
+        # the records written after the checkpoint are superseded by the resumed run
+        if data.get('log_pos') is not None and hasattr(self.log, 'truncate'):
+            self.log.truncate(data['log_pos'])
+        with self.log as log:
+            log.note('Resumed from checkpoint {} at iteration {}.'.format(path, self.iter))
+        return self
+    
+    
     def plot_error(self, marker='', show=True):
         '''self.plot_error(marker='')
             
@@ -900,6 +2353,80 @@ class ALSCPD:
         return self.weights, self.dyn_nu
     
     
+    def evaluate(self, idx, chunk=65536):
+        '''self.evaluate(idx, chunk=65536)
+        
+               Function to evaluate the current expansion at single grid points, the rows of the SPP are
+               gathered for the points so the cost is O(n*f*r) and the full tensor is never built.
+               
+               [Args]:
+                       idx[array]: Grid points in index representation of shape (n, f), a single point can
+                                      be given in shape (f,).
+                       chunk[int]: Amount of points evaluated at once, bounds the temporaries to O(r*chunk).
+                                      Default 65536.
+                                      
+               [Returns]:
+                       [array]: Values of the expansion at the points of shape (n,), () for a single point.'''
+        
+        idx = np.asarray(idx)
+        single = idx.ndim == 1
+        idx = np.atleast_2d(idx)
+        if idx.shape[1] != len(self.Nlist):
+            raise RuntimeError('Points of {} indices given for a tensor with {} modes.'.format(idx.shape[1],\
+                                                                                                len(self.Nlist)))
+        values = np.empty(idx.shape[0])
+        for start in range(0, idx.shape[0], chunk):
+            values[start:start+chunk] = get_cp_values(self.weights, self.dyn_nu, idx[start:start+chunk])
+        return values[0] if single else values
+    
+    
+    def evaluate_slice(self, point, modes):
+        '''self.evaluate_slice(point, modes)
+        
+               Function to evaluate the current expansion along one or two modes through a grid point (the
+               1D or 2D cut through the expansion) without building the full tensor.
+               
+               [Args]:
+                       point[list]: Grid point in index representation of length f, the entries of the
+                                      modes along the slice are ignored.
+                       modes[int or list]: Mode of the 1D slice or pair [i,j] of modes of the 2D slice.
+                       
+               [Returns]:
+                       [array]: The slice of shape (Ni,) or (Ni,Nj).'''
+        
+        modes = [modes] if np.ndim(modes) == 0 else list(modes)
+        if len(modes) not in (1, 2) or len(set(modes)) != len(modes):
+            raise RuntimeError('A slice is taken along one or two distinct modes, not {}.'.format(modes))
+        # contract the fixed modes into the weights
+        coef = np.array(self.weights, dtype=float)
+        for k, nu in enumerate(self.dyn_nu):
+            if k not in modes:
+                coef = coef*nu[:, point[k]]
+        if len(modes) == 1:
+            return coef @ self.dyn_nu[modes[0]]
+        return (self.dyn_nu[modes[0]].T*coef) @ self.dyn_nu[modes[1]]
+    
+    
+    def get_interpolator(self, dvrs, maps=None, baseline=True, chunk=65536):
+        '''self.get_interpolator(dvrs, maps=None, baseline=True, chunk=65536)
+        
+               Function to get a surrogate of the potential at arbitrary coordinates from the current
+               expansion, the SPP are interpolated with the DVRs of the grids (see ALS.interp).
+               
+               [Args]:
+                       dvrs[list]: The sinDVR or hoDVR of every mode, in the order of the modes.
+                       maps[list]: Map of every mode from the coordinate to the DVR coordinate, e.g. np.cos
+                                      for an angle on a DVR in cos(theta). Default None.
+                       baseline[bool]: If True only the SPP minus the line through their end points are
+                                      interpolated with the DVR, default True.
+                       chunk[int]: Amount of coordinates evaluated at once, default 65536.
+                                      
+               [Returns]:
+                       [CPInterpolator]: Callable elementwise like the potential.'''
+        
+        return CPInterpolator(self.weights, self.dyn_nu, dvrs, maps=maps, baseline=baseline, chunk=chunk)
+    
+    
     def change_rank(self, new_rank):
         '''self.change_rank(new_rank):
             
@@ -943,8 +2470,8 @@ class ALSCPD:
             # update the objects sigmas
             self.sigmas = get_sigmas(self.dyn_nu)
         
-            with open('{}'.format(self.filename), 'a') as file:
-                file.write('! Rank of expansion was changed from {} to {}. \n'.format(old_rank, self.rank))
+            with self.log as log:
+                log.note('Rank of expansion was changed from {} to {}.'.format(old_rank, self.rank))
         
         except ValueError:
             print('New rank cant be smaller than old rank')
@@ -2,39 +2,294 @@ import numpy as np
 from ALS.ALS1D import *
 from ALS.twoDsub import *
 from ALS.tracker import *
+from ALS.cutcache import *
+from ALS.profiler import *
 from os import sched_getaffinity
+import os
+from concurrent.futures import ThreadPoolExecutor
 import multiprocessing as mp
 
-def rndm(upper, nsmpl):
+def rndm(upper, nsmpl, rng=np.random):
     '''Function to create a given amount of random integer values in a given half-open interval
     with lower border set to 0.
     
     [Args]:
             upper[float]: Upper bound below which values are chosen.
             amount[int]: Number of integer values to return.
+            rng[RandomState]: Random number generator, default is the global numpy one.
             
     [Return]:
             [array]: Array containing the random integers.'''
     
-    return np.random.randint(0, upper, size=nsmpl)
+    return rng.randint(0, upper, size=nsmpl)
 
 
-def get_points(Grid_List, nsmpl):
+def smpl_uniform(Grid_List, nsmpl, rng=np.random):
+    '''Sampler drawing independent uniform grid indices along every axis.
+    
+    [Args]:
+            Grid_List[list]: List containing the complete grids for the coordinates.
+            nsmpl[int]: Amount of sampling points.
+            rng[RandomState]: Random number generator, default is the global numpy one.
+            
+    [Returns]:
+            [array]: Array with the sampling points of shape (s, len(Grid_List)).'''
+    
+    smpl = np.zeros((nsmpl, len(Grid_List)), dtype=int)
+    for i in range(len(Grid_List)):
+        smpl[:,i] = rndm(len(Grid_List[i]), nsmpl, rng)
+    return smpl
+
+
+def smpl_lhs(Grid_List, nsmpl, rng=np.random):
+    '''Sampler drawing a latin hypercube on the index grid. Along every axis the unit interval is
+    devided into nsmpl strata with one point each, so every grid index is drawn
+    floor(s/Ni) or ceil(s/Ni) times.
+    
+    [Args]:
+            Grid_List[list]: List containing the complete grids for the coordinates.
+            nsmpl[int]: Amount of sampling points.
+            rng[RandomState]: Random number generator, default is the global numpy one.
+            
+    [Returns]:
+            [array]: Array with the sampling points of shape (s, len(Grid_List)).'''
+    
+    smpl = np.zeros((nsmpl, len(Grid_List)), dtype=int)
+    for i, grid in enumerate(Grid_List):
+        u = (rng.permutation(nsmpl) + rng.random_sample(nsmpl))/nsmpl
+        smpl[:,i] = np.minimum((u*len(grid)).astype(int), len(grid)-1)
+    return smpl
+
+
+def smpl_sobol(Grid_List, nsmpl, rng=np.random):
+    '''Sampler mapping a scrambled Sobol sequence onto the index grid.
+    
+    [Args]:
+            Grid_List[list]: List containing the complete grids for the coordinates.
+            nsmpl[int]: Amount of sampling points, the sequence is balanced for powers of two.
+            rng[RandomState]: Random number generator used to seed the scrambling.
+            
+    [Returns]:
+            [array]: Array with the sampling points of shape (s, len(Grid_List)).'''
+    
+    from scipy.stats import qmc
+    sobol = qmc.Sobol(d=len(Grid_List), scramble=True, seed=rng.randint(2**31))
+    # scipy warns if nsmpl is not a power of two, drawing the next power and cutting is fine here
+    u = sobol.random_base2(int(np.ceil(np.log2(max(nsmpl, 1)))))[:nsmpl]
+    smpl = np.zeros((nsmpl, len(Grid_List)), dtype=int)
+    for i, grid in enumerate(Grid_List):
+        smpl[:,i] = np.minimum((u[:,i]*len(grid)).astype(int), len(grid)-1)
+    return smpl
+
+
+def smpl_stratified(Grid_List, nsmpl, rng=np.random):
+    '''Sampler stratifying the index grid by mode. Every axis is split into equally sized strata, the
+    number of strata per mode being proportional to its grid size (at most Ni) such that the product
+    of all strata does not exceed nsmpl. Every cell of the resulting partition gets the same amount of
+    points (the remainder is spread over random cells), drawn uniformly inside the cell and mapped
+    onto the grid indices.
+    
+    [Args]:
+            Grid_List[list]: List containing the complete grids for the coordinates.
+            nsmpl[int]: Amount of sampling points.
+            rng[RandomState]: Random number generator, default is the global numpy one.
+            
+    [Returns]:
+            [array]: Array with the sampling points of shape (s, len(Grid_List)).'''
+    
+    Nlist = np.array([len(g) for g in Grid_List])
+    scale = min((nsmpl/np.prod(Nlist.astype(float)))**(1/len(Nlist)), 1)
+    nstrata = np.clip(np.floor(Nlist*scale).astype(int), 1, Nlist)
+    # greedily refine the coarsest axis as long as there are enough points for all cells
+    while True:
+        order = np.argsort(nstrata/Nlist)
+        for k in order:
+            if nstrata[k] < Nlist[k] and np.prod(nstrata)//nstrata[k]*(nstrata[k]+1) <= nsmpl:
+                nstrata[k] += 1
+                break
+        else:
+            break
+    ncells = int(np.prod(nstrata))
+    cells = np.repeat(np.arange(ncells), nsmpl//ncells)
+    cells = np.concatenate([cells, rng.permutation(ncells)[:nsmpl-len(cells)]])
+    strata = np.unravel_index(cells, nstrata)
+    smpl = np.zeros((nsmpl, len(Grid_List)), dtype=int)
+    for i in range(len(Grid_List)):
+        u = (strata[i] + rng.random_sample(nsmpl))/nstrata[i]
+        smpl[:,i] = np.minimum((u*Nlist[i]).astype(int), Nlist[i]-1)
+    return smpl[rng.permutation(nsmpl)]
+
+
+# available samplers, get_points also accepts any callable with the same signature
+samplers = {'uniform': smpl_uniform, 'lhs': smpl_lhs, 'sobol': smpl_sobol, 'stratified': smpl_stratified}
+
+
+def get_points(Grid_List, nsmpl, sampler='uniform', seed=None):
     '''Function to get a set amount of sampling points.
     
     [Args]:
-            V[array]: The complete tensor.
+            Grid_List[list]: List containing the complete grids for the coordinates.
             nsmpl[int]: Amount of sampling points.
+            sampler[str]: Sampling strategy, one of 'uniform' (default), 'lhs', 'sobol' and 'stratified'
+                        or a callable sampler(Grid_List, nsmpl, rng) returning the index array.
+            seed[int]: Seed for the sampler, default None uses the global numpy random state.
             
     [Returns]:
             [array]: Array with the sampling points of shape (s, np.ndim(V)).'''
     
-    #get the random sampling point matrix in index representation
-    V_dim = len(Grid_List)
-    smpl = np.zeros((nsmpl, V_dim), dtype=int)
-    for i in range(V_dim):
-        smpl[:,i] = rndm(len(Grid_List[i]), nsmpl)
-    return smpl
+    if seed is None:
+        rng = np.random
+    else:
+        rng = np.random.RandomState(seed)
+    
+    if callable(sampler):
+        return np.asarray(sampler(Grid_List, nsmpl, rng), dtype=int)
+    try:
+        return samplers[sampler](Grid_List, nsmpl, rng)
+    except KeyError:
+        raise RuntimeError('Unknown sampler {}, choose from {}.'.format(sampler, list(samplers)))
+
+
+def get_cp_values(weights, SPP, idx):
+    '''Function to evaluate a CP expansion at given grid points without building the full tensor.
+    
+    [Args]:
+            weights[array]: Weights of shape (r,).
+            SPP[list]: List of the SPP in shape (r,Ni).
+            idx[array]: Grid points in index representation of shape (n, len(SPP)).
+            
+    [Returns]:
+            [array]: Values of the expansion at the points, shape (n,).'''
+    
+    prod = np.ones((len(weights), idx.shape[0]))
+    for k, nu in enumerate(SPP):
+        prod *= nu[:, idx[:,k]]
+    return weights @ prod
+
+
+def get_coarse_surrogate(constructor, Grid_List, stride=2, dim=1, max_points=1E5):
+    '''Function to get a cheap surrogate of the potential from its values on a coarse subgrid (every
+    stride-th grid point along every mode, the last point is always included). Points between the
+    coarse points take the value of the nearest coarse point. The coarse subgrid grows exponentially
+    with the number of modes, the stride is increased until it has at most max_points points.
+    
+    [Args]:
+            constructor[function]: Function to compute the cuts through the potential.
+            Grid_List[list]: List containing the complete grids for the coordinates.
+            stride[int]: Distance of the coarse points in grid indices, default 2.
+            dim[int]: Dimension of the cuts the constructor computes, 1 (func1D) or 2 (func2D), default 1.
+            max_points[int]: Maximum size of the coarse subgrid, default 1E5.
+            
+    [Returns]:
+            [function]: Surrogate taking an index array of shape (n, len(Grid_List)) and returning the
+                    values of shape (n,).'''
+    
+    if dim not in [1, 2] or dim > len(Grid_List):
+        raise RuntimeError('Coarse surrogate with {}D cuts for {} modes is not possible.'.format(dim, len(Grid_List)))
+    
+    get_coarse = lambda stride: [np.unique(np.append(np.arange(0, len(g), stride), len(g)-1)) for g in Grid_List]
+    coarse = get_coarse(stride)
+    while np.prod([float(len(c)) for c in coarse]) > max_points and any(len(c) > 2 for c in coarse):
+        stride += 1
+        coarse = get_coarse(stride)
+    if np.prod([float(len(c)) for c in coarse]) > max_points:
+        raise RuntimeError('The coarse subgrid of {} modes exceeds {} points.'.format(len(Grid_List), max_points))
+    
+    # cuts along the first (two) mode(s) for all combinations of the coarse points of the other modes
+    others = np.meshgrid(*coarse[dim:], indexing='ij')
+    points = np.zeros((others[0].size if others else 1, len(Grid_List)), dtype=int)
+    for k, elem in enumerate(others):
+        points[:,k+dim] = elem.reshape(-1)
+    true = get_true_points(Grid_List, points)
+    if dim == 1:
+        cuts = get_cuts_ind(constructor, np.asarray(Grid_List[0])[coarse[0]], 0, true)
+    else:
+        cuts = get_cuts_ind2D(constructor, np.asarray(Grid_List[0])[coarse[0]], 0,\
+                              np.asarray(Grid_List[1])[coarse[1]], 1, true)
+    V_coarse = cuts.reshape([len(c) for c in coarse])
+    
+    def surrogate(idx):
+        # nearest coarse point along every mode
+        cidx = [np.abs(idx[:,k,np.newaxis]-c[np.newaxis,:]).argmin(axis=1) for k, c in enumerate(coarse)]
+        return V_coarse[tuple(cidx)]
+    return surrogate
+
+
+def get_points_importance(Grid_List, nsmpl, surrogate, kT, mix=0.1, npool=None, seed=None, density=False):
+    '''Function to draw sampling points with Boltzmann-like weights from a cheap surrogate of the
+    potential. The points are drawn (with replacement) from a pool of candidates with probability
+    q = (1-mix)*exp(-(V-Vmin)/kT)/Z + mix/npool, the returned weights w = 1/(npool*q) (normalized
+    to mean 1) undo the bias, so the weighted least-squares problem estimates the one over the
+    complete grid.
+    
+    [Args]:
+            Grid_List[list]: List containing the complete grids for the coordinates.
+            nsmpl[int]: Amount of sampling points.
+            surrogate[function]: Callable taking an index array of shape (n, len(Grid_List)) and
+                        returning the approximate potential of shape (n,) in au, e.g. a closure
+                        over get_cp_values or the result of get_coarse_surrogate.
+            kT[float]: Boltzmann temperature in cm-1.
+            mix[float]: Fraction of uniform probability mixed in, keeps the weights bounded. Default 0.1.
+            npool[int]: Number of uniform candidates, default None uses the complete grid if it has
+                        less than 2E6 points and 20*nsmpl candidates otherwise.
+            seed[int]: Seed for the sampler, default None uses the global numpy random state.
+            density[bool]: If True also return the proposal, default False.
+            
+    [Returns]:
+            [array]: Array with the sampling points of shape (s, len(Grid_List)).
+            [array]: Array with the weights of the sampling points of shape (s,).
+            [function]: Only if density is True, the proposal relative to the uniform distribution on the
+                        grid, N*q(x) = (1-mix)*exp(-(V-Vmin)/kT)/mean(exp(-(V-Vmin)/kT)) + mix with the mean
+                        over the pool, taking an index array of shape (n, len(Grid_List)). The weights are
+                        1/(N*q(x)), to pool several draws see get_mixture_weights.'''
+    
+    if seed is None:
+        rng = np.random
+    else:
+        rng = np.random.RandomState(seed)
+    
+    Nlist = [len(g) for g in Grid_List]
+    if npool is None and np.prod(np.array(Nlist, dtype=float)) < 2E6:
+        pool = np.array(np.unravel_index(np.arange(int(np.prod(Nlist))), Nlist)).T
+    else:
+        pool = smpl_uniform(Grid_List, npool if npool is not None else 20*nsmpl, rng)
+    
+    energy = np.asarray(surrogate(pool), dtype=float).reshape(-1)
+    boltz = np.exp(-(energy-energy.min())/(kT/au2ic))
+    q = (1-mix)*boltz/boltz.sum() + mix/len(pool)
+    q /= q.sum()
+    chosen = rng.choice(len(pool), size=nsmpl, p=q)
+    smpl_w = 1/(len(pool)*q[chosen])
+    if density == False:
+        return pool[chosen], smpl_w/smpl_w.mean()
+    
+    emin, bmean, beta = energy.min(), boltz.mean(), au2ic/kT
+    def proposal(idx):
+        boltz = np.exp(-(np.asarray(surrogate(idx), dtype=float).reshape(-1)-emin)*beta)
+        return (1-mix)*boltz/bmean + mix
+    return pool[chosen], smpl_w/smpl_w.mean(), proposal
+
+
+def get_mixture_weights(smpl_idx, proposals):
+    '''Function to get the importance weights of a sample set pooled from several draws with different
+    proposals (e.g. grown while the surrogate changed). The pooled points are treated as drawn from the
+    mixture of the proposals weighted by the amount of points of every draw, the weights w = 1/(N*q_mix)
+    are unbiased for the complete set.
+    
+    [Args]:
+            smpl_idx[array]: Sampling points of all draws in index representation of shape (s, np.ndim(V)).
+            proposals[list]: List of (proposal, amount of points) for every draw, the proposals as returned
+                        by get_points_importance, None for a uniform draw.
+            
+    [Returns]:
+            [array]: Weights of the sampling points of shape (s,), normalized to mean 1.'''
+    
+    total = sum(n for _, n in proposals)
+    q = np.zeros(len(smpl_idx))
+    for proposal, n in proposals:
+        q += n/total*(1 if proposal is None else proposal(smpl_idx))
+    smpl_w = 1/q
+    return smpl_w/smpl_w.mean()
 
 
 def get_true_points(Grid_list, sample_points):
@@ -140,10 +395,31 @@ def get_cuts_ind2D(constructor, grd1, grdidx1, grd2, grdidx2, sample_points):
     [Returns]:
             [array]: 2D scan along coordinates for all sample points, shape (Ni,Nk,s).'''
     
-    cutl = []
-    for elem in sample_points:
-        cutl.append(get_cut2D(constructor, grd1, grdidx1, grd2, grdidx2, elem.tolist()))
-    return np.moveaxis(np.array(cutl, dtype=float), 0, 2)
+    return np.moveaxis(get_cuts_ind2D_smpl(constructor, grd1, grdidx1, grd2, grdidx2, sample_points), 0, 2)
+
+
+def get_cuts_ind2D_smpl(constructor, grd1, grdidx1, grd2, grdidx2, sample_points, dtype=float):
+    '''Function to get all cuts for all sample points for a given combination of coordinates with the
+    samples first, the layout the 2D MC routines work with (see get_cuts_ind2D for (Ni,Nk,s)).
+    
+    [Args]:
+            constructor[function]: Function to create the cut from, must be callable with the individual
+                        grids along each coordinate.
+            grd1[array]: Grid for the first coordinate of shape (Ni,).
+            grdidx1[int]: Index for the first coordinate.
+            grd2[array]: Grid for the second coordinate of shape (Nk,).
+            grdidx2[int]: Index for the second coordinate.
+            sample_points[array]: Array containing all sample points in shape (s,np.ndim(V)).
+            dtype[type]: Data type of the returned cuts, default float.
+            
+    [Returns]:
+            [array]: 2D scan along coordinates for all sample points, shape (s,Ni,Nk). The samples come
+                    first so every cut is contiguous and no axis has to be moved.'''
+    
+    out = np.empty((len(sample_points), len(grd1), len(grd2)), dtype=dtype)
+    for n, elem in enumerate(sample_points):
+        out[n] = get_cut2D(constructor, grd1, grdidx1, grd2, grdidx2, elem.tolist())
+    return out
 
 
 def get_all_cuts(constructor, Grid_List, sample_points):
@@ -167,26 +443,48 @@ def get_all_cuts(constructor, Grid_List, sample_points):
     return cutsl
 
 
-def get_all_cuts_par(constructor, Grid_List, sample_points):
+def get_all_cuts_par(constructor, Grid_List, sample_points, modes=None, store=None):
+    '''Function to parallelize the task of building the 1D cuts. Will try to use as many CPU cores as
+    it has access to.
     
+    [Args]:
+            constructor[function]: Function to compute the cuts, should take the grids individually.
+            Grid_List[list]: List containing the grids.
+            sample_points[array]: Array of the sampling points of shape (s, np.ndim(V)) or list containing
+                        one such array per mode of Grid_List.
+            modes[list]: Modes for which the cuts are computed, default None computes all modes.
+            store[function]: Called as store(mode, cuts) for every finished mode, its return value
+                        replaces the cuts in the output. Default None.
+                        
+    [Returns]:
+            [list]: List containing the 1D scans along the requested modes for the sampling
+                    points in shape (Ni,s).'''
     
     out = []
     # for more comments on this, see the function below
     global job1
     def job1(idx):
-        job_res = get_cuts_ind(constructor, Grid_List[idx], idx, sample_points)
+        if type(sample_points) == list:
+            job_res = get_cuts_ind(constructor, Grid_List[idx], idx, sample_points[idx])
+        else:
+            job_res = get_cuts_ind(constructor, Grid_List[idx], idx, sample_points)
         return job_res
     
     cpus = len(sched_getaffinity(0))    
-    idx_l = np.arange(len(Grid_List), dtype=int)
+    if modes is None:
+        idx_l = np.arange(len(Grid_List), dtype=int)
+    else:
+        idx_l = np.array(modes, dtype=int)
     for i in range(len(idx_l))[::cpus]:
         sublist = idx_l[i:i+cpus]
              
-        track_progress('Building 1D cuts', (i)/(len(idx_l)-1), 'Parallel:{} '.format(len(sublist)))        
+        track_progress('Building 1D cuts', (i)/max(len(idx_l)-1, 1), 'Parallel:{} '.format(len(sublist)))        
             
         with mp.Pool(len(sublist)) as p:
             subsublist = p.map(job1, sublist)
-            for elem in subsublist:
+            for idx, elem in zip(sublist, subsublist):
+                if store is not None:
+                    elem = store(idx, elem)
                 out.append(elem)
 
     print('\r'+' '*100, end='')
@@ -194,7 +492,7 @@ def get_all_cuts_par(constructor, Grid_List, sample_points):
     return out  
 
 
-def get_cuts_comb_par(comblist, constructor, Grid_List, sample_points):
+def get_cuts_comb_par(comblist, constructor, Grid_List, sample_points, store=None):
     '''Function to parallelize the task of building the 2D cuts. Will try to use as many CPU cores as
     it has access to.
     
@@ -202,31 +500,39 @@ def get_cuts_comb_par(comblist, constructor, Grid_List, sample_points):
             comblist[list]: List containing list with the combinations, e.g. [[i,j],[i,k],...].
             constructor[function]: Function to compute the cuts, should take the grids individually.
             Grid_List[list]: List containing the grids.
-            sample_points[array]: Array of the sampling points of shape (s, np.ndim(V)).
+            sample_points[array]: Array of the sampling points of shape (s, np.ndim(V)) or list containing
+                        one such array per element of comblist.
+            store[function]: Called as store([i,j], cuts) for every finished combination, its return
+                        value replaces the cuts in the output. Default None.
 
     [Returns]:
             [list]: List containing the 2D scans along the indicated coordinate combinations for the sampling
-                    points in shape (Ni,Nk,s).'''
+                    points in shape (s,Ni,Nk).'''
     
     out = []
     # apparently we have to declare the job function as global to pickle it for 
     # multiprocessing... However, we do also need the variables from our local
     # namespace. But this seems to work.
     global job
-    def job(elem):
+    def job(n):
         '''Job dispatcher for the parallelization pool of the 2D cut routine'''
-        job_res = get_cuts_ind2D(constructor, Grid_List[elem[0]], elem[0], Grid_List[elem[1]], elem[1], sample_points) 
+        elem = comblist[n]
+        if type(sample_points) == list:
+            points = sample_points[n]
+        else:
+            points = sample_points
+        job_res = get_cuts_ind2D_smpl(constructor, Grid_List[elem[0]], elem[0], Grid_List[elem[1]], elem[1], points) 
         return job_res   
     
     # get the number of available CPU cores to determine how many jobs we can run in parallel 
     cpus = len(sched_getaffinity(0))
     # devide the length of the complete list of combinations by the number of cores available
     for i in range(len(comblist))[::cpus]:
-        # extract elements for the individual cores into sublist
-        sublist = comblist[i:i+cpus]
+        # extract elements for the individual cores into sublist (positions in comblist)
+        sublist = list(range(len(comblist)))[i:i+cpus]
         #print(sublist)
 
-        track_progress('Building 2D cuts', (i)/(len(comblist)-1), 'Parallel:{} '.format(len(sublist)))
+        track_progress('Building 2D cuts', (i)/max(len(comblist)-1, 1), 'Parallel:{} '.format(len(sublist)))
             
         # create and dispatch the jobs to the cores
         with mp.Pool(len(sublist)) as p:
@@ -234,8 +540,11 @@ def get_cuts_comb_par(comblist, constructor, Grid_List, sample_points):
             subsublist = p.map(job, sublist)
             #print(subsublist[0].shape)
             # put the elements into one complete list which will correspond to the list of combinations
-            for elem in subsublist:
+            for n, elem in zip(sublist, subsublist):
                 #print(elem.shape)
+                if store is not None:
+                    # hand the finished block out right away (e.g. to write it to the cut cache)
+                    elem = store(comblist[n], elem)
                 out.append(elem)
 
     print('\r'+' '*100, end='')
@@ -243,6 +552,41 @@ def get_cuts_comb_par(comblist, constructor, Grid_List, sample_points):
     return out            
 
 
+def get_cuts_comb_unordered(comblist, constructor, Grid_List, sample_points, store=None):
+    '''Generator building the 2D cuts for all combinations in a pool of worker processes. The cuts are
+    handed out in the order they are finished, so the caller can work with them while the others are
+    still being built.
+    
+    [Args]:
+            comblist[list]: List containing list with the combinations, e.g. [[i,j],[i,k],...].
+            constructor[function]: Function to compute the cuts, should take the grids individually.
+            Grid_List[list]: List containing the grids.
+            sample_points[list]: List containing one array of sampling points of shape (s, np.ndim(V)) per
+                        element of comblist.
+            store[function]: Called as store([i,j], cuts) for every finished combination, its return
+                        value replaces the cuts in the output. Default None.
+    
+    [Yields]:
+            [int]: Position of the finished combination in comblist.
+            [array]: 2D cuts of the combination in shape (s,Ni,Nk).'''
+    
+    # see get_cuts_comb_par for the global job
+    global jobunord
+    def jobunord(n):
+        elem = comblist[n]
+        return n, get_cuts_ind2D_smpl(constructor, Grid_List[elem[0]], elem[0], Grid_List[elem[1]], elem[1],\
+                                      sample_points[n])
+    
+    cpus = max(min(len(sched_getaffinity(0)), len(comblist)), 1)
+    with mp.Pool(cpus) as p:
+        for done, (n, elem) in enumerate(p.imap_unordered(jobunord, range(len(comblist)))):
+            if store is not None:
+                elem = store(comblist[n], elem)
+            track_progress('Building 2D cuts', (done+1)/len(comblist), 'Background:{} '.format(cpus))
+            yield n, elem
+    print('')
+
+
 def get_cuts_comb(comblist, constructor, Grid_List, sample_points):
     '''Get 2D scans from the potential along the coordinate combinations indicated by the combinations list.
     
@@ -265,13 +609,402 @@ def get_cuts_comb(comblist, constructor, Grid_List, sample_points):
     return twoDcuts
 
 
-def get_nu_smpl(nu_k, smpl_idx_k):
+def get_cutkeys(smpl_idx, holes):
+    '''Function to find the distinct cuts among the sampling points. A cut along the hole modes only
+    depends on the remaining coordinates of the sample, so samples which agree in those share the cut.
+    
+    [Args]:
+            smpl_idx[array]: Sampling points in index representation of shape (s, np.ndim(V)).
+            holes[list]: Modes the cut runs along, [k] for 1D cuts or [i,j] for 2D cuts.
+            
+    [Returns]:
+            [array]: Distinct reduced keys of shape (u, np.ndim(V)), the hole columns are set to 0.
+            [array]: Index map of shape (s,) from the sampling points to the rows of the keys.'''
+    
+    keys = np.array(smpl_idx, dtype=int)
+    keys[:, holes] = 0
+    ukeys, cutmap = np.unique(keys, axis=0, return_inverse=True)
+    return ukeys, cutmap.reshape(-1)
+
+
+def group_cuts(cutmap, nkeys):
+    '''Function to group the sampling points by their distinct cut, so the columns of an omega which
+    belong to the same cut can be summed with np.add.reduceat in collapse_omega. Only depends on the
+    cutmap, so it is computed once and reused for every collapse with the same cutmap.
+    
+    [Args]:
+            cutmap[array]: Index map of shape (s,) from the sampling points to the distinct cuts.
+            nkeys[int]: Number of distinct cuts u.
+            
+    [Returns]:
+            [tuple]: Order of shape (s,) sorting the sampling points by cut and the start of every cut
+                    in this order of shape (u,), None if a cut is not hit by any sampling point.'''
+    
+    order = np.argsort(cutmap, kind='stable')
+    starts = np.searchsorted(cutmap[order], np.arange(nkeys))
+    if nkeys == 0 or np.any(np.diff(np.append(starts, len(cutmap))) == 0):
+        # np.add.reduceat can not express an empty segment
+        return None
+    return order, starts
+
+
+def collapse_omega(omega, cutmap, nkeys, groups=None, out=None, work=None):
+    '''Function to sum the columns of a sampled omega which belong to the same distinct cut.
+    
+    [Args]:
+            omega[array]: Sampled omega of shape (r,s).
+            cutmap[array]: Index map of shape (s,) from the sampling points to the distinct cuts.
+            nkeys[int]: Number of distinct cuts u.
+            groups[tuple]: Grouping of the sampling points as returned by group_cuts, default None sums
+                        every row with np.bincount instead.
+            out[array]: Preallocated array of shape (r,u) for the result, default None.
+            work[array]: Preallocated array of shape (r,s) for the omega sorted by cut, default None.
+            
+    [Returns]:
+            [array]: Collapsed omega of shape (r,u).'''
+    
+    if out is None:
+        out = np.empty((omega.shape[0], nkeys))
+    if groups is None:
+        for r, row in enumerate(omega):
+            out[r] = np.bincount(cutmap, weights=row, minlength=nkeys)
+        return out
+    order, starts = groups
+    # sorted by cut every cut is one segment of columns, mode='clip' writes to work without a copy
+    work = np.take(omega, order, axis=1, out=work, mode='clip')
+    return np.add.reduceat(work, starts, axis=1, out=out)
+
+
+def get_cuts1D(constructor, Grid_List, smpl_idx, cachedir=None):
+    '''Function to get the 1D cuts for all modes. Every distinct cut is only evaluated once, the cuts
+    are returned in compressed form together with the index map from the sampling points to them.
+    Optionally backed by the on-disk cut cache, then only the blocks missing in the cache are computed
+    and every finished block is written right away so an interrupted setup resumes where it stopped.
+    
+    [Args]:
+            constructor[function]: Function to create the cuts, must be callable with the individual
+                        grids along each coordinate.
+            Grid_List[list]: List containing the grids for each coordinate.
+            smpl_idx[array]: Sampling points in index representation of shape (s, np.ndim(V)).
+            cachedir[str]: Root directory of the cut cache, default None disables the cache.
+            
+    [Returns]:
+            [list]: List containing the distinct 1D cuts for all modes in shape (Ni,u), memory-mapped if
+                    the cache is used.
+            [list]: List containing the index maps of shape (s,) for all modes.'''
+    
+    keys, cutmaps = zip(*[get_cutkeys(smpl_idx, [k]) for k in range(len(Grid_List))])
+    truesmpl = [get_true_points(Grid_List, key) for key in keys]
+    if cachedir is None:
+        return get_all_cuts_par(constructor, Grid_List, truesmpl), list(cutmaps)
+    
+    key = get_cache_key('1D', constructor, Grid_List, smpl_idx)
+    path = open_cache(cachedir, key, '1D cuts, {}, grid shape {}, {} samples \n'\
+                      .format(get_constructor_id(constructor), [len(g) for g in Grid_List], len(smpl_idx)))
+    cuts = [load_block(path, [k]) for k in range(len(Grid_List))]
+    missing = [k for k, cut in enumerate(cuts) if cut is None]
+    if missing:
+        new = get_all_cuts_par(constructor, Grid_List, truesmpl, modes=missing,\
+                               store=lambda k, cut: save_block(path, [k], cut))
+        for k, cut in zip(missing, new):
+            cuts[k] = cut
+    return cuts, list(cutmaps)
+
+
+def get_cuts2D(comblist, constructor, Grid_List, smpl_idx, cachedir=None, known=None):
+    '''Function to get the 2D cuts for all mode combinations. Every distinct cut is only evaluated once,
+    the cuts are returned in compressed form together with the index map from the sampling points to
+    them. Optionally backed by the on-disk cut cache, then only the blocks missing in the cache are
+    computed and every finished block is written right away.
+    
+    [Args]:
+            comblist[list]: List of lists containing the indices for the 2D scans e.g. [[i,j],[i,k]...].
+            constructor[function]: Function to create the cuts, must be callable with the individual
+                        grids along each coordinate.
+            Grid_List[list]: List containing the grids for each coordinate.
+            smpl_idx[array]: Sampling points in index representation of shape (s, np.ndim(V)).
+            cachedir[str]: Root directory of the cut cache, default None disables the cache.
+            known[list]: Already available blocks (or None) for the combinations, e.g. from
+                        get_cuts2D_from_1D, these are not computed again. Default None.
+            
+    [Returns]:
+            [list]: List containing the distinct 2D cuts for all combinations in shape (u,Ni,Nk),
+                    memory-mapped if the cache is used.
+            [list]: List containing the index maps of shape (s,) for all combinations.'''
+    
+    keys, cutmaps = zip(*[get_cutkeys(smpl_idx, comb) for comb in comblist])
+    truesmpl = [get_true_points(Grid_List, key) for key in keys]
+    known = [None]*len(comblist) if known is None else known
+    if cachedir is None:
+        missing = [n for n, cut in enumerate(known) if cut is None]
+        cuts = list(known)
+        new = get_cuts_comb_par([comblist[n] for n in missing], constructor, Grid_List,\
+                                [truesmpl[n] for n in missing]) if missing else []
+        for n, cut in zip(missing, new):
+            cuts[n] = cut
+        return cuts, list(cutmaps)
+    
+    key = get_cache_key('2D', constructor, Grid_List, smpl_idx)
+    path = open_cache(cachedir, key, '2D cuts, {}, grid shape {}, {} samples \n'\
+                      .format(get_constructor_id(constructor), [len(g) for g in Grid_List], len(smpl_idx)))
+    cuts = [load_block(path, comb) for comb in comblist]
+    for n, comb in enumerate(comblist):
+        if cuts[n] is None and known[n] is not None:
+            cuts[n] = save_block(path, comb, known[n])
+    missing = [n for n, cut in enumerate(cuts) if cut is None]
+    if missing:
+        new = get_cuts_comb_par([comblist[n] for n in missing], constructor, Grid_List,\
+                                [truesmpl[n] for n in missing],\
+                                store=lambda comb, cut: save_block(path, comb, cut))
+        for n, cut in zip(missing, new):
+            cuts[n] = cut
+    return cuts, list(cutmaps)
+
+
+def get_cuts2D_iter(comblist, constructor, Grid_List, smpl_idx, cachedir=None):
+    '''Function to get the 2D cuts for all mode combinations as they are finished, see get_cuts2D and
+    get_cuts_comb_unordered. Combinations found in the cut cache are handed out first.
+    
+    [Args]:
+            comblist[list]: List of lists containing the indices for the 2D scans e.g. [[i,j],[i,k]...].
+            constructor[function]: Function to create the cuts, must be callable with the individual
+                        grids along each coordinate.
+            Grid_List[list]: List containing the grids for each coordinate.
+            smpl_idx[array]: Sampling points in index representation of shape (s, np.ndim(V)).
+            cachedir[str]: Root directory of the cut cache, default None disables the cache.
+            
+    [Returns]:
+            [list]: List containing the index maps of shape (s,) for all combinations.
+            [generator]: Yields the position in comblist and the distinct cuts in shape (u,Ni,Nk) for
+                        every combination. The cuts are only built while it is consumed.'''
+    
+    keys, cutmaps = zip(*[get_cutkeys(smpl_idx, comb) for comb in comblist])
+    
+    def produce():
+        missing = list(range(len(comblist)))
+        store = None
+        if cachedir is not None:
+            key = get_cache_key('2D', constructor, Grid_List, smpl_idx)
+            path = open_cache(cachedir, key, '2D cuts, {}, grid shape {}, {} samples \n'\
+                              .format(get_constructor_id(constructor), [len(g) for g in Grid_List], len(smpl_idx)))
+            store = lambda comb, cut: save_block(path, comb, cut)
+            missing = []
+            for n, comb in enumerate(comblist):
+                cut = load_block(path, comb)
+                if cut is None:
+                    missing.append(n)
+                else:
+                    yield n, cut
+        if missing:
+            truesmpl = [get_true_points(Grid_List, keys[n]) for n in missing]
+            for m, cut in get_cuts_comb_unordered([comblist[n] for n in missing], constructor, Grid_List,\
+                                                  truesmpl, store=store):
+                yield missing[m], cut
+    
+    return list(cutmaps), produce()
+
+
+def get_cuts1D_from_2D(comblist, cuts2D, cutmaps2D, smpl_idx):
+    '''Function to extract the 1D cuts from already computed 2D cuts on the same sampling points. The
+    1D cut along k at a sample is the 2D cut along [k,j] of that sample taken at the sample's own index
+    along j, so no potential evaluations are needed. Both cut sets have to come from the same potential.
+    
+    [Args]:
+            comblist[list]: List of lists containing the indices for the 2D scans e.g. [[i,j],[i,k]...].
+            cuts2D[list]: Distinct 2D cuts for all combinations in shape (u,Ni,Nk), see get_cuts2D.
+            cutmaps2D[list]: Index maps of shape (s,) from the sampling points to the 2D cuts.
+            smpl_idx[array]: Sampling points in index representation of shape (s, np.ndim(V)).
+            
+    [Returns]:
+            [list]: List containing the distinct 1D cuts for all modes in shape (Ni,u), as get_cuts1D.
+            [list]: List containing the index maps of shape (s,) for all modes.'''
+    
+    cuts, cutmaps = [], []
+    for k in range(np.shape(smpl_idx)[1]):
+        pairs = [n for n, comb in enumerate(comblist) if k in comb]
+        if not pairs:
+            raise RuntimeError('Mode {} is not part of any mode combination.'.format(k))
+        n = pairs[0]
+        other = comblist[n][1] if comblist[n][0] == k else comblist[n][0]
+        keys, cutmap = get_cutkeys(smpl_idx, [k])
+        # any sample of a distinct 1D cut will do, they all share the cut
+        rep = np.empty(len(keys), dtype=int)
+        rep[cutmap] = np.arange(len(cutmap))
+        block = cuts2D[n]
+        if comblist[n][0] == k:
+            cut = block[cutmaps2D[n][rep], :, keys[:, other]]
+        else:
+            cut = block[cutmaps2D[n][rep], keys[:, other], :]
+        cuts.append(np.array(cut.T, dtype=float, order='C'))
+        cutmaps.append(cutmap)
+    return cuts, cutmaps
+
+
+def get_cuts2D_from_1D(comblist, cuts1D, smpl_idx):
+    '''Function to assemble 2D cuts from already computed 1D cuts on the same sampling points. A 2D cut
+    along [i,j] is a stack of 1D cuts along i, one for every grid point along j (or vice versa), so it
+    can only be assembled if the 1D cuts cover all of them. This is the case for dense sample sets on
+    small grids, otherwise the combination is left to be computed.
+    
+    [Args]:
+            comblist[list]: List of lists containing the indices for the 2D scans e.g. [[i,j],[i,k]...].
+            cuts1D[list]: Distinct 1D cuts for all modes in shape (Ni,u), see get_cuts1D.
+            smpl_idx[array]: Sampling points in index representation of shape (s, np.ndim(V)).
+            
+    [Returns]:
+            [list]: Distinct 2D cuts in shape (u,Ni,Nk) for every combination, None where the 1D cuts
+                    do not cover them completely.'''
+    
+    keys1 = [get_cutkeys(smpl_idx, [k])[0] for k in range(len(cuts1D))]
+    blocks = []
+    for comb in comblist:
+        keys2, _ = get_cutkeys(smpl_idx, comb)
+        block = None
+        for a, b in [comb, comb[::-1]]:
+            nb = np.shape(cuts1D[b])[0]
+            if len(keys1[a]) < len(keys2)*nb:
+                continue
+            lookup = {tuple(key): u for u, key in enumerate(keys1[a])}
+            rows = np.empty((len(keys2), nb), dtype=int)
+            complete = True
+            for u, key in enumerate(keys2):
+                key = key.copy()
+                for x in range(nb):
+                    key[b] = x
+                    row = lookup.get(tuple(key))
+                    if row is None:
+                        complete = False
+                        break
+                    rows[u, x] = row
+                if not complete:
+                    break
+            if complete:
+                # (Na,u,Nb) to samples-first (u,Ni,Nk)
+                cut = np.asarray(cuts1D[a])[:, rows]
+                block = np.ascontiguousarray(cut.transpose((1, 0, 2)) if a == comb[0] else cut.transpose((1, 2, 0)))
+                break
+        blocks.append(block)
+    return blocks
+
+
+def extend_cuts(holes_list, constructor, Grid_List, smpl_idx, cuts, new_idx, cachedir=None):
+    '''Function to append new sampling points to an existing set of distinct cuts. Only the distinct
+    cuts which are not yet known are evaluated, the result is identical to computing the cuts for the
+    combined sampling points from scratch.
+    
+    [Args]:
+            holes_list[list]: Modes the cuts run along, [[0],[1],...] for the 1D cuts or the comblist
+                        for the 2D cuts.
+            constructor[function]: Function to create the cuts, must be callable with the individual
+                        grids along each coordinate.
+            Grid_List[list]: List containing the grids for each coordinate.
+            smpl_idx[array]: Current sampling points in index representation of shape (s, np.ndim(V)).
+            cuts[list]: Current distinct cuts as returned by get_cuts1D or get_cuts2D.
+            new_idx[array]: New sampling points in index representation of shape (s', np.ndim(V)).
+            cachedir[str]: Root directory of the cut cache, default None disables the cache.
+            
+    [Returns]:
+            [array]: Combined sampling points of shape (s+s', np.ndim(V)).
+            [list]: List containing the distinct cuts for the combined sampling points.
+            [list]: List containing the index maps of shape (s+s',) for the combined sampling points.'''
+    
+    all_idx = np.concatenate([smpl_idx, new_idx]).astype(int)
+    kind = '{}D'.format(len(holes_list[0]))
+    if cachedir is not None:
+        path = open_cache(cachedir, get_cache_key(kind, constructor, Grid_List, all_idx),\
+                          '{} cuts, {}, grid shape {}, {} samples \n'.format(kind, get_constructor_id(constructor),\
+                          [len(g) for g in Grid_List], len(all_idx)))
+    
+    out = []
+    tasks = []
+    for n, holes in enumerate(holes_list):
+        old_keys, old_map = get_cutkeys(smpl_idx, holes)
+        new_keys, new_map = get_cutkeys(new_idx, holes)
+        # the known keys come first, so every combined key with a first occurence behind them is new
+        keys, first, inv = np.unique(np.concatenate([old_keys, new_keys]), axis=0,\
+                                     return_index=True, return_inverse=True)
+        inv = inv.reshape(-1)
+        cutmap = np.concatenate([inv[:len(old_keys)][old_map], inv[len(old_keys):][new_map]])
+        block = None if cachedir is None else load_block(path, holes)
+        if block is None:
+            # the 1D cuts run along the last axis (Ni,u), the 2D cuts along the first one (u,Ni,Nk)
+            if kind == '1D':
+                block = np.zeros(cuts[n].shape[:-1] + (len(keys),), dtype=cuts[n].dtype)
+                block[:, inv[:len(old_keys)]] = cuts[n]
+            else:
+                block = np.zeros((len(keys),) + cuts[n].shape[1:], dtype=cuts[n].dtype)
+                block[inv[:len(old_keys)]] = cuts[n]
+            todo = np.nonzero(first >= len(old_keys))[0]
+            if len(todo) > 0:
+                tasks.append((n, todo, get_true_points(Grid_List, keys[todo])))
+            elif cachedir is not None:
+                block = save_block(path, holes, block)
+        out.append([block, cutmap])
+    
+    if tasks:
+        if kind == '1D':
+            points = [None]*len(Grid_List)
+            for n, todo, truesmpl in tasks:
+                points[holes_list[n][0]] = truesmpl
+            new = get_all_cuts_par(constructor, Grid_List, points, modes=[holes_list[n][0] for n, _, _ in tasks])
+        else:
+            new = get_cuts_comb_par([holes_list[n] for n, _, _ in tasks], constructor, Grid_List,\
+                                    [truesmpl for _, _, truesmpl in tasks])
+        for (n, todo, _), block in zip(tasks, new):
+            if kind == '1D':
+                out[n][0][:, todo] = block
+            else:
+                out[n][0][todo] = block
+            if cachedir is not None:
+                out[n][0] = save_block(path, holes_list[n], out[n][0])
+    
+    return all_idx, [elem[0] for elem in out], [elem[1] for elem in out]
+
+
+def get_cut_error(weights, SPP, smpl_idx, cuts, cutmaps, holes_list, smpl_w=None):
+    '''Function to get the mean squared error of the CP expansion on a set of sampled cuts, e.g. on a
+    held-out validation set.
+    
+    [Args]:
+            weights[array]: Weights of shape (r,).
+            SPP[list]: List of the SPP in shape (r,Ni).
+            smpl_idx[array]: Sampling points of the cuts in index representation of shape (s, np.ndim(V)).
+            cuts[list]: List of the distinct cuts as returned by get_cuts1D or get_cuts2D.
+            cutmaps[list]: List of the index maps from the sampling points to the distinct cuts.
+            holes_list[list]: Modes the cuts run along, [[0],[1],...] for the 1D cuts or the comblist
+                        for the 2D cuts.
+            smpl_w[array]: Weights of the sampling points of shape (s,), default None.
+            
+    [Returns]:
+            [float]: Mean squared error over all points of all cuts in au².'''
+    
+    err = 0
+    for holes, cut, cutmap in zip(holes_list, cuts, cutmaps):
+        keys, _ = get_cutkeys(smpl_idx, holes)
+        count = np.bincount(cutmap, weights=smpl_w, minlength=len(keys))
+        omega = np.outer(weights, np.ones(len(keys)))
+        for k, nu in enumerate(SPP):
+            if k not in holes:
+                omega *= nu[:, keys[:,k]]
+        if len(holes) == 1:
+            pred = SPP[holes[0]].T @ omega
+            npoints = cut.shape[0]
+        else:
+            pred = np.einsum(SPP[holes[0]], [0,1], SPP[holes[1]], [0,2], omega, [0,3], [3,1,2])
+            count = count[:,None,None]
+            npoints = cut[0].size
+        err += (((pred-cut)**2)*count).sum()/(count.sum()*npoints)
+    return err/len(holes_list)
+
+
+def get_nu_smpl(nu_k, smpl_idx_k, out=None):
     '''Function to get one specific sampling SPP by mapping the corresponding sampling
     index onto the grid axis of the original SPP.
     
     [Args]:
             nu_k[array]: Original SPP of shape (r, N).
             smpl_idx_k[array]: Array containing the grid indices for the sampling along coordinate.
+            out[array]: Preallocated array of shape (r,s) to gather into, default None.
     
     [Returns]:
             [array]: The mapped SPP from the SPP corresponding to the passed 
@@ -279,6 +1012,9 @@ def get_nu_smpl(nu_k, smpl_idx_k):
     
     # get the values for the given sample point components along one
     # coordinate from the SPP of the coordinate
+    if out is not None:
+        # the indices are valid, 'clip' only avoids the buffering np.take does for mode='raise'
+        return np.take(nu_k, smpl_idx_k, axis=1, out=out, mode='clip')
     nu_smpl_k = nu_k[:,smpl_idx_k]
     return nu_smpl_k
 
@@ -315,26 +1051,28 @@ def get_omega_smpl(nu_smpl):
     return omega_smpl
 
 
-def get_omega_hole_smpl(nu_smpl, idx):
+def get_omega_hole_smpl(nu_smpl, idx, out=None):
     '''Function to build the one-hole sampled omega by elementwise multiplying the sampled SPP
     neglecting one indicated.
     
     [Args]:
             nu_smpl[array]: Array containing the sampled SPP in shape (r,s) along the first axis.
             idx[int]: Index of the sampled SPP to be neglected.
+            out[array]: Preallocated array of shape (r,s) for the result, default None.
            
     [Returns]:
             [array]: Array of shape (r,s) containing the one-hole sampled omega.'''
     
     # get the omega while neglecting one smplSPP
-    omega_smpl = np.ones(nu_smpl[0].shape)
+    omega_smpl = np.ones(nu_smpl[0].shape) if out is None else out
+    omega_smpl[:] = 1
     for i, nu in enumerate(nu_smpl):
         if i != idx:
-            omega_smpl = omega_smpl * nu
+            np.multiply(omega_smpl, nu, out=omega_smpl)
     return omega_smpl
 
 
-def get_omega_2hole_smpl(nu_smpl, idx1, idx2):
+def get_omega_2hole_smpl(nu_smpl, idx1, idx2, out=None):
     '''Function to build the two-hole sampled omega by elementwise multiplying the sampled SP
     neglecting two indicated.
     
@@ -342,54 +1080,310 @@ def get_omega_2hole_smpl(nu_smpl, idx1, idx2):
             nu_smpl[array]: Array containing the sampled SPP in shape (r,s) along the first axis.
             idx1[int]: Index of the first SPP to be neglected.
             idx2[int]: Index of the second SPP to be neglected.
+            out[array]: Preallocated array of shape (r,s) for the result, default None.
             
     [Returns]:
             [array]: Array of shape (r,s) containing the two-hole sampled omega.'''
     
-    omega_smpl = np.ones(nu_smpl[0].shape)
+    omega_smpl = np.ones(nu_smpl[0].shape) if out is None else out
+    omega_smpl[:] = 1
     for i, nu in enumerate(nu_smpl):
         if i != idx1 and i != idx2:
-            omega_smpl = omega_smpl * nu
+            np.multiply(omega_smpl, nu, out=omega_smpl)
     return omega_smpl
 
 
-def build_d(cut, omega):
+def init_smpl_buffer(nu_smpl):
+    '''Function to allocate the work buffer for the sampled omegas, see sweep_MC.
+    
+    [Args]:
+            nu_smpl[array]: Array of shape (np.ndim(V),r,s) containing all sampled SPP.
+            
+    [Returns]:
+            [tuple]: Uninitialized array of shape (np.ndim(V)+3,r,s) holding the suffix products, the
+                    prefix product, the omega and the weighted omega, and a list with the grouping of the
+                    sampling points by cut per mode (see group_cuts), filled in by sweep_MC.'''
+    
+    return np.empty((nu_smpl.shape[0]+3,) + nu_smpl.shape[1:]), [None]*nu_smpl.shape[0]
+
+
+def sweep_MC(nu_smpl, SPP, cuts, smpl_idx, buf=None, prec=None, cutmaps=None, smpl_w=None, chunk=None,\
+             workers=None):
+    '''Function to update the SPP of all DOF once (one 1D MC iteration). The one-hole omega of mode i
+    is the product of the already updated sampled SPP before i (prefix) and the old sampled SPP after i
+    (suffix). The suffix products are built once per sweep, the prefix is updated in place after every
+    mode, so a mode update costs one multiplication instead of np.ndim(V)-1. The omega and the weighted
+    omega of shape (r,s) are formed in the buffer. With distinct cuts (cutmaps) the sampling points are
+    grouped by cut once per cutmap and the omega is collapsed within the buffer as well: the suffix
+    product of the mode is free once the omega is formed and takes the omega sorted by cut, the omega
+    is free once Z is formed and takes the collapsed omega of shape (r,u).
+    
+    [Args]:
+            nu_smpl[array]: Array of shape (np.ndim(V),r,s) containing all sampled SPP, updated in place.
+            SPP[list]: List of the SPP in shape (r,Ni), updated in place.
+            cuts[list]: List containing the 1D cuts for all DOF.
+            smpl_idx[array]: Sampling points in index representation of shape (s,np.ndim(V)), best in
+                        column-major order so the gathers read contiguous indices.
+            buf[tuple]: Buffer as returned by init_smpl_buffer, reallocated if None or if the sample
+                        set changed size. Default None.
+            prec[float]: Value for the regularization, default is ~1E-8.
+            cutmaps[list]: Index maps for the distinct cuts as returned by get_cuts1D, default None.
+            smpl_w[array]: Weights of the sampling points of shape (s,), default None.
+            chunk[int]: If given, d and Z are streamed over chunks of this many sampling points with
+                        build_dZ_chunked and no buffer of size s is used at all. Default None.
+            workers[int]: Amount of threads for the chunked accumulation, default None.
+            
+    [Returns]:
+            [array]: Array of shape (r,) containing the new weights.
+            [tuple]: The buffer, pass it to the next sweep.'''
+    
+    f = len(SPP)
+    if chunk != None:
+        for i in range(f):
+            d_i, Z_i = build_dZ_chunked(cuts[i], nu_smpl, [i], cutmap=None if cutmaps is None else cutmaps[i],\
+                                        smpl_w=smpl_w, chunk=chunk, workers=workers)
+            weights, SPP[i] = get_norm(solve_linear(Z_i, d_i, prec=prec))
+            get_nu_smpl(SPP[i], smpl_idx[:,i], out=nu_smpl[i])
+        return weights, buf
+    
+    if buf is None or buf[0].shape[1:] != nu_smpl.shape[1:]:
+        buf = init_smpl_buffer(nu_smpl)
+    arr, groups = buf
+    suffix, prefix, omega, omega_w = arr[:f], arr[f], arr[f+1], arr[f+2]
+    
+    # suffix[k] is the product of the sampled SPP k+1,...,f-1 before the sweep
+    suffix[f-1] = 1
+    for k in range(f-2, -1, -1):
+        np.multiply(nu_smpl[k+1], suffix[k+1], out=suffix[k])
+    prefix[:] = 1
+    
+    for i in range(f):
+        np.multiply(prefix, suffix[i], out=omega)
+        cutmap, group, out = None if cutmaps is None else cutmaps[i], None, None
+        if cutmap is not None:
+            u = cuts[i].shape[-1]
+            # the grouping only depends on the cutmap, it is kept for the next sweeps
+            if groups[i] is None or groups[i][0] is not cutmap or groups[i][1] != u:
+                groups[i] = (cutmap, u, group_cuts(cutmap, u))
+            group = groups[i][2]
+            out = omega[:,:u] if u <= omega.shape[1] else None
+        weights, SPP[i] = update_MC(nu_smpl, omega, cuts[i], prec=prec, cutmap=cutmap, smpl_w=smpl_w,\
+                                    buf=omega_w, groups=group, out=out, work=suffix[i])
+        get_nu_smpl(SPP[i], smpl_idx[:,i], out=nu_smpl[i])
+        np.multiply(prefix, nu_smpl[i], out=prefix)
+        
+    return weights, buf
+
+
+def next_minibatch(order, pos, nb):
+    '''Function to take the next mini-batch from a permutation of the sampling points. The batches
+    rotate through the permutation (wrapping around at the end), so every point is used equally often.
+    
+    [Args]:
+            order[array]: Permutation of the indices of the sampling points.
+            pos[int]: Position of the next batch in order.
+            nb[int]: Size of the batch.
+            
+    [Returns]:
+            [array]: Sorted indices of the sampling points in the batch of shape (nb,).
+            [int]: Position of the batch after this one.'''
+    
+    batch = np.take(order, np.arange(pos, pos+nb), mode='wrap')
+    return np.sort(batch), (pos+nb) % len(order)
+
+
+def get_batch_cuts(cuts, cutmaps, mb):
+    '''Function to restrict the 1D cuts to the ones a mini-batch touches, so the collapse of the omega
+    and the product with the cuts scale with the batch and not with all distinct cuts.
+    
+    [Args]:
+            cuts[list]: List containing the 1D cuts for all DOF, shape (Ni,s) or the distinct cuts of shape
+                        (Ni,u) if cutmaps is given.
+            cutmaps[list]: Index maps of shape (s,) for the distinct cuts, default None.
+            mb[array]: Indices of the sampling points in the batch of shape (nb,).
+            
+    [Returns]:
+            [list]: List containing the distinct cuts of the batch in shape (Ni,k) with k <= nb.
+            [list]: List containing the index maps of shape (nb,) from the batch to these cuts.'''
+    
+    if cutmaps is None:
+        return [np.take(cut, mb, axis=1) for cut in cuts], None
+    out, maps = [], []
+    for cut, cutmap in zip(cuts, cutmaps):
+        keys, inverse = np.unique(cutmap[mb], return_inverse=True)
+        out.append(np.take(cut, keys, axis=1))
+        maps.append(inverse.reshape(-1))
+    return out, maps
+
+
+def build_d(cut, omega, cutmap=None, smpl_w=None, groups=None, out=None, work=None):
     '''Build the d from the one-hole omega and the corresponding cuts.
     
     [Args]:
-            cut[array]: 1D cuts through the potential along one specific coordinate, shape (Ni,s).
+            cut[array]: 1D cuts through the potential along one specific coordinate, shape (Ni,s), or
+                        the distinct cuts of shape (Ni,u) if cutmap is given.
             omega[array]: One-hole omega of shape (r,s).
+            cutmap[array]: Index map of shape (s,) from the sampling points to the distinct cuts.
+                        Default None.
+            smpl_w[array]: Weights of the sampling points of shape (s,), default None.
+            groups, out, work: Grouping and buffers for the collapse of the omega, see collapse_omega.
             
     [Retuns]:
             [array]: d for the LES of shape (r,Ni).'''
     
+    if smpl_w is not None:
+        omega = omega*smpl_w
+    if cutmap is not None:
+        # sum the omega of all samples sharing a cut first
+        omega = collapse_omega(omega, cutmap, cut.shape[-1], groups=groups, out=out, work=work)
     return omega@cut.T
 
 
-def build_d2d(cuts, omega_ij):
+def build_d2d(cuts, omega_ij, cutmap=None, smpl_w=None, groups=None, out=None, work=None):
     '''Build the 2D-d from the two-hole omega and the corresponding cuts.
     
     [Args]:
-            cuts[array]: 2D cuts through the potential of shape (Ni,Nk,s).
+            cuts[array]: 2D cuts through the potential of shape (s,Ni,Nk), or the distinct cuts of shape
+                        (u,Ni,Nk) if cutmap is given.
             omega_ij[array]: Two-hole omega of shape (r,s).
+            cutmap[array]: Index map of shape (s,) from the sampling points to the distinct cuts.
+                        Default None.
+            smpl_w[array]: Weights of the sampling points of shape (s,), default None.
+            groups, out, work: Grouping and buffers for the collapse of the omega, see collapse_omega.
             
     [Returns]: 2D-d for the LES of shape (r,Ni,Nk).'''
     
-    return np.einsum(cuts, [0,1,2], omega_ij, [3,2], [3,0,1])
+    if smpl_w is not None:
+        omega_ij = omega_ij*smpl_w
+    if cutmap is not None:
+        omega_ij = collapse_omega(omega_ij, cutmap, cuts.shape[0], groups=groups, out=out, work=work)
+    # the samples-first cuts are a plain (u,Ni*Nk) matrix
+    flat = cuts.reshape(cuts.shape[0], -1)
+    if flat.dtype == float:
+        d = omega_ij@flat
+    else:
+        # compact (float32) cuts are upcast in blocks of rows, the sum is accumulated in float64
+        # without a float64 copy of all cuts
+        d = np.zeros((omega_ij.shape[0], flat.shape[1]))
+        step = max(1, 2**20//max(flat.shape[1], 1))
+        for a in range(0, flat.shape[0], step):
+            d += omega_ij[:,a:a+step]@flat[a:a+step].astype(float)
+    return d.reshape(omega_ij.shape[0], cuts.shape[1], cuts.shape[2])
 
 
-def build_Z(omega):
+def build_Z(omega, smpl_w=None):
     '''Build the Z from the one-hole omega.
     
     [Args]:
             omega[array]: One-hole omega of shape (r,s).
+            smpl_w[array]: Weights of the sampling points of shape (s,), default None.
             
     [Returns]:
             [array]: Z for the LES of shape (r,r').'''
     
+    if smpl_w is not None:
+        return (omega*smpl_w)@omega.T
     return omega@omega.T
 
 
+def build_dZ(cuts, omega, cutmap=None, smpl_w=None, buf=None, groups=None, out=None, work=None):
+    '''Build the d and the Z for the 1D or 2D LES in one go, the weighted omega is only formed once.
+    The Z is formed before the collapse of the omega, so out and work may share memory with omega.
+    
+    [Args]:
+            cuts[array]: 1D cuts of shape (Ni,u) or 2D cuts of shape (u,Ni,Nk), see build_d and build_d2d.
+            omega[array]: One- or two-hole omega of shape (r,s).
+            cutmap[array]: Index map of shape (s,) from the sampling points to the distinct cuts.
+                        Default None.
+            smpl_w[array]: Weights of the sampling points of shape (s,), default None.
+            buf[array]: Preallocated array of shape (r,s) for the weighted omega, default None.
+            groups, out, work: Grouping and buffers for the collapse of the omega, see collapse_omega.
+            
+    [Returns]:
+            [array]: d for the LES of shape (r,Ni) or (r,Ni,Nk).
+            [array]: Z for the LES of shape (r,r).'''
+    
+    if smpl_w is not None:
+        omega_w = np.multiply(omega, smpl_w, out=buf)
+    else:
+        omega_w = omega
+    Z = omega_w@omega.T
+    if np.ndim(cuts) == 2:
+        d = build_d(cuts, omega_w, cutmap=cutmap, groups=groups, out=out, work=work)
+    else:
+        d = build_d2d(cuts, omega_w, cutmap=cutmap, groups=groups, out=out, work=work)
+    return d, Z
+
+
+def map_chunks(job, nsmpl, chunk, workers=None):
+    '''Function to run a job over consecutive sample chunks and sum up the results. Numpy releases the
+    GIL in the matrix products, so a thread pool scales without copying any of the inputs.
+    
+    [Args]:
+            job[function]: Called as job(a, b) for the samples a:b, must return a tuple of arrays.
+            nsmpl[int]: Amount of sampling points.
+            chunk[int]: Amount of sampling points per chunk.
+            workers[int]: Amount of threads, default None runs the chunks serially.
+            
+    [Returns]:
+            [tuple]: Elementwise sum of the results of all chunks.'''
+    
+    bounds = [(a, min(a+chunk, nsmpl)) for a in range(0, nsmpl, chunk)]
+    if workers == None:
+        parts = (job(a, b) for a, b in bounds)
+    else:
+        with ThreadPoolExecutor(workers) as ex:
+            parts = list(ex.map(lambda ab: job(*ab), bounds))
+    
+    total = None
+    for part in parts:
+        if total is None:
+            total = part
+        else:
+            for elem, add in zip(total, part):
+                elem += add
+    return total
+
+
+def build_dZ_chunked(cuts, nu_smpl, holes, cutmap=None, smpl_w=None, chunk=65536, workers=None):
+    '''Build the d and the Z for the 1D or 2D LES by streaming over chunks of the sampling points. The
+    omega is formed per chunk straight from the sampled SPP, so apart from the inputs the peak memory is
+    O((r+Ni*Nk)*chunk) per worker instead of several arrays of size r*s.
+    
+    [Args]:
+            cuts[array]: 1D cuts of shape (Ni,u) or 2D cuts of shape (u,Ni,Nk), see build_d and build_d2d.
+            nu_smpl[array]: Array of shape (np.ndim(V),r,s) containing all sampled SPP.
+            holes[list]: Modes left out of the omega, [i] for 1D or [i,j] for 2D.
+            cutmap[array]: Index map of shape (s,) from the sampling points to the distinct cuts.
+                        Default None.
+            smpl_w[array]: Weights of the sampling points of shape (s,), default None.
+            chunk[int]: Amount of sampling points per chunk, default 65536.
+            workers[int]: Amount of threads, default None runs the chunks serially.
+            
+    [Returns]:
+            [array]: d for the LES of shape (r,Ni) or (r,Ni,Nk).
+            [array]: Z for the LES of shape (r,r).'''
+    
+    # both as (u,Ni) or (u,Ni*Nk) matrix with the samples along the first axis
+    flat = cuts.T if np.ndim(cuts) == 2 else cuts.reshape(cuts.shape[0], -1)
+    
+    def job(a, b):
+        omega = np.ones((nu_smpl.shape[1], b-a))
+        for k, nu in enumerate(nu_smpl):
+            if k not in holes:
+                omega *= nu[:,a:b]
+        omega_w = omega if smpl_w is None else omega*smpl_w[a:b]
+        # with distinct cuts gather the rows of this chunk, this keeps the product at BLAS speed
+        cut = flat[a:b] if cutmap is None else np.take(flat, cutmap[a:b], axis=0)
+        # compact (float32) cuts are upcast per chunk so the sum is accumulated in float64
+        return omega_w@cut.astype(float, copy=False), omega_w@omega.T
+    
+    d, Z = map_chunks(job, nu_smpl.shape[2], chunk, workers=workers)
+    if np.ndim(cuts) == 2:
+        return d, Z
+    return d.reshape(d.shape[0], cuts.shape[1], cuts.shape[2]), Z
+
+
 def solve_linear2DMC(Z_ij, d_ij, prec=None):
     '''Solve the LES for the 2DMC Algorithm.
     
@@ -413,24 +1407,30 @@ def solve_linear2DMC(Z_ij, d_ij, prec=None):
     return x_ij.reshape(d_ij.shape[0], d_ij.shape[1], d_ij.shape[2], order='C')
 
 
-def update_MC(nu_smpl, omega_idx, cut, prec=None):
+def update_MC(nu_smpl, omega_idx, cut, prec=None, cutmap=None, smpl_w=None, buf=None, groups=None, out=None,\
+              work=None):
     '''Function to update the SPP for one DOF.
     
     [Args]:
             nu_smpl[array]: Array of shape (np.ndim(V),r,s) containing all sampled SPP.
             omega_idx[array]: One-hole omega of shape (r,s).
-            cut[array]: 1D  cuts through the potential along one specific coordinate, shape (Ni,s).
+            cut[array]: 1D  cuts through the potential along one specific coordinate, shape (Ni,s), or
+                        the distinct cuts of shape (Ni,u) if cutmap is given.
+            cutmap[array]: Index map of shape (s,) from the sampling points to the distinct cuts.
+                        Default None.
+            smpl_w[array]: Weights of the sampling points of shape (s,), default None.
+            buf[array]: Preallocated array of shape (r,s) for the weighted omega, default None.
+            groups, out, work: Grouping and buffers for the collapse of the omega, see collapse_omega.
             
     [Returns]:
             [array]: Array of shape (r,) containing the new weights.
             [array]: Array of shape (r,Ni) containing the new normalized nu.'''
     
-    # get the d
-    d_idx = build_d(cut, omega_idx)
+    # get the d and the Z
+    d_idx, Z_idx = build_dZ(cut, omega_idx, cutmap=cutmap, smpl_w=smpl_w, buf=buf, groups=groups, out=out,\
+                            work=work)
     #d_man = build_d_man(cut, omega_idx)
     #print('d_{} correct? {}'.format(idx, np.allclose(d_idx,d_man)))
-    # get the Z
-    Z_idx = build_Z(omega_idx)
     #print('Z_{} symmetrical? {}'.format(idx, all(Z_idx-Z_idx.T)==0))
     # solve the linear equation
     x_idx = solve_linear(Z_idx, d_idx, prec=prec)
@@ -441,7 +1441,7 @@ def update_MC(nu_smpl, omega_idx, cut, prec=None):
     return weights, SPP_idx
 
 
-def runMC(V_ex, weights, SPP, nu_smpl, cuts, smpl_idx, max_iter, thresh):
+def runMC(V_ex, weights, SPP, nu_smpl, cuts, smpl_idx, max_iter, thresh, cutmaps=None):
     '''Function to run the 1D ALSCPD-MC Algorithm.
     
     [Args]:
@@ -453,6 +1453,8 @@ def runMC(V_ex, weights, SPP, nu_smpl, cuts, smpl_idx, max_iter, thresh):
             smpl_idx[array]: Index representation of the sampling points, shape (s, np.ndim(V)).
             max_iter[int]: Maximum amount of iterations to run.
             thresh[float]: Maximum error to signal convergence.
+            cutmaps[list]: Index maps for the distinct cuts as returned by get_cuts1D, default None
+                        if the cuts are given for every sampling point.
             
     [Returns]:
             [list]: List containing the error for all iterations.'''
@@ -464,14 +1466,11 @@ def runMC(V_ex, weights, SPP, nu_smpl, cuts, smpl_idx, max_iter, thresh):
     error = get_rmse(err1, err2)
     errorl.append(error)
     
+    buf = None
     #print('''{}: weights: {}'''.format(it, weights))
     while it < max_iter and error > thresh:
         
-        for i in range(np.ndim(V_ex)):
-            omega_i = get_omega_hole_smpl(nu_smpl, i)
-            weights, SPP[i] = update_MC(nu_smpl, omega_i, cuts[i])
-
-            nu_smpl[i] = get_nu_smpl(SPP[i], smpl_idx[:,i])
+        weights, buf = sweep_MC(nu_smpl, SPP, cuts, smpl_idx, buf=buf, cutmaps=cutmaps)
             
         err1 = geterrorleft(V_ex, weights, SPP)
         err2 = geterrorright(V_ex, weights)
@@ -537,7 +1536,8 @@ def runsubMC(x_ij, S_ij, weights, SPP, sigmas, i, j, max_it=20, prec=None):
     return weights, SPP, sigmas
 
 
-def run2DMC(V_ex, weights, SPP, nu_smpl, comblist, smpl_idx, cuts, sigmas, max_iter, thresh, prec=None):
+def run2DMC(V_ex, weights, SPP, nu_smpl, comblist, smpl_idx, cuts, sigmas, max_iter, thresh, prec=None,\
+            cutmaps=None):
     '''Run the 2DMC-ALSCPD Algorithm.
     
     [Args]:
@@ -551,6 +1551,8 @@ def run2DMC(V_ex, weights, SPP, nu_smpl, comblist, smpl_idx, cuts, sigmas, max_i
             max_iter[int]: Maximum amount of iterations.
             thresh[float]: Threshhold to signal convergence.
             prec[float]: Value for the regularization, default is ~1E-8.
+            cutmaps[list]: Index maps for the distinct cuts as returned by get_cuts2D, default None
+                        if the cuts are given for every sampling point.
             
     [Returns]:
             [list]: List containing the error for each iteration.'''
@@ -565,6 +1567,7 @@ def run2DMC(V_ex, weights, SPP, nu_smpl, comblist, smpl_idx, cuts, sigmas, max_i
     errorl.append(error)
     
     counter = 0
+    omega_buf = np.empty(nu_smpl.shape[1:])
     
     while it < max_iter and error > thresh:
         
@@ -576,30 +1579,28 @@ def run2DMC(V_ex, weights, SPP, nu_smpl, comblist, smpl_idx, cuts, sigmas, max_i
             for n in np.arange(len(comblist))[::2]:
                 #print(comblist[n][0], comblist[n][1])
                 S_ij = assemble_S2D(sigmas, comblist[n][0], comblist[n][1])
-                omega_ij = get_omega_2hole_smpl(nu_smpl, comblist[n][0], comblist[n][1])
-                d_ij = build_d2d(cuts[n], omega_ij)
-                Z_ij = build_Z(omega_ij)
+                omega_ij = get_omega_2hole_smpl(nu_smpl, comblist[n][0], comblist[n][1], out=omega_buf)
+                d_ij, Z_ij = build_dZ(cuts[n], omega_ij, cutmap=None if cutmaps is None else cutmaps[n])
                 x_ij = solve_linear2DMC(Z_ij, d_ij, prec=prec)
                 weights, SPP, sigmas = runsubMC(x_ij, S_ij, \
                                                  weights, SPP, sigmas, \
                                                  comblist[n][0], comblist[n][1], prec=prec)
-                nu_smpl[comblist[n][0]] = get_nu_smpl(SPP[comblist[n][0]], smpl_idx[:,comblist[n][0]])
-                nu_smpl[comblist[n][1]] = get_nu_smpl(SPP[comblist[n][1]], smpl_idx[:,comblist[n][1]])                
+                get_nu_smpl(SPP[comblist[n][0]], smpl_idx[:,comblist[n][0]], out=nu_smpl[comblist[n][0]])
+                get_nu_smpl(SPP[comblist[n][1]], smpl_idx[:,comblist[n][1]], out=nu_smpl[comblist[n][1]])                
                 counter = 1
         
         elif counter == 1:
             #print(1)
             for n in np.arange(1,len(comblist))[::2]:
                 S_ij = assemble_S2D(sigmas, comblist[n][0], comblist[n][1])                
-                omega_ij = get_omega_2hole_smpl(nu_smpl, comblist[n][0], comblist[n][1])
-                d_ij = build_d2d(cuts[n], omega_ij)
-                Z_ij = build_Z(omega_ij)
+                omega_ij = get_omega_2hole_smpl(nu_smpl, comblist[n][0], comblist[n][1], out=omega_buf)
+                d_ij, Z_ij = build_dZ(cuts[n], omega_ij, cutmap=None if cutmaps is None else cutmaps[n])
                 x_ij = solve_linear2DMC(Z_ij, d_ij, prec=prec)
                 weights, SPP, sigmas = runsubMC(x_ij, S_ij, \
                                                  weights, SPP, sigmas, \
                                                  comblist[n][0], comblist[n][1], prec=prec)
-                nu_smpl[comblist[n][0]] = get_nu_smpl(SPP[comblist[n][0]], smpl_idx[:,comblist[n][0]])
-                nu_smpl[comblist[n][1]] = get_nu_smpl(SPP[comblist[n][1]], smpl_idx[:,comblist[n][1]])                  
+                get_nu_smpl(SPP[comblist[n][0]], smpl_idx[:,comblist[n][0]], out=nu_smpl[comblist[n][0]])
+                get_nu_smpl(SPP[comblist[n][1]], smpl_idx[:,comblist[n][1]], out=nu_smpl[comblist[n][1]])                  
                 counter = 0
                 
         err1 = geterrorleft(V_ex, weights, SPP)
@@ -612,7 +1613,7 @@ def run2DMC(V_ex, weights, SPP, nu_smpl, comblist, smpl_idx, cuts, sigmas, max_i
     return errorl
 
 
-def setup_MC(grid_list, nsmpl, SPP, constructor):
+def setup_MC(grid_list, nsmpl, SPP, constructor, cachedir=None, sampler='uniform', prof=None):
     '''Function to set up the ALSCPD-MC Algorithm.
     
     [Args]:
@@ -620,28 +1621,33 @@ def setup_MC(grid_list, nsmpl, SPP, constructor):
             nsmpl[int]: Number of sampling points.
             SPP[list]: List containing the SPP in shape (r,Ni).
             constructor[function]: Function to calculate the potential cuts.
+            cachedir[str]: Root directory of the cut cache, default None disables the cache.
+            sampler[str]: Sampling strategy passed to get_points, default 'uniform'.
+            prof[Profiler]: Profiler the phases are timed with, see ALS.profiler. Default None.
             
     [Returns]:
             [array]: Sampling points in index representation of shape (s,np.nidm(V)).
-            [list]: List containing the 1D cuts for all DOF in shape (Ni,s).
+            [list]: List containing the distinct 1D cuts for all DOF in shape (Ni,u).
+            [list]: List containing the index maps from the sampling points to the distinct cuts.
             [array]: Array of shape (np.ndim(V),r,s) containing the sampled SPP for all DOF.'''
     
+    prof = Profiler() if prof is None else prof
     # get the points in index rep
-    smpl_idx = get_points(grid_list, nsmpl)
+    with prof.phase('samples'):
+        smpl_idx = get_points(grid_list, nsmpl, sampler=sampler)
     #print('S index: {}'.format(smpl_idx))
-    # map them to the grids
-    truesmpl = get_true_points(grid_list, smpl_idx)
-    #print('True s: {}'.format(truesmpl))
-    # get the cuts
-    cuts = get_all_cuts_par(constructor, grid_list, truesmpl)
+    # get the cuts, this maps the points to the grids
+    with prof.phase('cuts1D', lambda: cost_cuts(sum(cut.size for cut in cuts))):
+        cuts, cutmaps = get_cuts1D(constructor, grid_list, smpl_idx, cachedir=cachedir)
     #print('Cuts shape: {}'.format([cut.shape for cut in cuts]))
     # get the sampled SPP
-    nu_smpl = get_all_nu_smpl(SPP, smpl_idx)
+    with prof.phase('get_nu_smpl', lambda: (0, 8.*nu_smpl.size)):
+        nu_smpl = get_all_nu_smpl(SPP, smpl_idx)
     #print('nu_smpl: {}'.format(nu_smpl))
-    return smpl_idx, cuts, nu_smpl
+    return smpl_idx, cuts, cutmaps, nu_smpl
 
 
-def setup_MC2D(grid_list, nsmpl, SPP, constructor):
+def setup_MC2D(grid_list, nsmpl, SPP, constructor, cachedir=None, sampler='uniform', prof=None):
     '''Function to set up the 2D ALSCPD-MC Algorithm.
     
     [Args]:
@@ -649,41 +1655,138 @@ def setup_MC2D(grid_list, nsmpl, SPP, constructor):
             nsmpl[int]: Number of sampling points.
             SPP[list]: List containing the SPP in shape (r,Ni).
             constructor[function]: Function to calculate the potential cuts.
+            cachedir[str]: Root directory of the cut cache, default None disables the cache.
+            sampler[str]: Sampling strategy passed to get_points, default 'uniform'.
+            prof[Profiler]: Profiler the phases are timed with, see ALS.profiler. Default None.
             
     [Returns]:
             [array]: Sampling points in index representation of shape (s,np.nidm(V)).
             [list]: List of lists containing the mode combinations like [[i,j],[i,k],...].
-            [list]: List containing the 2D cuts for all DOF in shape (Ni,Nj,s).
+            [list]: List containing the distinct 2D cuts for all DOF in shape (u,Ni,Nj).
+            [list]: List containing the index maps from the sampling points to the distinct cuts.
             [array]: Array of shape (np.ndim(V),r,s) containing the sampled SPP for all DOF.'''
     
-    smpl_idx = get_points(grid_list, nsmpl)
-    truesmpl = get_true_points(grid_list, smpl_idx)
+    prof = Profiler() if prof is None else prof
+    with prof.phase('samples'):
+        smpl_idx = get_points(grid_list, nsmpl, sampler=sampler)
     combl = create_comblist(len(grid_list))
     #cuts2D = get_cuts_comb(combl, constructor, grid_list, truesmpl)
-    cuts2D = get_cuts_comb_par(combl, constructor, grid_list, truesmpl)
-    nu_smpl = get_all_nu_smpl(SPP, smpl_idx)
+    with prof.phase('cuts2D', lambda: cost_cuts(sum(cut.size for cut in cuts2D))):
+        cuts2D, cutmaps2D = get_cuts2D(combl, constructor, grid_list, smpl_idx, cachedir=cachedir)
+    with prof.phase('get_nu_smpl', lambda: (0, 8.*nu_smpl.size)):
+        nu_smpl = get_all_nu_smpl(SPP, smpl_idx)
     
-    return smpl_idx, combl, cuts2D, nu_smpl
+    return smpl_idx, combl, cuts2D, cutmaps2D, nu_smpl
 
 
 def grab_smpl(filename):
-    '''Function to grab presampled points in index representation from a file.
+    '''Function to grab presampled points in index representation from a file, either a sample set
+    written by save_smpl (.npz) or a text file with one point per line.
     
     [Args]:
-            filename[str]: File to extract the sampling points from. It is assumed that the
-                    sampling information starts in the second line.
+            filename[str]: File to extract the sampling points from. For text files it is assumed that
+                    the sampling information starts in the second line.
             
     [Returns]:
             [array]: Array with the sampling points in shape (s,np.ndim(V)).'''
     
-    lines = []
+    if str(filename).endswith('.npz'):
+        return load_smpl(filename)[0]
+    
     with open('{}'.format(filename), 'r') as file:
-        for line in file:
-            lines.append(line.split())
-    smpl_idx = np.zeros((len(lines)-1, len(lines[1])), dtype=int)
-    for i, elem in enumerate(lines[1:]):
-        smpl_idx[i,:] = elem
-    return smpl_idx
+        file.readline()
+        text = file.read()
+    ncols = len(text.lstrip('\n').split('\n', 1)[0].split())
+    values = np.fromstring(text, dtype=np.int64, sep=' ')
+    if ncols == 0 or values.size % ncols != 0:
+        raise RuntimeError('Sampling points in {} have an inconsistent number of columns.'.format(filename))
+    return values.reshape(-1, ncols).astype(int)
+
+
+def pack_draws(draws):
+    '''Function to bring the draws of a sample set into array form for a .npz file.
+    
+    [Args]:
+            draws[list]: (seed, amount of points) of every draw in the order of the points, the seed is
+                        [seed, n] as passed to get_points or None for the global random state.
+            
+    [Returns]:
+            [array]: Seeds of shape (k,2), -1 for the global random state.
+            [array]: Amount of points of every draw of shape (k,).'''
+    
+    seeds = np.array([[-1, -1] if seed is None else list(seed) for seed, _ in draws], dtype=np.int64)
+    return seeds.reshape(-1, 2), np.array([n for _, n in draws], dtype=np.int64)
+
+
+def unpack_draws(seeds, sizes):
+    '''Function to restore the draws of a sample set packed by pack_draws.
+    
+    [Args]:
+            seeds[array]: Seeds of shape (k,2), -1 for the global random state.
+            sizes[array]: Amount of points of every draw of shape (k,).
+            
+    [Returns]:
+            [list]: (seed, amount of points) of every draw.'''
+    
+    return [(None if seed[0] < 0 else [int(seed[0]), int(seed[1])], int(n)) for seed, n in zip(seeds, sizes)]
+
+
+def save_smpl(filename, smpl_idx, grid_shape, seed=None, sampler=None, smpl_w=None, draws=None):
+    '''Function to write a sample set in the binary format (.npz), the file is written atomically.
+    
+    [Args]:
+            filename[str]: Name of the file, .npz is appended if missing.
+            smpl_idx[array]: Sampling points in index representation of shape (s, np.ndim(V)).
+            grid_shape[list]: Number of grid points along every coordinate.
+            seed[int]: Seed the points were generated with, default None (global random state).
+            sampler[str]: Name of the sampler, default None.
+            smpl_w[array]: Weights of the sampling points of shape (s,), default None (unweighted).
+            draws[list]: (seed, amount of points) of every draw the set consists of, see pack_draws. With
+                        these the points can be redrawn exactly, default None.
+            
+    [Returns]:
+            [str]: Name of the written file.'''
+    
+    filename = str(filename)
+    if not filename.endswith('.npz'):
+        filename += '.npz'
+    sampler = getattr(sampler, '__name__', sampler)
+    data = {'smpl_idx': np.ascontiguousarray(smpl_idx, dtype=np.int64),
+            'grid_shape': np.array(grid_shape, dtype=np.int64),
+            'seed': np.array(-1 if seed is None else seed, dtype=np.int64),
+            'sampler': np.array('' if sampler is None else str(sampler))}
+    if smpl_w is not None:
+        data['smpl_w'] = np.asarray(smpl_w, dtype=float)
+    if draws is not None:
+        data['draw_seeds'], data['draw_sizes'] = pack_draws(draws)
+    tmpname = filename[:-4] + '.{}.tmp.npz'.format(os.getpid())
+    np.savez(tmpname, **data)
+    os.replace(tmpname, filename)
+    return filename
+
+
+def load_smpl(filename):
+    '''Function to read a sample set written by save_smpl.
+    
+    [Args]:
+            filename[str]: Name of the .npz file.
+            
+    [Returns]:
+            [array]: Sampling points in index representation of shape (s, np.ndim(V)).
+            [dict]: Metadata with the keys grid_shape, seed, sampler (None if unknown), smpl_w (None
+                    if unweighted) and draws (None if unknown).'''
+    
+    with np.load(filename) as data:
+        smpl_idx = data['smpl_idx'].astype(int)
+        seed = int(data['seed']) if 'seed' in data.files else -1
+        sampler = str(data['sampler']) if 'sampler' in data.files else ''
+        info = {'grid_shape': tuple(int(n) for n in data['grid_shape']) if 'grid_shape' in data.files else None,
+                'seed': None if seed < 0 else seed,
+                'sampler': sampler if sampler != '' else None,
+                'smpl_w': data['smpl_w'].copy() if 'smpl_w' in data.files else None,
+                'draws': unpack_draws(data['draw_seeds'], data['draw_sizes']) if 'draw_seeds' in data.files\
+                         else None}
+    return smpl_idx, info
 
 
 def create_comblist(vdim):
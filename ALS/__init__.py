@@ -1,3 +1,3 @@
-__all__ = ['dvr', 'h2o', 'ALS1D', 'ALS2D', 'twoDsub', 'tracker', 'MonteC', 'ALSclass', 'potentials']
+__all__ = ['dvr', 'h2o', 'ALS1D', 'ALS2D', 'twoDsub', 'tracker', 'MonteC', 'ALSclass', 'potentials', 'cutcache', 'cutstore', 'hybrid', 'completion', 'checkpoint', 'logsink', 'profiler', 'shared', 'interp']
 
 from . import *
\ No newline at end of file
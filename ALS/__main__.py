@@ -9,6 +9,11 @@ import shutil
 
 # global defaults
 
+# job names of the ALS-SECTION
+JOBS = ['1DALSCPD', '2DALSCPD', '2DALSCPD/SVD', '1DMCALSCPD', '2DMCALSCPD', 'HybridALSCPD', 'TCALSCPD']
+# jobs drawing sampling points, the object gets the grids and the cut constructors for them
+SAMPLED_JOBS = ['1DMCALSCPD', '2DMCALSCPD', 'HybridALSCPD', 'TCALSCPD']
+
 __author__ = "Christian Delavier"
 __copyright__ = "Theoretical Chemistry, University of Heidelberg"
 __version__ = "0.1"
@@ -65,6 +70,8 @@ def work(inputfile):
     thresh = 10000
     reset = False
     plot = False
+    # options which are passed on to the ALSCPD object
+    opts = {'cache': None, 'sampler': 'uniform', 'surrogate': 'cp', 'kT': None}
     
     with open('{}'.format(inputfile), 'r') as inp:
         
@@ -93,6 +100,30 @@ def work(inputfile):
                     elif split[0] == 'sampling': sampl = split[2]
                     elif split[0] == 'thresh': thresh = float(split[2])
                     elif split[0] == 'tracker': tracker = bool(split[2])
+                    elif split[0] == 'cache': opts['cache'] = split[2]
+                    elif split[0] == 'sampler': opts['sampler'] = split[2]
+                    elif split[0] == 'surrogate': opts['surrogate'] = split[2]
+                    elif split[0] == 'kT': opts['kT'] = float(split[2])
+                    elif split[0] == 'seed': opts['seed'] = int(split[2])
+                    elif split[0] == 'keep_smpl': opts['keep_smpl'] = split[2] == 'True'
+                    elif split[0] == 'nval': opts['nval'] = int(split[2])
+                    elif split[0] == 'npoints': opts['npoints'] = int(split[2])
+                    elif split[0] == 'tensor': opts['tensor'] = split[2] != 'False'
+                    elif split[0] == 'cutstore': opts['cutstore'] = split[2] == 'True'
+                    elif split[0] == 'cut_dtype': opts['cut_dtype'] = np.dtype(split[2])
+                    elif split[0] == 'cut_budget': opts['cut_budget'] = float(split[2])*1E6
+                    elif split[0] == 'checkpoint': opts['checkpoint'] = split[2]
+                    elif split[0] == 'checkpoint_every': opts['checkpoint_every'] = int(split[2])
+                    elif split[0] == 'checkpoint_time': opts['checkpoint_time'] = float(split[2])
+                    elif split[0] == 'resume': opts['resume'] = split[2]
+                    elif split[0] == 'log': opts['log'] = split[2]
+                    elif split[0] == 'profile': opts['profile'] = split[2] == 'True'
+                    elif split[0] == 'memory': opts['memory'] = split[2]
+                    elif split[0] == 'mem_budget': opts['mem_budget'] = float(split[2])*1E6
+                    elif split[0] == 'mem_policy': opts['mem_policy'] = split[2]
+                    elif split[0] == 'ensemble': opts['ensemble'] = int(split[2])
+                    elif split[0] == 'ensemble_margin': opts['ensemble_margin'] = float(split[2])
+                    elif split[0] == 'ensemble_workers': opts['ensemble_workers'] = int(split[2])
                     elif split[0] == 'reset':
                         if split[2] == 'True':
                             reset = True
@@ -134,7 +165,7 @@ def work(inputfile):
                                             
        # Start
        #############################################################################         
-    return grids, job, filename, sampl, maxiter, rank, nsmpl, thresh, tracker, func, pot, reset, plot
+    return grids, job, filename, sampl, maxiter, rank, nsmpl, thresh, tracker, func, pot, reset, plot, opts
 
 
 if __name__ == "__main__":
@@ -144,6 +175,8 @@ if __name__ == "__main__":
     
     initialized = False
     Obj = False
+    resume = None
+    ckpt = [None, None, None]
     INPUT = None
     # read in the input file from the current directory
     files = os.listdir('.')
@@ -152,7 +185,7 @@ if __name__ == "__main__":
     if len(file) == 1:
         try:
             grids, job, filename, sampl, maxiter, rank, nsmpl, thresh,\
-            tracker, func, pot, reset, plot = work(file[0])
+            tracker, func, pot, reset, plot, opts = work(file[0])
             initialized = True
             INPUT = file[0]
         except:
@@ -168,7 +201,7 @@ if __name__ == "__main__":
         if idx != 'n':
             try:
                 grids, job, filename, sampl, maxiter, rank, nsmpl, thresh,\
-                tracker, func, pot, reset, plot = work(file[int(idx)])
+                tracker, func, pot, reset, plot, opts = work(file[int(idx)])
                 initialized = True
                 INPUT = file[int(idx)]
             except ValueError:
@@ -185,10 +218,45 @@ if __name__ == "__main__":
     # HFCO has to be compiled from f2py on each machine
     if initialized == True:
         
+        # a misspelled job would otherwise be skipped silently after the setup
+        unknown = [elem for elem in job if elem not in JOBS]
+        if unknown:
+            raise RuntimeError('Unknown job(s) {} in the ALS-SECTION, known are {}.'.format(unknown, JOBS))
+        
+        # tensor-free Monte-Carlo, the errors are estimated on held-out cuts
+        tensor = opts.pop('tensor', True)
+        # checkpointing is set on the object, not passed to the constructor
+        resume = opts.pop('resume', None)
+        ckpt = [opts.pop(key, None) for key in ['checkpoint', 'checkpoint_every', 'checkpoint_time']]
+        # budget of potential evaluations of the tensor completion, passed to runTC
+        npoints = opts.pop('npoints', None)
+        if tensor == False and set(job) & {'1DALSCPD', '2DALSCPD', '2DALSCPD/SVD'}:
+            print('The exact ALSCPD needs the potential tensor, building it anyway.')
+            tensor = True
+        # memory settings are set on the object, the budget is checked before anything is built
+        mem = [opts.pop('memory', None), opts.pop('mem_budget', None), opts.pop('mem_policy', 'warn')]
+        # multi-start, every job is run from ensemble initial guesses in parallel, the best is kept
+        ens = [opts.pop('ensemble', None), opts.pop('ensemble_margin', 0.1), opts.pop('ensemble_workers', None)]
+        if mem[1] != None:
+            for elem in job:
+                peak = estimate_peak([len(g) for g in grids], rank, nsmpl=nsmpl, method=elem, tensor=tensor,\
+                                     cut_itemsize=np.dtype(opts.get('cut_dtype', float)).itemsize,\
+                                     nval=opts.get('nval'))[0]
+                print('{}: predicted peak memory {:.1f} MB (budget {:.1f} MB).'.format(elem, peak/1E6, mem[1]/1E6))
+                if peak > mem[1] and mem[2] == 'refuse':
+                    print('Aborting, {} exceeds the memory budget.'.format(elem))
+                    sys.exit()
+        
         if func == 'h2o' and type(pot) != np.ndarray:
-            print('Building h2o potential with shape {}.'.format([len(g) for g in grids]))
-            grids[2] = np.arccos(grids[2])            
-            pot = geth2o(*grids)
+            grids[2] = np.arccos(grids[2])
+            if tensor == True:
+                print('Building h2o potential with shape {}.'.format([len(g) for g in grids]))
+                pot = geth2o(*grids)
+            else:
+                pot = None
+        
+        elif func == 'hfco' and type(pot) != np.ndarray and tensor == False:
+            pot = None
         
         elif func == 'hfco' and type(pot) != np.ndarray:
             print('Building hfco potential with shape {}.'.format([len(g) for g in grids]))            
@@ -198,61 +266,94 @@ if __name__ == "__main__":
             pot = pot.reshape(*[len(g) for g in grids])
             print('Loaded potential of shape {}'.format(pot.shape))
     # if we have the potential we can now initialize the object
-    if '1DMCALSCPD' in job or '2DMCALSCPD' in job:
+    if resume != None:
+        funcs = {'h2o': (h2o1D, h2o2D), 'hfco': (hfco, hfco)}.get(func, (None, None))
+        Object = ALSCPD.resume(resume, v_ex=pot, func1D=funcs[0], func2D=funcs[1])
+        print('Resuming job {} from iteration {}.'.format(Object.job, Object.iter))
+        Obj = True
+    elif set(job) & set(SAMPLED_JOBS):
         if func == 'h2o':
             if sampl != '':
                 try:
                     Object = ALSCPD(filename, pot, rank, func1D=h2o1D, func2D=h2o2D,\
-                                    grids=grids, nsmpl=nsmpl, presmpl=sampl)
+                                    grids=grids, nsmpl=nsmpl, presmpl=sampl, **opts)
                     Obj = True
                 except FileNotFoundError:
                     print('Presampling file could not be found at path {}.'.format(sampl))
                     
             elif sampl == '':
                 Object = ALSCPD(filename, pot, rank, func1D=h2o1D, func2D=h2o2D,\
-                                grids=grids, nsmpl=nsmpl)
+                                grids=grids, nsmpl=nsmpl, **opts)
                 Obj = True
         if func == 'hfco':
             if sampl != '':
                 try:
                     Object = ALSCPD(filename, pot, rank, func1D=hfco, func2D=hfco,\
-                                    grids=grids, nsmpl=nsmpl, presmpl=sampl)
+                                    grids=grids, nsmpl=nsmpl, presmpl=sampl, **opts)
                     Obj = True
                 except FileNotFoundError:
                     print('Presampling file could not be found.')
                     
             elif sampl == '':
                 Object = ALSCPD(filename, pot, rank, func1D=hfco, func2D=hfco,\
-                                grids=grids, nsmpl=nsmpl)            
+                                grids=grids, nsmpl=nsmpl, **opts)            
                 Obj = True
     # if there is no monte carlo queued we can just initialize the object with the normal parameters
     else:
-        Object = ALSCPD(filename, pot, rank)
+        Object = ALSCPD(filename, pot, rank, log=opts.get('log'), profile=opts.get('profile', False))
         Obj = True
     
     if Obj == True:
         print('*'*90)
-        print('Running jobs: {}'.format(job))
+        # with both MC jobs on the same samples the 1D cuts are taken from the 2D ones
+        if '1DMCALSCPD' in job and '2DMCALSCPD' in job and Object.cutstore != True\
+           and type(Object.cuts2D) != list:
+            Object.init_cuts2D()
+        if opts.get('profile') == True or mem[0] != None:
+            Object.set_profiling(memory=mem[0])
+        Object.mem_budget, Object.mem_policy = mem[1], mem[2]
+        if ckpt[0] != None:
+            Object.set_checkpoint(ckpt[0], every=ckpt[1], seconds=ckpt[2])
+        # a resumed run skips the finished jobs and continues the interrupted one
+        start = job.index(Object.job) if resume != None and Object.job in job else 0
+        print('Running jobs: {}'.format(job[start:]))
         for i, elem in enumerate(job):
             
-            if reset == True:
-                Object.filename=filename+'_{}'.format(i)                
-                Object.copy_reset(Object)
+            if i < start:
+                continue
+            iters = maxiter
+            if resume != None and i == start and Object.job == elem:
+                iters = max(maxiter - (Object.iter - Object.job_start), 0)
+            else:
+                if reset == True:
+                    Object.filename=filename+'_{}'.format(i)                
+                    Object.copy_reset(Object)
+                Object.job, Object.job_start = elem, Object.iter
+            
+            if ens[0] != None and ens[0] > 1:
+                kwargs = {'npoints': npoints} if elem == 'TCALSCPD' else {}
+                Object.run_ensemble(elem, ens[0], iters, thresh, margin=ens[1], workers=ens[2], **kwargs)
             
-            if elem == '1DALSCPD':
-                Object.run(maxiter, thresh, tracker=tracker)
+            elif elem == '1DALSCPD':
+                Object.run(iters, thresh, tracker=tracker)
         
             elif elem == '2DALSCPD':
-                Object.run2D(maxiter, thresh, tracker=tracker)
+                Object.run2D(iters, thresh, tracker=tracker)
              
             elif elem == '2DALSCPD/SVD':
-                Object.run2D(maxiter, thresh, YSVD=True, tracker=tracker)
+                Object.run2D(iters, thresh, YSVD=True, tracker=tracker)
                 
             elif elem == '1DMCALSCPD':
-                Object.runMC(maxiter, thresh, tracker=tracker)
+                Object.runMC(iters, thresh, tracker=tracker)
                 
             elif elem == '2DMCALSCPD':
-                Object.run2DMC(maxiter, thresh, tracker=tracker)
+                Object.run2DMC(iters, thresh, tracker=tracker)
+                
+            elif elem == 'HybridALSCPD':
+                Object.runHybrid(iters, thresh, tracker=tracker)
+                
+            elif elem == 'TCALSCPD':
+                Object.runTC(iters, thresh, npoints=npoints, tracker=tracker)
                 
             path = "{}_store".format(Object.filename)
             try:
@@ -265,6 +366,16 @@ if __name__ == "__main__":
                 for i, spp in enumerate(SPP):
                     np.save(DATAPATH+"/SPP_{}".format(i), spp)
                 np.save(DATAPATH+"/weights", weights)
+                # the binary log is kept and converted to the text file
+                Object.log.export()
+                for logfile in get_log_paths(Object.filename):
+                    if os.path.exists(logfile):
+                        shutil.copy(logfile, "{}/".format(path))
+                if Object.prof.enabled:
+                    shutil.copy(Object.save_profile(), "{}/".format(path))
+                if Object.keep_smpl == True and type(Object.smpl_idx) == np.ndarray:
+                    # the final sample set of the job with the seeds of its draws
+                    shutil.copy(Object.save_samples(), "{}/".format(path))
                 shutil.copy("{}".format(Object.filename), "{}/".format(path))
                 shutil.copy("{}".format(INPUT), "{}/".format(path))
             except OSError:
@@ -0,0 +1,66 @@
+import numpy as np
+import os
+
+'''
+Contains the components to write and read the checkpoints of ALSCPD objects. A checkpoint is a single
+.npz file (no pickling), lists of arrays are stored element-wise and None values are left out. Files
+are written to a temporary name and moved into place, an interrupted write never damages the last
+checkpoint.
+'''
+
+# bump this whenever the content of the checkpoints changes
+CHECKPOINT_VERSION = 1
+
+
+def write_checkpoint(path, data):
+    '''Function to atomically write a checkpoint.
+
+    [Args]:
+            path[str]: Name of the checkpoint file, .npz is appended if missing.
+            data[dict]: Content of the checkpoint. Values can be arrays, scalars, strings, None (left
+                        out) or lists of arrays.
+
+    [Returns]:
+            [str]: Name of the written file.'''
+
+    path = str(path)
+    if not path.endswith('.npz'):
+        path += '.npz'
+    out = {'version': np.array(CHECKPOINT_VERSION)}
+    for key, value in data.items():
+        if value is None:
+            continue
+        if type(value) in (list, tuple) and all(isinstance(elem, np.ndarray) for elem in value):
+            out['{}__len'.format(key)] = np.array(len(value))
+            for i, elem in enumerate(value):
+                out['{}__{}'.format(key, i)] = np.asarray(elem)
+        else:
+            out[key] = np.asarray(value)
+    tmpname = path[:-4] + '.{}.tmp.npz'.format(os.getpid())
+    np.savez(tmpname, **out)
+    os.replace(tmpname, path)
+    return path
+
+
+def read_checkpoint(path):
+    '''Function to read a checkpoint written by write_checkpoint.
+
+    [Args]:
+            path[str]: Name of the checkpoint file.
+
+    [Returns]:
+            [dict]: Content of the checkpoint, scalars as python objects and lists of arrays as lists.
+                    Use dict.get, left out values are missing.'''
+
+    data = {}
+    with np.load(path) as file:
+        if 'version' not in file.files or int(file['version']) != CHECKPOINT_VERSION:
+            raise RuntimeError('{} is not a checkpoint of version {}.'.format(path, CHECKPOINT_VERSION))
+        for key in file.files:
+            if key.endswith('__len'):
+                name = key[:-5]
+                data[name] = [file['{}__{}'.format(name, i)] for i in range(int(file[key]))]
+            elif '__' not in key:
+                value = file[key]
+                data[key] = value.item() if value.ndim == 0 else value
+    return data
@@ -0,0 +1,133 @@
+import numpy as np
+from ALS.MonteC import *
+
+'''
+Contains the components for the CP tensor completion from scattered single-point evaluations. Unlike
+the Monte-Carlo ALS no cuts through the potential are needed, every sampling point costs exactly one
+potential evaluation. For mode k every sample only enters the normal equations of its own grid point
+x_k, so the normal equations of all Nk grid points are built from the samples sorted by grid point
+and solved as one batch of (r,r) systems.
+'''
+
+
+def get_point_values(constructor, Grid_List, smpl_idx, v_ex=None):
+    '''Function to evaluate the potential at single sampling points, the points are split across all
+    available CPU cores.
+
+    [Args]:
+            constructor[function]: Function to evaluate the potential, has to work elementwise on one
+                        array of coordinates per mode. Default None gathers the values from v_ex.
+            Grid_List[list]: List containing the grids.
+            smpl_idx[array]: Sampling points in index representation of shape (s, np.ndim(V)).
+            v_ex[array]: Exact tensor, only used without constructor.
+
+    [Returns]:
+            [array]: Values of the potential at the sampling points, shape (s,).'''
+
+    if constructor is None:
+        if type(v_ex) != np.ndarray:
+            raise RuntimeError('The point values need either a constructor or the exact tensor.')
+        return np.asarray(v_ex[tuple(np.asarray(smpl_idx).T)], dtype=float)
+
+    # see MonteC.get_cuts_comb_par for the global job
+    global jobpoint
+    def jobpoint(points):
+        return np.asarray(constructor(*points.T), dtype=float).reshape(-1)
+
+    points = get_true_points(Grid_List, smpl_idx)
+    cpus = min(len(sched_getaffinity(0)), max(len(points), 1))
+    track_progress('Evaluating points', 0, 'Points:{} '.format(len(points)))
+    with mp.Pool(cpus) as p:
+        out = np.concatenate(p.map(jobpoint, np.array_split(points, cpus)))
+    print('\r'+' '*100, end='')
+    track_progress('Evaluating points', 1, 'Points:{} '.format(len(points)))
+    return out
+
+
+def build_dZ_points(values, omega, smpl_idx_k, Nk, smpl_w=None):
+    '''Function to build the normal equations of all grid points of one mode, every sampling point only
+    contributes to the grid point it lies on. The sampling points are sorted by grid point once, then
+    every grid point is one product over its block of columns and no (s,r,r) outer products are formed.
+
+    [Args]:
+            values[array]: Values of the potential at the sampling points, shape (s,).
+            omega[array]: One-hole sampled omega of shape (r,s).
+            smpl_idx_k[array]: Indices of the sampling points along the mode, shape (s,).
+            Nk[int]: Number of grid points of the mode.
+            smpl_w[array]: Weights of the sampling points of shape (s,), default None.
+
+    [Returns]:
+            [array]: Right hand sides of shape (Nk,r).
+            [array]: Normal matrices of shape (Nk,r,r).'''
+
+    r = omega.shape[0]
+    order = np.argsort(smpl_idx_k, kind='stable')
+    bounds = np.searchsorted(smpl_idx_k[order], np.arange(Nk+1))
+    omega_s = np.take(omega, order, axis=1)
+    omega_ws = omega_s if smpl_w is None else omega_s*smpl_w[order]
+    values_s = values[order]
+    d, Z = np.zeros((Nk, r)), np.zeros((Nk, r, r))
+    for n in np.flatnonzero(np.diff(bounds)):
+        a, b = bounds[n], bounds[n+1]
+        np.matmul(omega_ws[:, a:b], omega_s[:, a:b].T, out=Z[n])
+        np.matmul(omega_ws[:, a:b], values_s[a:b], out=d[n])
+    return d, Z
+
+
+def solve_points(Z, d, prec=None):
+    '''Function to solve the regularized normal equations of all grid points of one mode at once.
+
+    [Args]:
+            Z[array]: Normal matrices of shape (Nk,r,r).
+            d[array]: Right hand sides of shape (Nk,r).
+            prec[float]: Value for the regularization, default is ~1E-8.
+
+    [Returns]:
+            [array]: Array of shape (r,Nk) containing the new nu non-normalized.'''
+
+    if prec == None:
+        prec = np.sqrt(np.finfo(float).eps)
+    Z = Z + prec*np.identity(Z.shape[1])
+    return np.linalg.solve(Z, d[:, :, None])[:, :, 0].T
+
+
+def sweep_points(nu_smpl, SPP, values, smpl_idx, prec=None, smpl_w=None):
+    '''Function to update the SPP of all DOF once from the point values.
+
+    [Args]:
+            nu_smpl[array]: Array of shape (np.ndim(V),r,s) containing all sampled SPP, updated in place.
+            SPP[list]: List of the SPP in shape (r,Ni), updated in place.
+            values[array]: Values of the potential at the sampling points, shape (s,).
+            smpl_idx[array]: Sampling points in index representation of shape (s, np.ndim(V)).
+            prec[float]: Value for the regularization, default is ~1E-8.
+            smpl_w[array]: Weights of the sampling points of shape (s,), default None.
+
+    [Returns]:
+            [array]: Array of shape (r,) containing the new weights.'''
+
+    omega = np.empty(nu_smpl.shape[1:])
+    for k in range(len(SPP)):
+        get_omega_hole_smpl(nu_smpl, k, out=omega)
+        d, Z = build_dZ_points(values, omega, smpl_idx[:, k], SPP[k].shape[1], smpl_w=smpl_w)
+        weights, SPP[k] = get_norm(solve_points(Z, d, prec=prec))
+        get_nu_smpl(SPP[k], smpl_idx[:, k], out=nu_smpl[k])
+    return weights
+
+
+def get_point_error(weights, SPP, smpl_idx, values, smpl_w=None):
+    '''Function to get the weighted mean squared error of the CP expansion at the sampling points.
+
+    [Args]:
+            weights[array]: Weights of shape (r,).
+            SPP[list]: List of the SPP in shape (r,Ni).
+            smpl_idx[array]: Sampling points in index representation of shape (s, np.ndim(V)).
+            values[array]: Values of the potential at the sampling points, shape (s,).
+            smpl_w[array]: Weights of the sampling points of shape (s,), default None.
+
+    [Returns]:
+            [float]: Mean squared error in au^2.'''
+
+    diff2 = (get_cp_values(weights, SPP, smpl_idx) - values)**2
+    if smpl_w is None:
+        return diff2.mean()
+    return (smpl_w*diff2).sum()/smpl_w.sum()
@@ -0,0 +1,187 @@
+import numpy as np
+import functools
+import hashlib
+import types
+import os
+
+'''
+Contains the components for the content-addressed on-disk cache of the Monte-Carlo cuts. The cuts
+for every mode (1D) and every mode combination (2D) are stored as individual .npy blocks in a
+directory named after a hash of the constructor, the grids and the sampling points. Blocks are
+written as soon as they are computed and are loaded memory-mapped.
+'''
+
+# bump this whenever the layout of the stored blocks changes
+# 2: blocks hold the distinct cuts only (see MonteC.get_cutkeys)
+# 3: 2D blocks are stored samples-first (u,Ni,Nk)
+# 4: the constructor is identified by its constants, defaults and closure as well
+CACHE_VERSION = 4
+
+
+def get_value_id(value, seen=None):
+    '''Function to get a string identifying a value a constructor depends on (constant, default argument,
+    closure variable or argument of a functools.partial) independent of the current process.
+
+    [Args]:
+            value[object]: None, bool, number, string, bytes, array, tuple, list, dict, module, code object
+                        or function (see get_constructor_id).
+            seen[set]: Ids of the functions already identified, guards recursive closures. Default None.
+
+    [Returns]:
+            [str]: Identifier of the value, RuntimeError if it cannot be identified reliably.'''
+
+    if value is None or isinstance(value, (bool, int, float, complex, str, bytes, np.generic)):
+        return '{}:{!r}'.format(type(value).__name__, value)
+    if isinstance(value, np.ndarray):
+        value = np.ascontiguousarray(value)
+        return 'array:{}:{}:{}'.format(value.dtype.str, value.shape, hashlib.sha1(value.tobytes()).hexdigest())
+    if isinstance(value, (tuple, list, frozenset, set)):
+        elems = [get_value_id(elem, seen) for elem in value]
+        if isinstance(value, (frozenset, set)):
+            elems = sorted(elems)
+        return '{}({})'.format(type(value).__name__, ','.join(elems))
+    if isinstance(value, dict):
+        return 'dict({})'.format(','.join(sorted('{}={}'.format(get_value_id(key, seen), get_value_id(elem, seen))\
+                                                 for key, elem in value.items())))
+    if isinstance(value, types.ModuleType):
+        return 'module:{}'.format(value.__name__)
+    if isinstance(value, types.CodeType):
+        return 'code:{}:{}:{}'.format(hashlib.sha1(value.co_code).hexdigest(), ' '.join(value.co_names),\
+                                      get_value_id(value.co_consts, seen))
+    return get_constructor_id(value, seen)
+
+
+def get_constructor_id(constructor, seen=None):
+    '''Function to get a string identifying a constructor function independent of the current
+    process (no memory addresses). Everything the result of a plain function depends on apart from the
+    globals it calls is part of the identifier: the bytecode, the names and constants it uses, its
+    default arguments and the contents of its closure. A functools.partial is identified by its function
+    and arguments, builtins and numpy ufuncs by their name. Other callables (instances with __call__,
+    bound methods) carry state which cannot be identified reliably, they have to provide a string
+    attribute cache_key which is used instead.
+
+    [Args]:
+            constructor[function]: Function used to compute the cuts through the potential.
+            seen[set]: Ids of the functions already identified, guards recursive closures. Default None.
+
+    [Returns]:
+            [str]: Identifier of the constructor, RuntimeError if it cannot be identified reliably.'''
+
+    key = getattr(constructor, 'cache_key', None)
+    if isinstance(key, str):
+        return 'key:' + key
+    
+    name = '{}.{}'.format(getattr(constructor, '__module__', ''),\
+                          getattr(constructor, '__qualname__', type(constructor).__name__))
+    if isinstance(constructor, (types.BuiltinFunctionType, np.ufunc)):
+        return name
+    if isinstance(constructor, functools.partial):
+        return 'partial:{}:{}:{}'.format(get_constructor_id(constructor.func, seen),\
+                                         get_value_id(constructor.args, seen), get_value_id(constructor.keywords, seen))
+    if not isinstance(constructor, types.FunctionType):
+        raise RuntimeError('The cut cache cannot identify the constructor {}, give it a string attribute cache_key '\
+                           'or run without cache.'.format(name))
+    
+    seen = set() if seen is None else seen
+    if id(constructor) in seen:
+        return name
+    seen.add(id(constructor))
+    cells = [cell.cell_contents for cell in (constructor.__closure__ or ())]
+    parts = [get_value_id(constructor.__code__, seen), get_value_id(constructor.__defaults__, seen),\
+             get_value_id(constructor.__kwdefaults__, seen), get_value_id(cells, seen)]
+    return name + ':' + hashlib.sha1(' '.join(parts).encode()).hexdigest()
+
+
+def get_cache_key(kind, constructor, grid_list, smpl_idx):
+    '''Function to compute the content-address of a set of cuts.
+
+    [Args]:
+            kind[str]: Type of the cuts, '1D' or '2D'.
+            constructor[function]: Function used to compute the cuts through the potential.
+            grid_list[list]: List containing the grids for each coordinate.
+            smpl_idx[array]: Sampling points in index representation of shape (s, np.ndim(V)).
+
+    [Returns]:
+            [str]: Hex digest identifying the cuts.'''
+
+    sha = hashlib.sha1()
+    sha.update('{} {} {}'.format(CACHE_VERSION, kind, get_constructor_id(constructor)).encode())
+    for grid in grid_list:
+        grid = np.ascontiguousarray(grid, dtype=float)
+        sha.update(str(grid.shape).encode())
+        sha.update(grid.tobytes())
+    smpl_idx = np.ascontiguousarray(smpl_idx, dtype=np.int64)
+    sha.update(str(smpl_idx.shape).encode())
+    sha.update(smpl_idx.tobytes())
+    return sha.hexdigest()
+
+
+def open_cache(cachedir, key, info=''):
+    '''Function to get (and if necessary create) the directory holding the blocks for one key.
+
+    [Args]:
+            cachedir[str]: Root directory of the cache.
+            key[str]: Key as returned by get_cache_key.
+            info[str]: Human readable description written to the directory on creation.
+
+    [Returns]:
+            [str]: Path of the directory for the given key.'''
+
+    path = os.path.join(cachedir, key)
+    os.makedirs(path, exist_ok=True)
+    infofile = os.path.join(path, 'info')
+    if not os.path.exists(infofile):
+        with open(infofile, 'w') as file:
+            file.write(info)
+    return path
+
+
+def block_name(modes):
+    '''Function to get the filename of the block for one mode or mode combination.
+
+    [Args]:
+            modes[list]: [k] for a 1D block or [i,j] for a 2D block.
+
+    [Returns]:
+            [str]: Filename of the block.'''
+
+    return 'cuts{}D_{}.npy'.format(len(modes), '_'.join(str(m) for m in modes))
+
+
+def load_block(path, modes):
+    '''Function to load a block memory-mapped (read-only, no copy).
+
+    [Args]:
+            path[str]: Directory of the key.
+            modes[list]: [k] for a 1D block or [i,j] for a 2D block.
+
+    [Returns]:
+            [memmap]: The stored block or None if it was not computed yet.'''
+
+    filename = os.path.join(path, block_name(modes))
+    if not os.path.exists(filename):
+        return None
+    try:
+        return np.load(filename, mmap_mode='r')
+    except ValueError:
+        # truncated or otherwise damaged block, it will simply be recomputed
+        return None
+
+
+def save_block(path, modes, block):
+    '''Function to atomically write one block, a partially written block can never be picked up
+    by load_block.
+
+    [Args]:
+            path[str]: Directory of the key.
+            modes[list]: [k] for a 1D block or [i,j] for a 2D block.
+            block[array]: The cuts to store.
+
+    [Returns]:
+            [memmap]: The stored block loaded memory-mapped.'''
+
+    filename = os.path.join(path, block_name(modes))
+    tmpname = filename[:-4] + '.{}.tmp.npy'.format(os.getpid())
+    np.save(tmpname, np.ascontiguousarray(block))
+    os.replace(tmpname, filename)
+    return np.load(filename, mmap_mode='r')
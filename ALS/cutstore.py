@@ -0,0 +1,165 @@
+import numpy as np
+from collections import OrderedDict
+from ALS.MonteC import *
+
+'''
+Contains the lazily generated store for the 2D Monte-Carlo cuts. Instead of building the cuts for all
+f(f-1)/2 mode combinations up front, the cuts of a combination are only computed when the 2D MC ALS
+reaches it. They are held in a compact data type and dropped again (least recently used first) once
+a memory budget is exceeded. With the cut cache the blocks are written to disk and loaded
+memory-mapped instead.
+'''
+
+
+def get_cuts_pair_par(comb, constructor, Grid_List, sample_points, dtype=float):
+    '''Function to build the 2D cuts of one mode combination, the sampling points are split across all
+    available CPU cores.
+
+    [Args]:
+            comb[list]: Mode combination [i,j].
+            constructor[function]: Function to compute the cuts, should take the grids individually.
+            Grid_List[list]: List containing the grids.
+            sample_points[array]: Array of the sampling points of shape (s, np.ndim(V)).
+            dtype[type]: Data type of the returned cuts, default float.
+
+    [Returns]:
+            [array]: 2D cuts for all sampling points in shape (s,Ni,Nj).'''
+
+    # see MonteC.get_cuts_comb_par for the global job
+    global jobpair
+    def jobpair(points):
+        return get_cuts_ind2D_smpl(constructor, Grid_List[comb[0]], comb[0], Grid_List[comb[1]], comb[1],\
+                                   points, dtype=dtype)
+
+    cpus = min(len(sched_getaffinity(0)), max(len(sample_points), 1))
+    track_progress('Building 2D cuts', 0, 'Pair:{} '.format(comb))
+    with mp.Pool(cpus) as p:
+        out = np.concatenate(p.map(jobpair, np.array_split(sample_points, cpus)))
+    print('\r'+' '*100, end='')
+    track_progress('Building 2D cuts', 1, 'Pair:{} '.format(comb))
+    return out
+
+
+class CutStore2D:
+    '''
+    List-like store for the distinct 2D cuts of all mode combinations. store[n] returns the cuts of
+    comblist[n] in shape (u,Ni,Nj) (samples first, so build_d2d uses them without a copy) and computes
+    them on first access.
+
+    ******************************************************************************************************
+    [CutStore2D] = CutStore2D(comblist, constructor, Grid_List, smpl_idx, dtype=float, budget=None,
+                              cachedir=None)
+    ******************************************************************************************************
+
+    ******************************************************************************************************
+    [Attributes]:
+
+            self.comblist[list]: List of the mode combinations [[i,j],[i,k],...].
+            self.constructor[function]: Function to compute the cuts, should take the grids individually.
+            self.grids[list]: List containing the grids.
+            self.dtype[dtype]: Data type of the stored cuts, e.g. np.float32 to halve the memory.
+            self.budget[float]: Maximum amount of bytes held in memory, default None keeps everything.
+                        Dropped combinations are recomputed (or reloaded from the cache) on the next access.
+            self.cachedir[str]: Root directory of the cut cache. If given, every block is written to disk
+                        and used memory-mapped, these blocks do not count against the budget.
+
+            self.smpl_idx[array]: Sampling points in index representation of shape (s, np.ndim(V)).
+            self.keys[list]: Distinct reduced sampling points for every combination.
+            self.cutmaps[list]: Index maps of shape (s,) from the sampling points to the distinct cuts.
+            self.blocks[OrderedDict]: Currently held blocks, least recently used first.
+    ******************************************************************************************************
+    '''
+
+
+    def __init__(self, comblist, constructor, Grid_List, smpl_idx, dtype=float, budget=None, cachedir=None):
+        self.comblist = comblist
+        self.constructor = constructor
+        self.grids = Grid_List
+        self.dtype = np.dtype(dtype)
+        self.budget = budget
+        self.cachedir = cachedir
+        self.blocks = OrderedDict()
+        self.set_samples(smpl_idx)
+
+
+    def __len__(self):
+        return len(self.comblist)
+
+
+    def __getitem__(self, n):
+        '''Get the distinct cuts of comblist[n], compute them if they are not held.'''
+
+        if n in self.blocks:
+            self.blocks.move_to_end(n)
+            return self.blocks[n]
+
+        block = None if self.path is None else load_block(self.path, self.comblist[n])
+        if block is None:
+            block = get_cuts_pair_par(self.comblist[n], self.constructor, self.grids,\
+                                      get_true_points(self.grids, self.keys[n]), dtype=self.dtype)
+            if self.path is not None:
+                block = save_block(self.path, self.comblist[n], block)
+        self.blocks[n] = block
+        self.evict()
+        return block
+
+
+    def set_samples(self, smpl_idx):
+        '''self.set_samples(smpl_idx)
+
+                Function to set the sampling points, all held blocks are dropped.
+
+                [Args]:
+                        smpl_idx[array]: Sampling points in index representation of shape (s, np.ndim(V)).'''
+
+        self.smpl_idx = smpl_idx
+        self.keys, self.cutmaps = map(list, zip(*[get_cutkeys(smpl_idx, comb) for comb in self.comblist]))
+        self.blocks = OrderedDict()
+        self.path = None
+        if self.cachedir is not None:
+            # compact blocks get their own key, float64 blocks are shared with MonteC.get_cuts2D
+            kind = '2D' if self.dtype == np.float64 else '2D-{}'.format(self.dtype.name)
+            self.path = open_cache(self.cachedir, get_cache_key(kind, self.constructor, self.grids, smpl_idx),\
+                                   '{} cuts, {}, grid shape {}, {} samples \n'\
+                                   .format(kind, get_constructor_id(self.constructor),\
+                                           [len(g) for g in self.grids], len(smpl_idx)))
+
+
+    def extend(self, new_idx):
+        '''self.extend(new_idx)
+
+                Function to append new sampling points. The held blocks are extended by the new distinct
+                cuts only (see MonteC.extend_cuts), all others are computed on their next access.
+
+                [Args]:
+                        new_idx[array]: New sampling points in index representation of shape (s', np.ndim(V)).
+
+                [Returns]:
+                        [array]: Combined sampling points of shape (s+s', np.ndim(V)).'''
+
+        held = list(self.blocks)
+        blocks = []
+        all_idx = np.concatenate([self.smpl_idx, new_idx]).astype(int)
+        if held:
+            _, blocks, _ = extend_cuts([self.comblist[n] for n in held], self.constructor, self.grids,\
+                                       self.smpl_idx, [self.blocks[n] for n in held], new_idx)
+        self.set_samples(all_idx)
+        for n, block in zip(held, blocks):
+            if self.path is not None:
+                block = save_block(self.path, self.comblist[n], block)
+            self.blocks[n] = block
+        self.evict()
+        return all_idx
+
+
+    def nbytes(self):
+        '''Amount of bytes of the blocks held in memory, memory-mapped blocks are not counted.'''
+
+        return sum(block.nbytes for block in self.blocks.values() if not isinstance(block, np.memmap))
+
+
+    def evict(self):
+        '''Drop the least recently used blocks until the budget is met, the last used one is always kept.'''
+
+        while self.budget != None and len(self.blocks) > 1 and self.nbytes() > self.budget:
+            self.blocks.popitem(last=False)
@@ -0,0 +1,149 @@
+import numpy as np
+from ALS.MonteC import *
+
+'''
+Contains the components for the hybrid exact/sampled ALS. Within one sweep every mode is either updated
+exactly (full contraction of the tensor, see ALS1D.get_update) or from sampled 1D cuts (see
+MonteC.update_MC), the choice is made per mode by a simple cost model. All modes work on the same SPP,
+the sampled SPP of a mode are gathered from the current SPP right before its update.
+'''
+
+
+def get_mode_samples(Nlist, rank, k, oversample=2, nmax=None):
+    '''Function to get the amount of sampling points for one mode. The SPP of mode k have r*Nk entries,
+    the amount of sampling points is sized to that and capped at the amount of distinct cuts along k.
+
+    [Args]:
+            Nlist[list]: Number of grid points along every coordinate.
+            rank[int]: Rank of the expansion.
+            k[int]: Index of the mode.
+            oversample[float]: Sampling points per entry of the SPP of mode k, default 2.
+            nmax[int]: Upper limit for the amount of sampling points, default None.
+
+    [Returns]:
+            [int]: Amount of sampling points for mode k.'''
+
+    ncuts = int(np.prod(np.array(Nlist, dtype=float))/Nlist[k])
+    nsmpl = min(int(np.ceil(oversample*rank*Nlist[k])), ncuts)
+    return nsmpl if nmax is None else min(nsmpl, int(nmax))
+
+
+def get_mode_costs(Nlist, rank, nsmpl_list, tensor=True, pot_cost=1E3, max_iter=100):
+    '''Function to estimate the cost (in floating point operations per iteration) of the exact and the
+    sampled update of every mode.
+
+    exact:   contraction of the tensor with the SPP of all other modes, ~ (r+1)*prod(N)
+    sampled: gathering and multiplying the sampled SPP, building d and Z, ~ s*r*(2f+r+Nk), plus the
+             s*Nk potential evaluations for the cuts spread over max_iter iterations
+
+    [Args]:
+            Nlist[list]: Number of grid points along every coordinate.
+            rank[int]: Rank of the expansion.
+            nsmpl_list[list]: Amount of sampling points for every mode, see get_mode_samples.
+            tensor[bool]: If the exact tensor is available, otherwise the exact update is impossible.
+            pot_cost[float]: Cost of one potential evaluation in floating point operations, 0 if the
+                        cuts are gathered from the tensor. Default 1E3.
+            max_iter[int]: Amount of iterations the cuts are used for, default 100.
+
+    [Returns]:
+            [array]: Cost of the exact update for every mode, inf without the tensor.
+            [array]: Cost of the sampled update for every mode.'''
+
+    f = len(Nlist)
+    size = np.prod(np.array(Nlist, dtype=float))
+    exact = np.full(f, (rank+1)*size if tensor == True else np.inf)
+    sampled = np.array([s*rank*(2*f+rank+N) + pot_cost*s*N/max(max_iter, 1)\
+                        for s, N in zip(nsmpl_list, Nlist)], dtype=float)
+    return exact, sampled
+
+
+def choose_modes(Nlist, rank, nsmpl_list, tensor=True, pot_cost=1E3, max_iter=100):
+    '''Function to decide per mode between the exact and the sampled update by the cost model of
+    get_mode_costs.
+
+    [Args]:
+            see get_mode_costs
+
+    [Returns]:
+            [list]: 'exact' or 'sampled' for every mode.'''
+
+    exact, sampled = get_mode_costs(Nlist, rank, nsmpl_list, tensor=tensor, pot_cost=pot_cost,\
+                                    max_iter=max_iter)
+    return ['exact' if e <= s else 'sampled' for e, s in zip(exact, sampled)]
+
+
+def get_mode_cuts(k, smpl_idx, constructor=None, Grid_List=None, v_ex=None):
+    '''Function to get the distinct 1D cuts along one mode, either computed with the constructor or
+    gathered from the exact tensor.
+
+    [Args]:
+            k[int]: Index of the mode.
+            smpl_idx[array]: Sampling points of mode k in index representation of shape (s, np.ndim(V)).
+            constructor[function]: Function to create the cuts, default None gathers them from v_ex.
+            Grid_List[list]: List containing the grids, needed with the constructor.
+            v_ex[array]: Exact tensor, needed without the constructor.
+
+    [Returns]:
+            [array]: Distinct 1D cuts along k in shape (Nk,u).
+            [array]: Index map of shape (s,) from the sampling points to the cuts.'''
+
+    keys, cutmap = get_cutkeys(smpl_idx, [k])
+    if constructor is not None:
+        return get_all_cuts_par(constructor, Grid_List, get_true_points(Grid_List, keys), modes=[k])[0], cutmap
+
+    if type(v_ex) != np.ndarray:
+        raise RuntimeError('The sampled cuts need either a constructor or the exact tensor.')
+    rest = tuple(keys[:, j] for j in range(np.ndim(v_ex)) if j != k)
+    return np.ascontiguousarray(np.moveaxis(v_ex, k, 0)[(slice(None),)+rest]), cutmap
+
+
+def update_sampled(SPP, k, cuts, cutmap, smpl_idx, prec=None, smpl_w=None):
+    '''Function to update the SPP of one mode from its sampled cuts, the sampled SPP are gathered from
+    the current SPP of all modes.
+
+    [Args]:
+            SPP[list]: List of the SPP in shape (r,Ni).
+            k[int]: Index of the mode.
+            cuts[array]: Distinct 1D cuts along k in shape (Nk,u).
+            cutmap[array]: Index map of shape (s,) from the sampling points to the cuts.
+            smpl_idx[array]: Sampling points of mode k in index representation of shape (s, np.ndim(V)).
+            prec[float]: Value for the regularization, default is ~1E-8.
+            smpl_w[array]: Weights of the sampling points of shape (s,), default None.
+
+    [Returns]:
+            [array]: Array of shape (r,) containing the new weights.
+            [array]: Array of shape (r,Nk) containing the new normalized SPP.'''
+
+    nu_smpl = get_all_nu_smpl(SPP, smpl_idx)
+    omega = get_omega_hole_smpl(nu_smpl, k, out=np.empty(nu_smpl.shape[1:]))
+    return update_MC(nu_smpl, omega, cuts, prec=prec, cutmap=cutmap, smpl_w=smpl_w)
+
+
+def sweep_hybrid(v_ex, SPP, sigmas, plan, cuts, cutmaps, smpl_idx, prec=None, smpl_w=None):
+    '''Function to update the SPP of all modes once, every mode with the update chosen in plan.
+
+    [Args]:
+            v_ex[array]: Exact tensor, only used for the exact modes.
+            SPP[list]: List of the SPP in shape (r,Ni), updated in place.
+            sigmas[list]: List of the sigmas (SPP[k]@SPP[k].T), updated in place.
+            plan[list]: 'exact' or 'sampled' for every mode, see choose_modes.
+            cuts[list]: Distinct 1D cuts of every sampled mode (None for the exact ones).
+            cutmaps[list]: Index maps of the cuts of every sampled mode.
+            smpl_idx[list]: Sampling points of every sampled mode.
+            prec[float]: Value for the regularization, default is ~1E-8.
+            smpl_w[list]: Weights of the sampling points of every sampled mode (None if unweighted),
+                        default None.
+
+    [Returns]:
+            [array]: Array of shape (r,) containing the new weights.'''
+
+    if smpl_w is None:
+        smpl_w = [None]*len(SPP)
+    for k in range(len(SPP)):
+        if plan[k] == 'exact':
+            weights, SPP[k] = get_update(v_ex, SPP, sigmas, k, prec=prec)
+        else:
+            weights, SPP[k] = update_sampled(SPP, k, cuts[k], cutmaps[k], smpl_idx[k], prec=prec,\
+                                             smpl_w=smpl_w[k])
+        update_sigma(SPP, sigmas, k)
+    return weights
@@ -0,0 +1,161 @@
+from ALS.dvr import sinDVR, hoDVR
+import numpy as np
+
+'''
+Contains the components to use a fitted CP expansion as a surrogate of the potential at arbitrary
+coordinates. Every SPP is given on a DVR grid, the DVR functions chi_g(x) = sum_j trafo[j,g]*phi_j(x)
+(phi_j the underlying basis, sine or harmonic oscillator functions) interpolate it exactly:
+
+    nu(x) = sum_g nu(x_g)*w_g*chi_g(x),    w_g*chi_g(x_h) = delta_gh
+
+with w_g the (square root) DVR weights. The sine functions vanish at the edges of the box, a SPP which does
+not (a potential wall at the end of the grid) makes the interpolation oscillate. By default the line
+through the first and last grid value is therefore taken out of every SPP and added back exactly, only the
+remainder is interpolated with the DVR, the values on the grid stay exact. The per-mode maps are built
+once, a batch of n coordinates then costs O(n*f*N*r). The grids of the ALS can be functions of the DVR coordinate (the
+angle of H2O runs on the arccos of a DVR in cos(theta)), a coordinate map per mode brings the
+coordinates back onto the DVR.
+'''
+
+
+def get_basis(dvr, x):
+    '''Function to evaluate the basis functions underlying a DVR.
+
+    [Args]:
+            dvr[DVR]: sinDVR or hoDVR.
+            x[array]: Coordinates of shape (n,).
+
+    [Returns]:
+            [array]: Basis functions phi_j(x) of shape (n, N).'''
+
+    x = np.asarray(x, dtype=float)
+    if isinstance(dvr, sinDVR):
+        # the box starts one grid spacing before the first point
+        dx = (dvr.xf - dvr.xi)/(dvr.N-1)
+        x0 = dvr.xi - dx
+        # sin((j+1)a) = 2cos(a)sin(ja) - sin((j-1)a), two trigonometric calls per point
+        a = np.pi/dvr.L*(x - x0)
+        # filled by rows, the transposed view is returned
+        phi = np.empty((dvr.N, len(x)))
+        phi[0] = np.sqrt(2/dvr.L)*np.sin(a)
+        c2 = 2*np.cos(a)
+        phi[1] = c2*phi[0]
+        for n in range(2, dvr.N):
+            phi[n] = c2*phi[n-1] - phi[n-2]
+        return phi.T
+    if isinstance(dvr, hoDVR):
+        # normalized Hermite functions by the stable recursion
+        hofm = dvr.homass*dvr.hofreq
+        X = (x - dvr.hoxeq)*np.sqrt(hofm)
+        phi = np.empty((dvr.N, len(x)))
+        phi[0] = (hofm/np.pi)**0.25*np.exp(-X**2/2)
+        phi[1] = np.sqrt(2)*X*phi[0]
+        for n in range(2, dvr.N):
+            phi[n] = np.sqrt(2/n)*X*phi[n-1] - np.sqrt((n-1)/n)*phi[n-2]
+        return phi.T
+    raise RuntimeError('No basis known for {}.'.format(type(dvr).__name__))
+
+
+def get_interp_matrix(dvr, x):
+    '''Function to get the interpolation matrix of a DVR, values on the grid times the matrix give the
+    values at x.
+
+    [Args]:
+            dvr[DVR]: sinDVR or hoDVR.
+            x[array]: Coordinates of shape (n,).
+
+    [Returns]:
+            [array]: Matrix w_g*chi_g(x) of shape (n, N).'''
+
+    return get_basis(dvr, x) @ (dvr.trafo*dvr.weights)
+
+
+class CPInterpolator:
+    '''
+    Surrogate of the potential from a CP expansion on DVR grids, callable elementwise like PJT2 with one
+    (broadcastable) coordinate array per mode. The coordinates are in the units of the grids the
+    expansion was fitted on, coordinates outside of the grids are extrapolated by the basis (the sine
+    basis vanishes at the box edges).
+
+    ******************************************************************************************************
+    [CPInterpolator] = CPInterpolator(weights, SPP, dvrs, maps=None, baseline=True, chunk=65536)
+    ******************************************************************************************************
+
+    ******************************************************************************************************
+    [Attributes]:
+
+            self.weights[array]: Weights of the expansion of shape (r,).
+            self.dvrs[list]: The DVR of every mode, sinDVR or hoDVR with the grid of the SPP.
+            self.maps[list]: Coordinate map of every mode from the coordinate to the DVR coordinate, e.g.
+                        np.cos for an angle on a DVR in cos(theta), None keeps the coordinate.
+            self.baseline[bool]: If True the line through the end points of every SPP is interpolated
+                        linearly and only the remainder with the DVR, default True.
+            self.chunk[int]: Amount of coordinates evaluated at once, bounds the temporaries to
+                        O(chunk*(N+r)).
+
+            self.coef[list]: Per-mode maps of shape (N, r), the SPP (without the baseline) in the basis of
+                        the DVR times the weights of the DVR (trafo*w @ SPP.T).
+            self.lines[list]: Per-mode values of the SPP at the first grid point and their slope over the
+                        grid, shape (2, r), zero without baseline.
+    ******************************************************************************************************
+    '''
+
+    def __init__(self, weights, SPP, dvrs, maps=None, baseline=True, chunk=65536):
+        if len(dvrs) != len(SPP):
+            raise RuntimeError('{} DVRs given for {} modes.'.format(len(dvrs), len(SPP)))
+        for dvr, nu in zip(dvrs, SPP):
+            if dvr.N != nu.shape[1]:
+                raise RuntimeError('A DVR of {} points is given for SPP of length {}.'.format(dvr.N, nu.shape[1]))
+        self.weights = np.array(weights, dtype=float)
+        self.dvrs = list(dvrs)
+        self.maps = [None]*len(dvrs) if maps == None else list(maps)
+        self.baseline = baseline
+        self.chunk = chunk
+        self.coef, self.lines = [], []
+        for dvr, nu in zip(self.dvrs, SPP):
+            line = np.zeros((2, nu.shape[0]))
+            if baseline == True:
+                line[0] = nu[:, 0]
+                line[1] = (nu[:, -1] - nu[:, 0])/(dvr.grid[-1] - dvr.grid[0])
+            rest = nu - line[0][:, None] - line[1][:, None]*(dvr.grid - dvr.grid[0])
+            self.coef.append((dvr.trafo*dvr.weights) @ rest.T)
+            self.lines.append(line)
+
+    def to_dvr(self, k, x):
+        '''self.to_dvr(k, x)
+
+                Function to map coordinates of mode k onto its DVR coordinate.'''
+        x = np.asarray(x, dtype=float)
+        return x if self.maps[k] == None else self.maps[k](x)
+
+    def evaluate(self, x):
+        '''self.evaluate(x)
+
+                Function to evaluate the surrogate at a batch of coordinates.
+
+                [Args]:
+                        x[array]: Coordinates of shape (n, f).
+
+                [Returns]:
+                        [array]: Values of the surrogate of shape (n,).'''
+
+        x = np.atleast_2d(np.asarray(x, dtype=float))
+        values = np.empty(x.shape[0])
+        for start in range(0, x.shape[0], self.chunk):
+            xc = x[start:start+self.chunk]
+            # (r,n) layout, the basis is built by rows so no operand is copied
+            prod = np.ones((len(self.weights), xc.shape[0]))
+            for k, (dvr, coef, line) in enumerate(zip(self.dvrs, self.coef, self.lines)):
+                y = self.to_dvr(k, xc[:, k])
+                nu = coef.T @ get_basis(dvr, y).T
+                if self.baseline == True:
+                    nu += line[0][:, None] + line[1][:, None]*(y - dvr.grid[0])
+                prod *= nu
+            values[start:start+self.chunk] = self.weights @ prod
+        return values
+
+    def __call__(self, *coords):
+        '''Elementwise evaluation with one coordinate array per mode, the arrays are broadcast.'''
+        coords = np.broadcast_arrays(*[np.asarray(x, dtype=float) for x in coords])
+        shape = coords[0].shape
+        return self.evaluate(np.stack([x.ravel() for x in coords], axis=1)).reshape(shape)
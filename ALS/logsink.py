@@ -0,0 +1,359 @@
+import numpy as np
+import threading
+import time
+import os
+
+'''
+Contains the log sinks the ALSCPD run routines write their convergence history to. Every sink offers
+the same small interface:
+
+    sink.start(filename)                     start a new log (truncates an existing one)
+    with sink as log:                        open the log for a run, flushed on exit
+        log.note(text)                       comment line ('! text' in the text format)
+        log.record(it, left, right, total, rank, method)
+                                             one iteration, errors in cm-1
+    sink.export()                            write the legacy text file (no-op for the text sink)
+
+TextLog writes the legacy .als text file. BinaryLog keeps fixed-size records in memory and appends them
+to a binary columnar file (.alsb) from a background thread, the notes go to a small text side file.
+read_log and export_text turn a binary log back into arrays or the legacy text format.
+'''
+
+# codes of the methods in the binary log
+METHODS = ['init', '1DALSCPD', '2DALSCPD', '2DALSCPD/SVD', '1DMCALSCPD', '2DMCALSCPD', 'HybridALSCPD',\
+           'TCALSCPD']
+
+# layout of one record of the binary log
+LOG_DTYPE = np.dtype([('iter', '<i8'), ('left', '<f8'), ('right', '<f8'), ('total', '<f8'), ('time', '<f8'),\
+                      ('rank', '<i4'), ('method', '<i4')])
+
+# the binary log starts with this magic (padded to 16 bytes) followed by the raw records
+LOG_MAGIC = b'ALSLOG01'.ljust(16, b'\0')
+
+
+def get_log_paths(filename):
+    '''Function to get the files of the binary log belonging to an output file.
+
+    [Args]:
+            filename[str]: Name of the output file, e.g. 'name.als'.
+
+    [Returns]:
+            [str]: Name of the binary records file (name.alsb).
+            [str]: Name of the notes file (name.alsb.notes).'''
+
+    base = filename[:-4] if filename.endswith('.als') else filename
+    return base + '.alsb', base + '.alsb.notes'
+
+
+class TextLog:
+    '''
+    Log sink writing the legacy text format, one line per iteration.
+
+    ******************************************************************************************************
+    [TextLog] = TextLog(filename=None)
+    ******************************************************************************************************
+    '''
+
+
+    def __init__(self, filename=None):
+        self.filename = filename
+        self.file = None
+        self.depth = 0
+
+
+    def start(self, filename=None):
+        '''Start a new log, an existing file is overwritten with the header.'''
+
+        self.filename = self.filename if filename is None else filename
+        with open('{}'.format(self.filename), 'w') as file:
+            file.write('! Iteration RMSEleft RMSEright RMSEtot \n')
+
+
+    def __enter__(self):
+        self.depth += 1
+        if self.file is None:
+            self.file = open('{}'.format(self.filename), 'a')
+        return self
+
+
+    def __exit__(self, *args):
+        self.depth -= 1
+        if self.depth <= 0:
+            self.close()
+
+
+    def note(self, text):
+        with self:
+            self.file.write('! {} \n'.format(text))
+
+
+    def record(self, it, left, right, total, rank=None, method=None):
+        with self:
+            self.file.write('{} {} {} {} \n'.format(it, left, right, total))
+
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+    def position(self):
+        '''Current end of the log, see truncate.'''
+
+        if self.file is not None:
+            self.file.flush()
+        return [os.path.getsize(self.filename) if os.path.exists(self.filename) else 0]
+
+
+    def truncate(self, pos):
+        '''Drop everything written after the position pos returned by self.position, e.g. the lines written
+        after the checkpoint a run is resumed from.'''
+
+        self.close()
+        if os.path.exists(self.filename):
+            os.truncate(self.filename, min(int(pos[0]), os.path.getsize(self.filename)))
+
+
+    def export(self):
+        return self.filename
+
+
+class BinaryLog:
+    '''
+    Buffered log sink writing fixed-size binary records (see LOG_DTYPE). Records are collected in memory
+    and appended to the .alsb file by a background thread every interval seconds (or when the buffer is
+    full) and on leaving the with-block, so a run never waits for the disk in its iterations.
+
+    ******************************************************************************************************
+    [BinaryLog] = BinaryLog(filename=None, interval=5., size=4096)
+    ******************************************************************************************************
+
+    ******************************************************************************************************
+    [Attributes]:
+
+            self.filename[str]: Name of the output file, the log goes to the files of get_log_paths.
+            self.interval[float]: Seconds between two background flushes.
+            self.buf[array]: Record buffer of LOG_DTYPE.
+            self.nbuf[int]: Amount of records in the buffer.
+            self.nrows[int]: Amount of records written or buffered so far, the notes refer to it.
+            self.notes[list]: Buffered notes (nrows, text).
+    ******************************************************************************************************
+    '''
+
+
+    def __init__(self, filename=None, interval=5., size=4096):
+        self.filename = filename
+        self.interval = interval
+        self.buf = np.zeros(size, dtype=LOG_DTYPE)
+        self.nbuf = 0
+        self.nrows = None
+        self.notes = []
+        self.lock = threading.Lock()
+        self.stop = None
+        self.thread = None
+        self.depth = 0
+
+
+    def start(self, filename=None):
+        '''Start a new log, existing log files are truncated.'''
+
+        self.filename = self.filename if filename is None else filename
+        path, notes = get_log_paths(self.filename)
+        with open(path, 'wb') as file:
+            file.write(LOG_MAGIC)
+        open(notes, 'w').close()
+        self.nbuf = 0
+        self.nrows = 0
+        self.notes = []
+
+
+    def __enter__(self):
+        self.depth += 1
+        if self.thread is None:
+            self.stop = threading.Event()
+            self.thread = threading.Thread(target=self.flusher, daemon=True)
+            self.thread.start()
+        return self
+
+
+    def __exit__(self, *args):
+        self.depth -= 1
+        if self.depth <= 0:
+            self.close()
+
+
+    def flusher(self):
+        '''Background thread, flushes the buffer every self.interval seconds until stopped.'''
+
+        while not self.stop.wait(self.interval):
+            self.flush()
+
+
+    def get_nrows(self):
+        # continuing an existing log (e.g. after resume), count the records already on disk
+        if self.nrows is None:
+            path = get_log_paths(self.filename)[0]
+            size = os.path.getsize(path) if os.path.exists(path) else len(LOG_MAGIC)
+            self.nrows = (size - len(LOG_MAGIC))//LOG_DTYPE.itemsize
+        return self.nrows
+
+
+    def note(self, text):
+        with self.lock:
+            self.notes.append((self.get_nrows(), text))
+
+
+    def record(self, it, left, right, total, rank=0, method='init'):
+        with self.lock:
+            self.get_nrows()
+            if self.nbuf == len(self.buf):
+                self.write()
+            self.buf[self.nbuf] = (it, left, right, total, time.time(), rank, METHODS.index(method))
+            self.nbuf += 1
+            self.nrows += 1
+
+
+    def write(self):
+        # lock has to be held by the caller
+        path, notes = get_log_paths(self.filename)
+        if self.nbuf > 0:
+            if not os.path.exists(path):
+                with open(path, 'wb') as file:
+                    file.write(LOG_MAGIC)
+            with open(path, 'ab') as file:
+                file.write(self.buf[:self.nbuf].tobytes())
+            self.nbuf = 0
+        if self.notes:
+            with open(notes, 'a') as file:
+                for nrows, text in self.notes:
+                    file.write('{}\t{}\n'.format(nrows, text))
+            self.notes = []
+
+
+    def flush(self):
+        '''Write all buffered records and notes to disk.'''
+
+        with self.lock:
+            self.write()
+
+
+    def close(self):
+        '''Stop the background thread and flush.'''
+
+        if self.thread is not None:
+            self.stop.set()
+            self.thread.join()
+            self.thread = None
+        self.flush()
+
+
+    def position(self):
+        '''Amount of records and notes in the log after flushing, see truncate.'''
+
+        with self.lock:
+            self.write()
+            notes = get_log_paths(self.filename)[1]
+            nnotes = 0
+            if os.path.exists(notes):
+                with open(notes, 'r') as file:
+                    nnotes = sum(1 for line in file)
+            return [self.get_nrows(), nnotes]
+
+
+    def truncate(self, pos):
+        '''Drop the records and notes written after the position pos returned by self.position, e.g. the
+        ones written after the checkpoint a run is resumed from.'''
+
+        self.close()
+        path, notes = get_log_paths(self.filename)
+        with self.lock:
+            if os.path.exists(path):
+                os.truncate(path, min(len(LOG_MAGIC) + int(pos[0])*LOG_DTYPE.itemsize, os.path.getsize(path)))
+            if os.path.exists(notes):
+                with open(notes, 'r') as file:
+                    lines = file.readlines()[:int(pos[1])]
+                with open(notes, 'w') as file:
+                    file.writelines(lines)
+            self.nrows = None
+
+
+    def export(self, filename=None):
+        '''Write the log in the legacy text format, see export_text.'''
+
+        self.flush()
+        return export_text(self.filename, filename)
+
+
+def get_log_sink(kind, filename=None):
+    '''Function to get a log sink.
+
+    [Args]:
+            kind[str]: 'text' (legacy .als file) or 'binary', a sink object is returned as it is.
+            filename[str]: Name of the output file.
+
+    [Returns]:
+            [sink]: TextLog or BinaryLog.'''
+
+    if kind is None or kind == 'text':
+        return TextLog(filename)
+    if kind == 'binary':
+        return BinaryLog(filename)
+    if hasattr(kind, 'record') and hasattr(kind, 'note'):
+        return kind
+    raise RuntimeError('Unknown log sink {}, choose text or binary.'.format(kind))
+
+
+def read_log(filename):
+    '''Function to read a binary log.
+
+    [Args]:
+            filename[str]: Name of the output file (name.als) or of the binary log (name.alsb).
+
+    [Returns]:
+            [array]: Records of LOG_DTYPE, the method column indexes METHODS.
+            [list]: Notes as (amount of records before the note, text).'''
+
+    path, notes = get_log_paths(filename[:-1] if filename.endswith('.alsb') else filename)
+    with open(path, 'rb') as file:
+        if file.read(len(LOG_MAGIC)) != LOG_MAGIC:
+            raise RuntimeError('{} is not a binary ALS log.'.format(path))
+        data = file.read()
+    # drop a partially written last record
+    records = np.frombuffer(data[:len(data) - len(data) % LOG_DTYPE.itemsize], dtype=LOG_DTYPE)
+    out = []
+    if os.path.exists(notes):
+        with open(notes, 'r') as file:
+            for line in file:
+                nrows, text = line.rstrip('\n').split('\t', 1)
+                out.append((int(nrows), text))
+    return records, out
+
+
+def export_text(filename, textfile=None):
+    '''Function to convert a binary log into the legacy text format.
+
+    [Args]:
+            filename[str]: Name of the output file the binary log belongs to (name.als) or of the binary
+                        log (name.alsb).
+            textfile[str]: Name of the text file, default None uses name.als.
+
+    [Returns]:
+            [str]: Name of the written text file.'''
+
+    records, notes = read_log(filename)
+    path, notes_path = get_log_paths(filename[:-1] if filename.endswith('.alsb') else filename)
+    textfile = path[:-1] if textfile is None else textfile
+    if os.path.abspath(textfile) in [os.path.abspath(path), os.path.abspath(notes_path)]:
+        raise RuntimeError('The text log would overwrite the binary log {}.'.format(textfile))
+    with open(textfile, 'w') as file:
+        file.write('! Iteration RMSEleft RMSEright RMSEtot \n')
+        n = 0
+        for i, rec in enumerate(records):
+            while n < len(notes) and notes[n][0] <= i:
+                file.write('! {} \n'.format(notes[n][1]))
+                n += 1
+            file.write('{} {} {} {} \n'.format(rec['iter'], rec['left'], rec['right'], rec['total']))
+        for nrows, text in notes[n:]:
+            file.write('! {} \n'.format(text))
+    return textfile
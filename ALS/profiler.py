@@ -0,0 +1,502 @@
+import numpy as np
+import threading
+import tracemalloc
+import time
+import os
+
+'''
+Contains the opt-in profiler of the ALSCPD run routines. The run loops wrap every phase (contraction,
+assembly of the overlap, solve, subiterations, error, cut generation, ...) in
+
+    with prof.phase(name, cost):
+        ...
+
+and close every iteration with prof.next_iter(it, method). A disabled profiler hands out one shared
+no-op context, the cost models below (passed as functions) are only evaluated if it is enabled. The
+flop and byte counts are estimates from the shapes (multiply and add counted separately, bytes of the
+arrays read and written once), they are meant to compare the phases, not to replace a hardware counter.
+
+With memory='tracemalloc' or memory='rss' every phase also records the peak of the memory allocated
+on top of what was in use when it started. estimate_peak predicts the peak of a run from its shapes
+before anything is allocated.
+'''
+
+
+class NullPhase:
+    '''No-op phase handed out by a disabled profiler.'''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+NULL_PHASE = NullPhase()
+
+
+def get_rss():
+    '''Function to get the resident set size of the process in bytes (Linux, /proc/self/statm).'''
+
+    with open('/proc/self/statm', 'r') as file:
+        return int(file.read().split()[1])*os.sysconf('SC_PAGE_SIZE')
+
+
+class TraceProbe:
+    '''Memory probe on tracemalloc, exact for numpy arrays but slows down every allocation.'''
+
+    def start(self):
+        self.started = not tracemalloc.is_tracing()
+        if self.started:
+            tracemalloc.start()
+
+    def stop(self):
+        if self.started:
+            tracemalloc.stop()
+
+    def get(self):
+        '''Current and peak traced memory in bytes.'''
+        return tracemalloc.get_traced_memory()
+
+    def reset_peak(self):
+        tracemalloc.reset_peak()
+
+
+class RSSProbe:
+    '''Memory probe sampling the resident set size from a background thread every interval seconds,
+    cheap but blind to peaks shorter than the interval.'''
+
+    def __init__(self, interval=0.002):
+        self.interval = interval
+        get_rss()
+
+    def start(self):
+        self.peak = get_rss()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+        self.thread.start()
+
+    def sample(self):
+        while not self.stopped.wait(self.interval):
+            self.peak = max(self.peak, get_rss())
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def get(self):
+        '''Current and peak resident set size in bytes.'''
+        cur = get_rss()
+        self.peak = max(self.peak, cur)
+        return cur, self.peak
+
+    def reset_peak(self):
+        self.peak = get_rss()
+
+
+class Phase:
+    '''Timer of one phase, adds its time, counts and memory peak to the current iteration of the profiler
+    on exit.'''
+
+    def __init__(self, prof, name, cost):
+        self.prof = prof
+        self.name = name
+        self.cost = cost
+
+    def __enter__(self):
+        probe = self.prof.probe
+        if probe is not None:
+            cur, peak = probe.get()
+            # the enclosing phase keeps its peak so far, the probe then follows this phase only
+            if self.prof.stack:
+                self.prof.stack[-1].seen = max(self.prof.stack[-1].seen, peak)
+            probe.reset_peak()
+            self.base, self.seen = cur, cur
+            self.prof.stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        seconds = time.perf_counter() - self.start
+        peak = 0
+        if self.prof.probe is not None:
+            # the peak since the reset on enter covers all nested phases
+            peak = max(self.seen, self.prof.probe.get()[1]) - self.base
+            self.prof.stack.pop()
+        # the cost is evaluated after the phase, so it can refer to its results (e.g. the amount of cuts)
+        flops, nbytes = (0, 0) if self.cost is None else (self.cost() if callable(self.cost) else self.cost)
+        self.prof.add(self.name, seconds, flops, nbytes, peak)
+        return False
+
+
+class Profiler:
+    '''
+    Accumulates time, estimated floating point operations, estimated bytes moved, the amount of calls and
+    optionally the memory peak per phase and iteration.
+
+    ******************************************************************************************************
+    [Profiler] = Profiler(enabled=False, memory=None)
+    ******************************************************************************************************
+
+    ******************************************************************************************************
+    [Attributes]:
+
+            self.enabled[bool]: If False phase hands out NULL_PHASE and nothing is recorded.
+            self.memory[str]: None (no memory tracking), 'tracemalloc' or 'rss', see set_memory.
+            self.probe[probe]: TraceProbe, RSSProbe or None.
+            self.current[dict]: Phases of the running iteration, name -> [time, flops, bytes, calls, peak].
+            self.iters[list]: Closed iterations as (iteration, method, dict like self.current).
+    ******************************************************************************************************
+    '''
+
+
+    def __init__(self, enabled=False, memory=None):
+        self.enabled = enabled
+        self.memory = None
+        self.probe = None
+        self.stack = []
+        self.current = {}
+        self.iters = []
+        self.set_memory(memory)
+
+
+    def set_memory(self, memory):
+        '''self.set_memory(memory)
+
+                Switch the memory tracking of the phases.
+
+                [Args]:
+                        memory[str]: None (off), 'tracemalloc' (exact, every allocation gets slower) or
+                                    'rss' (resident set size sampled from a background thread, Linux).'''
+
+        if memory not in (None, 'tracemalloc', 'rss'):
+            raise RuntimeError('Unknown memory tracking {}, choose tracemalloc or rss.'.format(memory))
+        if self.probe is not None:
+            self.probe.stop()
+        self.memory = memory
+        self.probe = None if memory == None else (TraceProbe() if memory == 'tracemalloc' else RSSProbe())
+        if self.probe is not None:
+            self.probe.start()
+
+
+    def phase(self, name, cost=None):
+        '''self.phase(name, cost=None)
+
+                Context manager timing one phase.
+
+                [Args]:
+                        name[str]: Name of the phase, e.g. 'get_b_ein'.
+                        cost[tuple or function]: Estimated (floating point operations, bytes read and
+                                    written) of the phase, e.g. one of the cost models below. A function
+                                    without arguments is only called at the end of the phase and only if
+                                    the profiler is enabled. Default None counts only the time.'''
+
+        if not self.enabled:
+            return NULL_PHASE
+        return Phase(self, name, cost)
+
+
+    def add(self, name, seconds, flops=0, nbytes=0, peak=0):
+        '''self.add(name, seconds, flops=0, nbytes=0, peak=0)
+
+                Add one call of a phase to the running iteration, the peak is the maximum over the calls.'''
+
+        entry = self.current.setdefault(name, [0., 0., 0., 0, 0])
+        entry[0] += seconds
+        entry[1] += flops
+        entry[2] += nbytes
+        entry[3] += 1
+        entry[4] = max(entry[4], peak)
+
+
+    def next_iter(self, it, method):
+        '''self.next_iter(it, method)
+
+                Close the running iteration. Phases outside of an iteration (e.g. the cut generation before
+                the first one) end up in the next closed iteration.
+
+                [Args]:
+                        it[int]: Number of the iteration (self.iter of the ALSCPD object).
+                        method[str]: Method of the iteration, see ALS.logsink.METHODS.'''
+
+        if not self.enabled:
+            return
+        self.iters.append((it, method, self.current))
+        self.current = {}
+
+
+    def reset(self):
+        '''self.reset()
+
+                Drop everything recorded so far.'''
+
+        self.current = {}
+        self.iters = []
+
+
+    def get_table(self):
+        '''self.get_table()
+
+                Get everything recorded so far (including the running iteration with iteration -1) as one
+                row per iteration and phase.
+
+                [Returns]:
+                        [array]: Structured array with the fields iter, method, phase, time [s], flops,
+                                 bytes, calls and peak [bytes, 0 without memory tracking].'''
+
+        rows = [(it, method, name) + tuple(entry) for it, method, phases in self.iters\
+                for name, entry in phases.items()]
+        rows += [(-1, '', name) + tuple(entry) for name, entry in self.current.items()]
+        dtype = [('iter', 'i8'), ('method', 'U16'), ('phase', 'U32'), ('time', 'f8'), ('flops', 'f8'),\
+                 ('bytes', 'f8'), ('calls', 'i8'), ('peak', 'i8')]
+        return np.array(rows, dtype=dtype)
+
+
+    def get_summary(self, method=None):
+        '''self.get_summary(method=None)
+
+                Get the totals per phase.
+
+                [Args]:
+                        method[str]: Only count the iterations of this method, default None counts all.
+
+                [Returns]:
+                        [dict]: name -> dict with time [s], flops, bytes, calls, time per call [s], the rate
+                                in GFLOP/s and GB/s and the largest memory peak [bytes].'''
+
+        table = self.get_table()
+        if method != None:
+            table = table[table['method'] == method]
+        out = {}
+        for name in dict.fromkeys(table['phase'].tolist()):
+            rows = table[table['phase'] == name]
+            t, flops, nbytes, calls = rows['time'].sum(), rows['flops'].sum(), rows['bytes'].sum(),\
+                                      int(rows['calls'].sum())
+            out[name] = {'time': t, 'flops': flops, 'bytes': nbytes, 'calls': calls,\
+                         'time_per_call': t/max(calls, 1), 'GFLOPs': flops/t*1E-9 if t > 0 else 0.,\
+                         'GBs': nbytes/t*1E-9 if t > 0 else 0., 'peak': int(rows['peak'].max())}
+        return out
+
+
+    def save(self, filename):
+        '''self.save(filename)
+
+                Write the table of get_table as text, the profile of name.als goes to name.alsp.
+
+                [Args]:
+                        filename[str]: Name of the output file of the ALSCPD object.
+
+                [Returns]:
+                        [str]: Name of the written file.'''
+
+        path = get_profile_path(filename)
+        with open(path, 'w') as file:
+            file.write('! Iteration Method Phase Time[s] FLOP Bytes Calls Peak[bytes] \n')
+            for row in self.get_table():
+                file.write('{} {} {} {} {:.6g} {:.6g} {} {} \n'.format(row['iter'], row['method'] or '-',\
+                           row['phase'], row['time'], row['flops'], row['bytes'], row['calls'], row['peak']))
+        return path
+
+
+def get_profile_path(filename):
+    '''Function to get the name of the profile belonging to an output file.
+
+    [Args]:
+            filename[str]: Name of the output file, e.g. 'name.als'.
+
+    [Returns]:
+            [str]: Name of the profile (name.alsp).'''
+
+    base = filename[:-4] if filename.endswith('.als') else filename
+    return base + '.alsp'
+
+
+# ----------------------------------------------------------------------------------------------------
+# cost models, floating point operations and bytes (float64) of the phases
+
+
+def cost_b_ein(Nlist, rank, holes):
+    '''Function to estimate the contraction of the tensor with the SPP of all but the hole modes
+    (get_b_ein, get_b_ein2D). The first contraction dominates, every following one acts on a tensor
+    smaller by the contracted grid.
+
+    [Args]:
+            Nlist[list]: Number of grid points along every coordinate.
+            rank[int]: Rank of the expansion.
+            holes[list]: Indices of the modes left out.
+
+    [Returns]:
+            [float]: Floating point operations.
+            [float]: Bytes read and written.'''
+
+    size = float(np.prod(np.array(Nlist, dtype=float)))
+    flops, cur, first = 0., size, True
+    for k in range(len(Nlist)-1, -1, -1):
+        if k in holes:
+            continue
+        # the first contraction adds the rank index, the following ones run along it
+        scale = rank if first else 1
+        flops += 2*cur*scale
+        cur = cur*scale/Nlist[k]
+        first = False
+    # the copy of the tensor, the tensor itself and the first intermediate
+    return flops, 8*(3*size + size*rank/Nlist[-1])
+
+
+def cost_assemble_S(nmodes, rank):
+    '''Function to estimate the assembly of an overlap matrix from nmodes sigmas.'''
+
+    return float(nmodes*rank**2), 8.*(nmodes+1)*rank**2
+
+
+def cost_solve(rank, nrhs):
+    '''Function to estimate the solution of a regularized (r,r) system with nrhs right hand sides.'''
+
+    return 2/3*rank**3 + 2.*rank**2*nrhs, 8.*(rank**2 + 2*rank*nrhs)
+
+
+def cost_error(Nlist, rank):
+    '''Function to estimate the dense error of the expansion (geterrorleft), the expansion is
+    rebuilt on the full grid and compared to the tensor.'''
+
+    size = float(np.prod(np.array(Nlist, dtype=float)))
+    return 2*rank*size + 3*size, 8*3*size
+
+
+def cost_sub(Ni, Nj, rank, max_it=20):
+    '''Function to estimate the subiterations of the 2D ALS (runsub, runsubMC), upper bound of max_it
+    subiterations with two contractions of x_ij and two solves each.'''
+
+    flops = 2*(2*rank*Ni*Nj + 2/3*rank**3 + 2*rank**2*(Ni+Nj)) + 4*rank**2*Ni*Nj
+    return max_it*flops, max_it*8*(2*rank*Ni*Nj + rank*(Ni+Nj))
+
+
+def cost_sweep_MC(Nlist, rank, nsmpl, ncuts):
+    '''Function to estimate one sweep of the 1D Monte-Carlo ALS (sweep_MC) over all modes.
+
+    [Args]:
+            Nlist[list]: Number of grid points along every coordinate.
+            rank[int]: Rank of the expansion.
+            nsmpl[int]: Amount of sampling points.
+            ncuts[list]: Amount of distinct cuts of every mode.
+
+    [Returns]:
+            [float]: Floating point operations.
+            [float]: Bytes read and written.'''
+
+    flops, nbytes = 0., 0.
+    for N, u in zip(Nlist, ncuts):
+        # omega, d from the distinct cuts, Z, solve and the gather of the sampled SPP
+        flops += 3*rank*nsmpl + 2*rank*N*u + 2*rank**2*nsmpl + 2/3*rank**3 + 2*rank**2*N
+        nbytes += 8*(5*rank*nsmpl + N*u)
+    return flops, nbytes
+
+
+def cost_dZ2D(Ni, Nj, rank, nsmpl, ncuts):
+    '''Function to estimate the d and Z of one mode combination of the 2D Monte-Carlo ALS (build_dZ).'''
+
+    return 2*rank*Ni*Nj*ncuts + 2*rank**2*nsmpl + rank*nsmpl, 8*(Ni*Nj*ncuts + 3*rank*nsmpl)
+
+
+def cost_cut_error(Nlist, rank, nsmpl, holes_list):
+    '''Function to estimate the error on sampled cuts (get_cut_error), the expansion is rebuilt on the
+    cuts of every mode (combination) in holes_list.'''
+
+    points = nsmpl*sum(np.prod([Nlist[k] for k in holes], dtype=float) for holes in holes_list)
+    return 2*rank*points + 3*points, 8*2*points
+
+
+def cost_cuts(npoints, pot_flops=1E3):
+    '''Function to estimate the evaluation of npoints potential values for the cuts.'''
+
+    return pot_flops*npoints, 8*npoints*2
+
+
+# ----------------------------------------------------------------------------------------------------
+# memory models, bytes of the arrays alive at the peak of a run
+
+
+def get_cut_counts(Nlist, nsmpl, holes_list):
+    '''Function to get the upper bound of distinct cuts per mode (combination), every sampling point has
+    its own cut unless there are fewer points on the remaining grid.'''
+
+    size = np.prod(np.array(Nlist, dtype=float))
+    return [min(float(nsmpl), size/np.prod([Nlist[k] for k in holes], dtype=float)) for holes in holes_list]
+
+
+def estimate_peak(grid_shape, rank, nsmpl=None, method='1DALSCPD', tensor=True, cut_itemsize=8, nval=None):
+    '''Function to predict the peak memory of a run from its shapes, before anything is allocated. The
+    resident arrays (tensor, SPP, sampling points, sampled SPP, cuts and buffers) are counted fully, of
+    the transient ones only the largest phase, numbers are upper bounds (every sampling point is assumed
+    to have distinct cuts).
+
+    [Args]:
+            grid_shape[tuple]: Number of grid points along every coordinate.
+            rank[int]: Rank of the expansion.
+            nsmpl[int]: Amount of sampling points, needed for the Monte-Carlo methods.
+            method[str]: '1DALSCPD', '2DALSCPD', '2DALSCPD/SVD', '1DMCALSCPD', '2DMCALSCPD', 'setup_MC' or
+                        'setup_MC2D'.
+            tensor[bool]: If the exact tensor is kept in memory (False for the tensor-free Monte-Carlo).
+            cut_itemsize[int]: Bytes per value of the stored 2D cuts (4 for float32), default 8.
+            nval[int]: Amount of held-out sampling points in tensor-free mode, default nsmpl//10.
+
+    [Returns]:
+            [float]: Predicted peak in bytes.
+            [dict]: Bytes of the resident arrays ('resident') and of the transients of every phase.'''
+
+    N = [int(n) for n in grid_shape]
+    f, r = len(N), int(rank)
+    P = float(np.prod(np.array(N, dtype=float)))
+    pairs = [[i, j] for i in range(f) for j in range(i+1, f)]
+    singles = [[k] for k in range(f)]
+    mc = method in ('1DMCALSCPD', '2DMCALSCPD', 'setup_MC', 'setup_MC2D')
+    if mc and nsmpl == None:
+        raise RuntimeError('The memory of {} depends on the amount of sampling points nsmpl.'.format(method))
+    tensor = tensor if mc else True
+
+    phases = {}
+    resident = 8.*r*sum(N)
+    if tensor:
+        resident += 8*P
+        # cp_to_tensor forms the Khatri-Rao product of all but the first mode, then the rebuilt tensor,
+        # the difference and its square
+        phases['error'] = 8*max(r*P/N[0] + P, 3*P)
+    if method in ('1DALSCPD', '2DALSCPD', '2DALSCPD/SVD'):
+        holes_list = singles if method == '1DALSCPD' else pairs
+        # the copy of the tensor and the first contraction along the last mode that is no hole
+        last = lambda holes: max(k for k in range(f) if k not in holes)
+        phases['get_b_ein' if method == '1DALSCPD' else 'get_b_ein2D'] = \
+            max(8*(P + P*r/N[last(holes)]) for holes in holes_list)
+        if method != '1DALSCPD':
+            phases['runsub'] = max(8*4*r*N[i]*N[j] for i, j in pairs)
+    if mc:
+        s = float(nsmpl)
+        # sampling points and the sampled SPP
+        resident += 8*f*s + 8*f*r*s
+        if method in ('1DMCALSCPD', 'setup_MC'):
+            cuts = sum(8*N[k]*u for k, u in zip(range(f), get_cut_counts(N, s, singles)))
+            # the coordinates of every point of the cuts, the results of the workers and the cuts
+            phases['cuts1D'] = (f+2)*cuts
+            if method == '1DMCALSCPD':
+                # cuts, suffix/prefix/omega buffer of sweep_MC, the omega is collapsed within it
+                resident += cuts + 8*(f+3)*r*s
+                phases['sweep_MC'] = 8*(r*r + r*max(N))
+        else:
+            counts = get_cut_counts(N, s, pairs)
+            cuts = sum(cut_itemsize*N[i]*N[j]*u for (i, j), u in zip(pairs, counts))
+            # the results of the workers and the stacked cuts
+            phases['cuts2D'] = 2*cuts
+            if method == '2DMCALSCPD':
+                # cuts and the two-hole omega buffer, build_dZ collapses omega and forms d (plus its upcast)
+                resident += cuts + 8*2*r*s
+                phases['build_dZ'] = max(8*(r*u + 2*r*N[i]*N[j]) for (i, j), u in zip(pairs, counts))
+        if not tensor:
+            nval = max(1, int(s)//10) if nval == None else nval
+            holes_list = singles if method in ('1DMCALSCPD', 'setup_MC') else pairs
+            val = sum(8*nval*np.prod([N[k] for k in holes], dtype=float) for holes in holes_list)
+            resident += val
+            phases['val_error'] = 3*val/len(holes_list)
+
+    phases['resident'] = resident
+    phases = {key: float(value) for key, value in phases.items()}
+    return resident + max([phases[key] for key in phases if key != 'resident'] + [0.]), phases
@@ -0,0 +1,75 @@
+from ALS.ALS1D import au2ic
+import numpy as np
+
+'''
+Contains the holder of the exact tensor shared between ALSCPD objects. The tensor is stored once as a
+read-only view and the quantities which only depend on the tensor (its norm, the error of the empty
+expansion) are computed once and cached on the holder, so copies of an object only copy the SPP and
+the weights. Worker processes are forked and read the tensor copy-on-write, it is never written so it is
+held once.
+'''
+
+
+class SharedTensor:
+    '''
+    Read-only exact tensor shared by reference between ALSCPD objects (see ALSCPD.copy, ALSCPD.copy_reset).
+    The view is not writeable, the array it was made from should not be changed in place either since
+    the cached values would go stale.
+
+    ******************************************************************************************************
+    [SharedTensor] = SharedTensor(v_ex)
+    ******************************************************************************************************
+
+    ******************************************************************************************************
+    [Attributes]:
+
+            self.array[array]: Non-writeable view of the exact tensor of shape (N1, N2,..., Nf).
+            self.shape[tuple]: Shape of the exact tensor.
+            self.size[int]: Number of elements of the exact tensor.
+            self.msq[float]: Mean square of the tensor, the MSE of the empty (zero weights) expansion.
+                        Computed on first access.
+            self.norm[float]: Frobenius norm of the tensor, computed on first access.
+    ******************************************************************************************************
+    '''
+
+    def __init__(self, v_ex):
+        self.array = v_ex.view()
+        self.array.flags.writeable = False
+        self.shape = v_ex.shape
+        self.size = v_ex.size
+        self._msq = None
+
+    @property
+    def msq(self):
+        if self._msq == None:
+            # same expression as geterrorleft with the empty expansion, the initial errors do not change
+            self._msq = float((self.array**2).mean())
+        return self._msq
+
+    @property
+    def norm(self):
+        return np.sqrt(self.msq*self.size)
+
+    def initial_error(self):
+        '''self.initial_error()
+
+                Function to get the RMSE [cm-1] of the empty expansion (all weights zero), the error every
+                ALSCPD object starts from.
+
+                [Returns]:
+                        [float]: RMSE of the ALS functional with zero weights in cm-1.'''
+        return np.sqrt(self.msq)*au2ic
+
+
+def get_shared(v_ex):
+    '''Function to wrap the exact tensor for sharing, already shared tensors are returned as they are.
+
+    [Args]:
+            v_ex[array or SharedTensor]: Exact tensor, None in tensor-free mode.
+
+    [Returns]:
+            [SharedTensor]: Holder of the tensor, None in tensor-free mode.'''
+
+    if isinstance(v_ex, SharedTensor) or v_ex is None:
+        return v_ex
+    return SharedTensor(np.asarray(v_ex))
@@ -0,0 +1,195 @@
+import ALS.ALSclass as ALS
+import ALS.dvr as dvr
+import ALS.h2o as h2o
+import tensorly as tl
+import numpy as np
+import subprocess
+import os
+import platform
+import tracemalloc
+import json
+import time
+import sys
+
+
+'''
+End-to-end benchmark of the ALSCPD methods. Every method (run, run2D, run2D with YSVD, runMC and run2DMC)
+is run from the same initial guess to a fixed threshold on
+
+    - synthetic tensors of known CP rank (random SPP, fitted with the true rank) for growing grids and
+      dimensions
+    - the 3D H2O PJT2 tensor for growing grids
+
+and the time per iteration (cut generation included, it is also reported on its own), the iterations to
+reach thresh and the peak memory on top of the exact tensor (tracemalloc, measured in a second short run
+so the timings are not affected) are reported. The results are written to
+bench_als.json together with the commit and the numpy version, passing the file of an older run prints
+the ratios to it.
+
+Run from the repository root with:
+    python -m Benchmarks.bench_als [max_iter] [quick|full] [previous.json]
+'''
+
+
+METHODS = ['1DALSCPD', '2DALSCPD', '2DALSCPD/SVD', '1DMCALSCPD', '2DMCALSCPD']
+
+
+class SyntheticCP:
+    '''Potential of known CP rank on the index grids 0,...,N-1, callable elementwise like PJT2 so it
+    can produce the cuts of the Monte-Carlo methods.'''
+
+    def __init__(self, shape, rank, seed=0, scale=0.02):
+        rng = np.random.default_rng(seed)
+        self.SPP = [rng.random((rank, N)) for N in shape]
+        self.weights = scale*(1 + rng.random(rank))/rank
+
+    def __call__(self, *coords):
+        idx = [np.asarray(x).astype(int) for x in coords]
+        out = np.zeros(np.broadcast(*idx).shape)
+        for r, w in enumerate(self.weights):
+            term = w
+            for spp, i in zip(self.SPP, idx):
+                term = term*spp[r][i]
+            out += term
+        return out
+
+    def cut2D(self, *coords):
+        '''2D cuts like PJT2_2D, the two grid arguments span a (Ni,Nj) mesh.'''
+        grid = [i for i, x in enumerate(coords) if np.ndim(x) > 0]
+        args = []
+        for i, x in enumerate(coords):
+            if i in grid:
+                shape = [1]*len(grid)
+                shape[grid.index(i)] = -1
+                x = np.reshape(x, shape)
+            args.append(x)
+        return self(*args)
+
+    def tensor(self):
+        return tl.cp_to_tensor((self.weights, [spp.T for spp in self.SPP]))
+
+
+def synthetic_setup(shape, rank, seed=0):
+    '''Build the grids, the exact tensor and the constructor for a synthetic case.'''
+    pot = SyntheticCP(shape, rank, seed=seed)
+    grids = [np.arange(N, dtype=float) for N in shape]
+    return grids, pot.tensor(), pot, pot.cut2D
+
+
+def h2o_setup(N1=15, N2=15, Nu=20):
+    '''Build the grids, the exact tensor and the constructors for the H2O example.'''
+    r1 = dvr.sinDVR(N1, xi=1.0, xf=3.475)
+    r2 = dvr.sinDVR(N2, xi=1.0, xf=3.475)
+    u = dvr.sinDVR(Nu, xi=-0.95, xf=0.6)
+    grids = [r1.grid, r2.grid, np.arccos(u.grid)]
+    V = h2o.PJT2(*np.meshgrid(*grids, indexing='ij'))
+    return grids, V, h2o.PJT2, h2o.PJT2_2D
+
+
+def run_method(Object, method, max_iter, thresh):
+    '''Run one method on a fresh object.'''
+    if method == '1DALSCPD':
+        Object.run(max_iter, thresh, tracker=False)
+    elif method == '2DALSCPD':
+        Object.run2D(max_iter, thresh, tracker=False)
+    elif method == '2DALSCPD/SVD':
+        Object.run2D(max_iter, thresh, YSVD=True, tracker=False)
+    elif method == '1DMCALSCPD':
+        Object.runMC(max_iter, thresh, tracker=False)
+    elif method == '2DMCALSCPD':
+        Object.run2DMC(max_iter, thresh, tracker=False)
+
+
+def bench_case(name, grids, V, func1D, func2D, rank, nsmpl, max_iter, thresh, seed=0):
+    '''Benchmark all methods on one tensor, every method starts from the same initial guess.'''
+    results = []
+    for method in METHODS:
+        mc = 'MC' in method
+        make = lambda: ALS.ALSCPD('bench_als', V, rank, func1D=func1D if mc else None,\
+                                  func2D=func2D if mc else None, grids=grids if mc else None,\
+                                  nsmpl=nsmpl if mc else None, seed=seed if mc else None)
+        np.random.seed(seed)
+        Object = make()
+        Object.set_profiling()
+        start = time.perf_counter()
+        run_method(Object, method, max_iter, thresh)
+        total = time.perf_counter() - start
+        iters = len(Object.errorl) - 1
+        reached = [k for k, err in enumerate(Object.errorl) if err <= thresh]
+        profile = Object.get_profile()
+        setup = sum(profile[key]['time'] for key in ['samples', 'cuts1D', 'cuts2D'] if key in profile)
+
+        # peak memory of a short second run, construction (and the cuts) included
+        np.random.seed(seed)
+        tracemalloc.start()
+        run_method(make(), method, min(max(iters, 1), 3), thresh)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        results.append({'case': name, 'shape': [len(g) for g in grids], 'rank': rank, 'method': method,\
+                        'nsmpl': nsmpl if mc else None, 'time': total, 'setup_time': setup,\
+                        'time_per_iter': total/max(iters, 1),\
+                        'iterations': iters, 'iterations_to_thresh': reached[0] if reached else None,\
+                        'rmse': float(Object.errorl[-1]), 'peak_memory': int(peak)})
+        print('{:>24} {:>14} {:>10.4f} {:>6} {:>10.2f} {:>10.2f}'.format(name, method,\
+              results[-1]['time_per_iter'], iters, results[-1]['rmse'], peak/1E6))
+    return results
+
+
+def get_commit():
+    '''Commit of the benchmarked tree, None outside of a git checkout.'''
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,\
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, filename):
+    '''Print the ratio of the time per iteration and the peak memory to an older result file.'''
+    with open(filename, 'r') as file:
+        old = {(res['case'], res['method']): res for res in json.load(file)['results']}
+    print('')
+    print('Compared to {}:'.format(filename))
+    print('{:>24} {:>14} {:>12} {:>12}'.format('case', 'method', 'time/iter', 'memory'))
+    for res in results:
+        prev = old.get((res['case'], res['method']))
+        if prev is None:
+            continue
+        print('{:>24} {:>14} {:>11.2f}x {:>11.2f}x'.format(res['case'], res['method'],\
+              res['time_per_iter']/max(prev['time_per_iter'], 1E-12), res['peak_memory']/max(prev['peak_memory'], 1)))
+
+
+if __name__ == "__main__":
+
+    max_iter = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    size = sys.argv[2] if len(sys.argv) > 2 else 'quick'
+    previous = sys.argv[3] if len(sys.argv) > 3 else None
+    thresh = 1
+    rank = 4
+    nsmpl = 1000
+
+    if size == 'quick':
+        synthetic = [(12, 12, 12), (20, 20, 20), (8, 8, 8, 8)]
+        h2o_grids = [(10, 10, 12), (15, 15, 20)]
+    else:
+        synthetic = [(12, 12, 12), (20, 20, 20), (40, 40, 40), (8, 8, 8, 8), (14, 14, 14, 14), (6, 6, 6, 6, 6)]
+        h2o_grids = [(10, 10, 12), (15, 15, 20), (20, 20, 25), (30, 30, 40)]
+
+    print('{:>24} {:>14} {:>10} {:>6} {:>10} {:>10}'.format('case', 'method', 's/iter', 'iter', 'RMSE', 'peak MB'))
+    results = []
+    for shape in synthetic:
+        grids, V, func1D, func2D = synthetic_setup(shape, rank)
+        results += bench_case('synthetic_{}'.format('x'.join(map(str, shape))), grids, V, func1D, func2D, rank,\
+                              nsmpl, max_iter, thresh)
+    for shape in h2o_grids:
+        grids, V, func1D, func2D = h2o_setup(*shape)
+        results += bench_case('h2o_{}'.format('x'.join(map(str, shape))), grids, V, func1D, func2D, 5, nsmpl,\
+                              max_iter, thresh)
+
+    out = {'commit': get_commit(), 'numpy': np.__version__, 'python': platform.python_version(),\
+           'machine': platform.machine(), 'max_iter': max_iter, 'thresh': thresh, 'results': results}
+    with open('bench_als.json', 'w') as file:
+        json.dump(out, file, indent=1)
+    if previous != None:
+        compare(results, previous)
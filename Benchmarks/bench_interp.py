@@ -0,0 +1,92 @@
+import ALS.ALSclass as ALS
+import ALS.dvr as dvr
+import ALS.h2o as h2o
+from Benchmarks.bench_als import get_commit
+import numpy as np
+import platform
+import json
+import time
+import sys
+
+
+'''
+Benchmark of the CP surrogate of the H2O PJT2 potential at off-grid coordinates (see ALS.interp). The
+potential is fitted on a sine DVR grid (r1, r2 and cos(theta)), the SPP are interpolated with the DVR
+functions and the surrogate is compared to calling PJT2 directly on batches of random coordinates inside
+the grids:
+
+    - time per batch of both and the speedup
+    - RMSE and maximum deviation of the surrogate from PJT2 in cm-1, also restricted to the points below
+      cutoff (20000 cm-1 above the lowest point), the repulsive wall at the short OH distances dominates
+      the full RMSE
+    - on the grid points the surrogate has to reproduce the CP expansion (checked, AssertionError otherwise)
+
+The results are written to bench_interp.json.
+
+Run from the repository root with:
+    python -m Benchmarks.bench_interp [rank] [max_iter] [quick|full]
+'''
+
+
+def timeit(func, args, repeat=3):
+    '''Best time of repeat calls.'''
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, out
+
+
+if __name__ == "__main__":
+
+    rank = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    max_iter = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    size = sys.argv[3] if len(sys.argv) > 3 else 'quick'
+    batches = [1000, 10000, 100000] if size == 'quick' else [1000, 10000, 100000, 1000000]
+    shape = (15, 15, 20) if size == 'quick' else (25, 25, 30)
+
+    r1 = dvr.sinDVR(shape[0], xi=1.0, xf=3.475)
+    r2 = dvr.sinDVR(shape[1], xi=1.0, xf=3.475)
+    u = dvr.sinDVR(shape[2], xi=-0.95, xf=0.6)
+    grids = [r1.grid, r2.grid, np.arccos(u.grid)]
+    V = h2o.PJT2(*np.meshgrid(*grids, indexing='ij'))
+
+    np.random.seed(0)
+    Object = ALS.ALSCPD('bench_interp', V, rank)
+    start = time.perf_counter()
+    Object.run2D(max_iter, 1, tracker=False)
+    fit_time = time.perf_counter() - start
+    interp = Object.get_interpolator([r1, r2, u], maps=[None, None, np.cos])
+
+    # the surrogate reproduces the expansion on the grid
+    idx = np.stack([g.ravel() for g in np.indices(shape)], axis=1)
+    on_grid = interp(*[grids[k][idx[:, k]] for k in range(3)])
+    dev = np.abs(on_grid - Object.evaluate(idx)).max()
+    if not dev <= 1E-9*np.abs(V).max():
+        raise AssertionError('The surrogate deviates by {:.2e} from the expansion on the grid.'.format(dev))
+    print('Fitted rank {} on {} in {:.2f}s, grid RMSE {:.2f}cm-1.'.format(rank, shape, fit_time, Object.errorl[-1]))
+
+    rng = np.random.default_rng(0)
+    cutoff = 20000
+    print('{:>9} {:>12} {:>12} {:>9} {:>10} {:>10} {:>10}'.format('n', 'PJT2 [s]', 'CP [s]', 'speedup', 'RMSE',\
+          'max dev', 'RMSE<cut'))
+    results = []
+    for n in batches:
+        coords = [rng.uniform(r1.xi, r1.xf, n), rng.uniform(r2.xi, r2.xf, n),\
+                  np.arccos(rng.uniform(u.xi, u.xf, n))]
+        t_pot, ref = timeit(h2o.PJT2, coords)
+        t_cp, val = timeit(interp, coords)
+        err = (val - ref)*ALS.au2ic
+        low = (ref - ref.min())*ALS.au2ic < cutoff
+        results.append({'n': n, 'time_pjt2': t_pot, 'time_cp': t_cp, 'speedup': t_pot/t_cp,\
+                        'rmse': float(np.sqrt((err**2).mean())), 'max_dev': float(np.abs(err).max()),\
+                        'rmse_below_cutoff': float(np.sqrt((err[low]**2).mean())), 'frac_below_cutoff': float(low.mean())})
+        print('{:>9} {:>12.3e} {:>12.3e} {:>9.2f} {:>10.2f} {:>10.2f} {:>10.2f}'.format(n, t_pot, t_cp, t_pot/t_cp,\
+              results[-1]['rmse'], results[-1]['max_dev'], results[-1]['rmse_below_cutoff']))
+
+    out = {'commit': get_commit(), 'numpy': np.__version__, 'python': platform.python_version(),\
+           'machine': platform.machine(), 'shape': shape, 'rank': rank, 'max_iter': max_iter, 'cutoff': cutoff,\
+           'fit_rmse': float(Object.errorl[-1]), 'grid_deviation': float(dev), 'results': results}
+    with open('bench_interp.json', 'w') as file:
+        json.dump(out, file, indent=1)
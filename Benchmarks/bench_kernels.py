@@ -0,0 +1,258 @@
+import ALS.ALS1D as ALS1D
+import ALS.ALS2D as ALS2D
+import ALS.twoDsub as twoDsub
+import ALS.MonteC as MC
+from Benchmarks.bench_als import SyntheticCP, get_commit
+import numpy as np
+import importlib
+import platform
+import string
+import json
+import time
+import sys
+
+
+'''
+Micro-benchmarks of the hot kernels of the ALSCPD (contractions, overlap assembly, solves, SVD based
+subiteration terms, Monte-Carlo d and Z, cut generation) across rank, grid size and dimension.
+
+Every kernel is checked against a reference formulation of the same quantity written independently of
+the implementation (one einsum instead of the iterative contraction, explicit inverse instead of solve,
+loops over the sampling points, the exact tensor instead of the cut constructor, ...). A different
+backend is given as a module, its functions replace the ones of the same name and are checked against
+the reference and against the current implementation, so an optimized kernel can only be swapped in
+if it gives the same numbers. A mismatch raises an AssertionError.
+
+Run from the repository root with:
+    python -m Benchmarks.bench_kernels [quick|full] [backend.module]
+'''
+
+
+# ----------------------------------------------------------------------------------------------------
+# reference formulations
+
+
+def ref_b_ein(V, nu, holes):
+    '''Contraction of V with the SPP of all modes but the holes as one einsum, shape (r,N[holes]...).'''
+    f = np.ndim(V)
+    idx = string.ascii_lowercase[:f]
+    ops = [V]
+    subs = [idx]
+    for k in range(f):
+        if k not in holes:
+            ops.append(nu[k])
+            subs.append('z'+idx[k])
+    out = 'z' + ''.join(idx[k] for k in holes)
+    return np.einsum(','.join(subs)+'->'+out, *ops, optimize=True)
+
+
+def ref_assemble_S(sigmas, holes):
+    '''Elementwise product of all sigmas but the holes.'''
+    return np.prod(np.stack([sigma for k, sigma in enumerate(sigmas) if k not in holes]), axis=0)
+
+
+def ref_solve(S, b, prec=None):
+    '''Regularized solve with the explicit inverse, b of shape (r,...).'''
+    prec = np.sqrt(np.finfo(float).eps) if prec == None else prec
+    inv = np.linalg.inv(S + prec*np.identity(S.shape[0]))
+    return np.tensordot(inv, b, axes=(1, 0))
+
+
+def ref_rank1(x_ij):
+    '''Best rank one approximation of every (Ni,Nj) slice from the eigenvector of x x^T.'''
+    out = np.empty_like(x_ij)
+    for n, mat in enumerate(x_ij):
+        val, vec = np.linalg.eigh(mat@mat.T)
+        u = vec[:, -1]
+        out[n] = np.outer(u, u@mat)
+    return out
+
+
+def ref_Y(U, S, Vh, nu, SVrel):
+    '''Contraction of the SVD truncated x_ij with nu along its last index, shape (r',r,Ni).'''
+    SVrel = min(SVrel, S.shape[1])
+    x = np.einsum('aks,as,asl->akl', U[:, :, :SVrel], S[:, :SVrel], Vh[:, :SVrel, :])
+    return np.einsum('akl,bl->abk', x, nu)
+
+
+def ref_B(S_ij, U, S, Vh, nu, SVrel):
+    '''B of the subiterations from ref_Y, shape (r,Ni).'''
+    return np.einsum('ab,bak->ak', S_ij, ref_Y(U, S, Vh, nu, SVrel))
+
+
+def ref_d2d(cuts, omega, cutmap, smpl_w):
+    '''2D d as a loop over the sampling points.'''
+    d = np.zeros((omega.shape[0],) + cuts.shape[1:])
+    for n in range(omega.shape[1]):
+        d += (smpl_w[n]*omega[:, n])[:, None, None]*cuts[cutmap[n]]
+    return d
+
+
+def ref_Z(omega, smpl_w):
+    '''Z as a sum of the weighted outer products of the sampling points.'''
+    Z = np.zeros((omega.shape[0], omega.shape[0]))
+    for n in range(omega.shape[1]):
+        Z += smpl_w[n]*np.outer(omega[:, n], omega[:, n])
+    return Z
+
+
+def ref_solve_sub(S_ij, Y, S_ind, prec=None):
+    '''Solve of the subiterations with the right hand side contracted by loops over the rank.'''
+    b = np.zeros((Y.shape[1], Y.shape[2]))
+    for a in range(Y.shape[0]):
+        for c in range(Y.shape[1]):
+            b[c] += S_ij[c, a]*Y[a, c]
+    return ref_solve(S_ind, b, prec)
+
+
+def ref_cuts(V, points, holes):
+    '''Cuts gathered from the exact tensor, (Ni,s) for one hole and (s,Ni,Nj) for two.'''
+    rest = [k for k in range(np.ndim(V)) if k not in holes]
+    moved = np.moveaxis(V, rest, list(range(len(rest))))[tuple(points[:, k] for k in rest)]
+    return moved.T if len(holes) == 1 else moved
+
+
+# ----------------------------------------------------------------------------------------------------
+# kernels: name, module of the current implementation, arguments, reference
+
+
+def make_case(f, N, r, s, seed=0):
+    '''Random inputs for one case of dimension f, grid size N, rank r and s sampling points.'''
+    rng = np.random.default_rng(seed)
+    c = {'f': f, 'N': N, 'r': r, 's': s}
+    c['V'] = rng.random((N,)*f)
+    nu = [rng.standard_normal((r, N)) for k in range(f)]
+    c['nu'] = [spp/np.linalg.norm(spp, axis=1)[:, None] for spp in nu]
+    c['sigmas'] = [nu@nu.T for nu in c['nu']]
+    c['S'] = ALS1D.assemble_S(c['sigmas'], 0)
+    c['S_ij'] = ALS2D.assemble_S2D(c['sigmas'], 0, 1)
+    c['b'] = rng.random((r, N))
+    c['b2D'] = rng.random((r, N, N))
+    c['x_ij'] = rng.random((r, N, N))
+    c['U'], c['Sv'], c['Vh'] = np.linalg.svd(c['x_ij'], full_matrices=False)
+    c['SVrel'] = min(3, N)
+    c['Y'] = rng.random((r, r, N))
+    c['omega'] = rng.random((r, s))
+    c['smpl_w'] = rng.random(s)
+    u = max(1, s//2)
+    c['cuts2D'] = rng.random((u, N, N))
+    c['cutmap'] = rng.integers(0, u, s)
+    # cut generation, the constructor is a CP potential on the index grids
+    pot = SyntheticCP((N,)*f, r, seed=seed)
+    c['pot'], c['Vpot'] = pot, pot.tensor()
+    c['grid'] = np.arange(N, dtype=float)
+    ncut = min(s, 200)
+    c['points'] = rng.integers(0, N, (ncut, f))
+    return c
+
+
+KERNELS = [
+    ('get_b_ein', ALS1D, lambda c: (c['V'], c['nu'], c['f']//2),
+     lambda c: ref_b_ein(c['V'], c['nu'], [c['f']//2])),
+    ('get_b_ein2D', ALS2D, lambda c: (c['V'], c['nu'], 0, 1),
+     lambda c: ref_b_ein(c['V'], c['nu'], [0, 1])),
+    ('assemble_S', ALS1D, lambda c: (c['sigmas'], c['f']//2),
+     lambda c: ref_assemble_S(c['sigmas'], [c['f']//2])),
+    ('assemble_S2D', ALS2D, lambda c: (c['sigmas'], 0, 1),
+     lambda c: ref_assemble_S(c['sigmas'], [0, 1])),
+    ('solve_linear', ALS1D, lambda c: (c['S'], c['b']),
+     lambda c: ref_solve(c['S'], c['b'])),
+    ('solve_linear2D', ALS2D, lambda c: (c['S_ij'], c['b2D']),
+     lambda c: ref_solve(c['S_ij'], c['b2D'])),
+    ('solve_linear2DMC', MC, lambda c: (c['S_ij'], c['b2D']),
+     lambda c: ref_solve(c['S_ij'], c['b2D'])),
+    ('solve_linearsub', twoDsub, lambda c: (c['S_ij'], c['Y'], c['S']),
+     lambda c: ref_solve_sub(c['S_ij'], c['Y'], c['S'])),
+    ('reconstruct', ALS2D, lambda c: (c['x_ij'],),
+     lambda c: ref_rank1(c['x_ij'])),
+    ('construct_YSVD', twoDsub, lambda c: (c['U'], c['Sv'], c['Vh'], c['nu'][1], c['SVrel']),
+     lambda c: ref_Y(c['U'], c['Sv'], c['Vh'], c['nu'][1], c['SVrel'])),
+    ('construct_BSVD', twoDsub, lambda c: (c['S_ij'], c['U'], c['Sv'], c['Vh'], c['nu'][1], c['SVrel']),
+     lambda c: ref_B(c['S_ij'], c['U'], c['Sv'], c['Vh'], c['nu'][1], c['SVrel'])),
+    ('build_d2d', MC, lambda c: (c['cuts2D'], c['omega'], c['cutmap'], c['smpl_w']),
+     lambda c: ref_d2d(c['cuts2D'], c['omega'], c['cutmap'], c['smpl_w'])),
+    ('build_Z', MC, lambda c: (c['omega'], c['smpl_w']),
+     lambda c: ref_Z(c['omega'], c['smpl_w'])),
+    ('get_cuts_ind', MC, lambda c: (c['pot'], c['grid'], 0, c['points'].astype(float)),
+     lambda c: ref_cuts(c['Vpot'], c['points'], [0])),
+    ('get_cuts_ind2D', MC, lambda c: (c['pot'].cut2D, c['grid'], 0, c['grid'], 1, c['points'].astype(float)),
+     lambda c: np.moveaxis(ref_cuts(c['Vpot'], c['points'], [0, 1]), 0, 2)),
+    ('get_cuts_ind2D_smpl', MC, lambda c: (c['pot'].cut2D, c['grid'], 0, c['grid'], 1, c['points'].astype(float)),
+     lambda c: ref_cuts(c['Vpot'], c['points'], [0, 1])),
+]
+
+
+def normalize(name, out):
+    '''Bring the output to a comparable form, reconstruct is compared by its rank one products (the
+    signs of the singular vectors are arbitrary).'''
+    if name == 'reconstruct':
+        weights, nu_i, nu_j = out
+        return weights[:, None, None]*nu_i[:, :, None]*nu_j[:, None, :]
+    return np.asarray(out)
+
+
+def check(name, out, ref, label, rtol=1E-9):
+    '''Raise an AssertionError if out and ref differ beyond rtol relative to the size of ref.'''
+    out, ref = np.asarray(out), np.asarray(ref)
+    if out.shape != ref.shape:
+        raise AssertionError('{}: shape {} differs from {} {}.'.format(name, out.shape, label, ref.shape))
+    err = np.abs(out - ref).max()/max(np.abs(ref).max(), 1E-300)
+    if not err <= rtol:
+        raise AssertionError('{}: relative deviation {:.2e} from {}.'.format(name, err, label))
+    return err
+
+
+def timeit(func, args, min_time=0.05):
+    '''Best time per call of three rounds, every round calls func often enough to take min_time.'''
+    func(*args)
+    n = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(n):
+            func(*args)
+        dt = time.perf_counter() - start
+        if dt >= min_time or n >= 1 << 16:
+            break
+        n *= 2
+    best = dt/n
+    for _ in range(2):
+        start = time.perf_counter()
+        for _ in range(n):
+            func(*args)
+        best = min(best, (time.perf_counter() - start)/n)
+    return best
+
+
+if __name__ == "__main__":
+
+    size = sys.argv[1] if len(sys.argv) > 1 else 'quick'
+    backend = importlib.import_module(sys.argv[2]) if len(sys.argv) > 2 else None
+
+    if size == 'quick':
+        cases = [(3, N, r, 2000) for N in (10, 20) for r in (4, 8)] + [(4, 10, 4, 2000)]
+    else:
+        cases = [(3, N, r, s) for N in (10, 20, 40) for r in (4, 8, 16) for s in (2000, 20000)] +\
+                [(f, N, 8, 20000) for f, N in ((4, 10), (4, 20), (5, 10), (6, 8))]
+
+    print('{:>19} {:>3} {:>4} {:>4} {:>7} {:>12} {:>10}'.format('kernel', 'f', 'N', 'r', 's', 'time [s]', 'deviation'))
+    results = []
+    for f, N, r, s in cases:
+        c = make_case(f, N, r, s)
+        for name, module, get_args, get_ref in KERNELS:
+            current = getattr(module, name)
+            func = current if backend is None else getattr(backend, name, current)
+            args = get_args(c)
+            out = normalize(name, func(*args))
+            err = check(name, out, get_ref(c), 'the reference')
+            if func is not current:
+                check(name, out, normalize(name, current(*args)), 'the current implementation')
+            t = timeit(func, args)
+            results.append({'kernel': name, 'backend': getattr(func, '__module__', None), 'f': f, 'N': N,\
+                            'rank': r, 'nsmpl': s, 'time': t, 'deviation': float(err)})
+            print('{:>19} {:>3} {:>4} {:>4} {:>7} {:>12.3e} {:>10.1e}'.format(name, f, N, r, s, t, err))
+
+    out = {'commit': get_commit(), 'numpy': np.__version__, 'python': platform.python_version(),\
+           'machine': platform.machine(), 'backend': None if backend is None else backend.__name__,\
+           'results': results}
+    with open('bench_kernels.json', 'w') as file:
+        json.dump(out, file, indent=1)
@@ -0,0 +1,91 @@
+import ALS.MonteC as MC
+from Benchmarks.bench_als import get_commit
+import numpy as np
+import platform
+import json
+import time
+import sys
+
+
+'''
+Benchmark of the mini-batch sweep of the 1D Monte-Carlo ALS (runMC with minibatch). A sweep over a batch
+restricted to its own cuts (MonteC.get_batch_cuts) has to give the same update as the sweep over the
+batch with all distinct cuts, and its cost has to scale with the batch size: for every batch fraction
+the time per sweep is compared to the full sweep, a batch of 1% of the points has to cost less than
+max_ratio of the full sweep (AssertionError otherwise).
+
+The results are written to bench_minibatch.json.
+
+Run from the repository root with:
+    python -m Benchmarks.bench_minibatch [quick|full]
+'''
+
+
+def make_case(f, N, r, s, seed=0):
+    '''Random SPP, sampling points and distinct 1D cuts (u = s, every point has its own cuts as in high
+    dimension).'''
+    rng = np.random.default_rng(seed)
+    SPP = [rng.standard_normal((r, N)) for _ in range(f)]
+    smpl_idx = np.asfortranarray(rng.integers(0, N, (s, f)))
+    cuts = [rng.standard_normal((N, s)) for _ in range(f)]
+    cutmaps = [rng.permutation(s) for _ in range(f)]
+    return SPP, smpl_idx, cuts, cutmaps
+
+
+def sweep_batch(SPP, smpl_idx, cuts, cutmaps, mb, restrict=True):
+    '''One sweep over the batch mb on copies of the SPP, returns the new weights and SPP.'''
+    SPP = [nu.copy() for nu in SPP]
+    idx_mb = np.asfortranarray(smpl_idx[mb])
+    if restrict == True:
+        cuts_mb, maps_mb = MC.get_batch_cuts(cuts, cutmaps, mb)
+    else:
+        cuts_mb, maps_mb = cuts, [cutmap[mb] for cutmap in cutmaps]
+    weights, _ = MC.sweep_MC(MC.get_all_nu_smpl(SPP, idx_mb), SPP, cuts_mb, idx_mb, cutmaps=maps_mb)
+    return weights, SPP
+
+
+def timeit(func, args, repeat=3):
+    '''Best time of repeat calls.'''
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+
+    size = sys.argv[1] if len(sys.argv) > 1 else 'quick'
+    f, N, r, s = (6, 20, 10, 50000) if size == 'quick' else (6, 20, 10, 200000)
+    fractions = [0.01, 0.1, 1.0]
+    max_ratio = 0.1
+
+    SPP, smpl_idx, cuts, cutmaps = make_case(f, N, r, s)
+    rng = np.random.default_rng(1)
+
+    # the restricted cuts give the same update
+    mb = np.sort(rng.choice(s, s//100, replace=False))
+    w1, nu1 = sweep_batch(SPP, smpl_idx, cuts, cutmaps, mb)
+    w2, nu2 = sweep_batch(SPP, smpl_idx, cuts, cutmaps, mb, restrict=False)
+    dev = max(np.abs(w1 - w2).max()/np.abs(w2).max(), max(np.abs(a - b).max() for a, b in zip(nu1, nu2)))
+    if not dev <= 1E-9:
+        raise AssertionError('The restricted mini-batch sweep deviates by {:.2e}.'.format(dev))
+
+    print('{:>9} {:>9} {:>12} {:>9}'.format('fraction', 'nb', 'time [s]', 'ratio'))
+    results = []
+    full = timeit(sweep_batch, (SPP, smpl_idx, cuts, cutmaps, np.arange(s)))
+    for frac in fractions:
+        mb = np.sort(rng.choice(s, int(frac*s), replace=False))
+        t = timeit(sweep_batch, (SPP, smpl_idx, cuts, cutmaps, mb))
+        results.append({'fraction': frac, 'nb': len(mb), 'time': t, 'ratio': t/full})
+        print('{:>9} {:>9} {:>12.3e} {:>9.3f}'.format(frac, len(mb), t, t/full))
+    if not results[0]['ratio'] < max_ratio:
+        raise AssertionError('A batch of {:.0%} costs {:.1%} of the full sweep.'.format(fractions[0],\
+                             results[0]['ratio']))
+
+    out = {'commit': get_commit(), 'numpy': np.__version__, 'python': platform.python_version(),\
+           'machine': platform.machine(), 'f': f, 'N': N, 'rank': r, 'nsmpl': s, 'deviation': float(dev),\
+           'results': results}
+    with open('bench_minibatch.json', 'w') as file:
+        json.dump(out, file, indent=1)
@@ -0,0 +1,71 @@
+import ALS.ALSclass as ALS
+import ALS.MonteC as MC
+import ALS.dvr as dvr
+import ALS.h2o as h2o
+import numpy as np
+import json
+import sys
+
+
+'''
+Benchmark of the Monte-Carlo error versus the number of sampling points for the available samplers
+(see ALS.MonteC.get_points) on the 3D H2O potential. For every sampler and number of sampling points
+the 1D (or 2D) MC-ALSCPD is run from the same initial guess for a few different seeds, the RMSE with
+respect to the exact tensor and the number of potential evaluations needed for the (distinct) cuts
+are reported and written to bench_sampling.json.
+
+Run from the repository root with:
+    python -m Benchmarks.bench_sampling [max_iter] [1D|2D]
+'''
+
+
+def h2o_setup(N1=15, N2=15, Nu=20):
+    '''Build the grids and the exact tensor for the H2O example.'''
+    r1 = dvr.sinDVR(N1, xi=1.0, xf=3.475)
+    r2 = dvr.sinDVR(N2, xi=1.0, xf=3.475)
+    u = dvr.sinDVR(Nu, xi=-0.95, xf=0.6)
+    grids = [r1.grid, r2.grid, np.arccos(u.grid)]
+    V = h2o.PJT2(*np.meshgrid(*grids, indexing='ij'))
+    return grids, V
+
+
+if __name__ == "__main__":
+
+    max_iter = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    method = sys.argv[2] if len(sys.argv) > 2 else '1D'
+    rank = 5
+    thresh = 1
+    seeds = [0, 1, 2]
+    nsmpl_list = [250, 500, 1000, 2000, 4000]
+    sampler_list = ['uniform', 'lhs', 'sobol', 'stratified']
+
+    grids, V = h2o_setup()
+    results = []
+
+    for sampler in sampler_list:
+        for nsmpl in nsmpl_list:
+            errors = []
+            evals = []
+            for seed in seeds:
+                # same initial guess for every sampler
+                np.random.seed(seed)
+                Object = ALS.ALSCPD('bench_sampling', V, rank, func1D=h2o.PJT2, func2D=h2o.PJT2_2D,\
+                                    grids=grids, nsmpl=nsmpl, sampler=sampler)
+                if method == '1D':
+                    Object.runMC(max_iter, thresh, tracker=False)
+                    evals.append(sum(cut.size for cut in Object.cuts1D))
+                elif method == '2D':
+                    Object.run2DMC(max_iter, thresh, tracker=False)
+                    evals.append(sum(cut.size for cut in Object.cuts2D))
+                errors.append(Object.errorl[-1])
+            results.append({'method': method, 'sampler': sampler, 'nsmpl': nsmpl, 'rmse_mean': float(np.mean(errors)),\
+                            'rmse_std': float(np.std(errors)), 'potential_evaluations': float(np.mean(evals))})
+
+    print('')
+    print('{:>12} {:>8} {:>14} {:>12} {:>12}'.format('sampler', 'nsmpl', 'RMSE [cm-1]', 'std', 'V calls'))
+    for res in results:
+        print('{:>12} {:>8} {:>14.2f} {:>12.2f} {:>12.0f}'.format(res['sampler'], res['nsmpl'],\
+              res['rmse_mean'], res['rmse_std'], res['potential_evaluations']))
+
+    with open('bench_sampling.json', 'w') as file:
+        json.dump(results, file, indent=1)